@@ -8,6 +8,7 @@ from celery.schedules import crontab
 import os
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -308,12 +309,27 @@ USE_I18N = True
 USE_TZ = True
 
 # Cache Configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Shared by all web workers and Celery processes: the pricing, catalog, search,
+# autocomplete, category tree and checkout versions live here, so a bump in one
+# process must be seen by the others. Production (DEBUG off) needs Redis; the
+# per-process LocMemCache is only for a single development server and tests.
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
     }
-}
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+else:
+    raise ImproperlyConfigured("REDIS_CACHE_URL must be set when DEBUG is off (the cache is shared by all workers)")
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
@@ -478,6 +494,17 @@ CELERY_TIMEZONE = 'UTC'
 CELERY_ENABLE_UTC = True
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# Design renders have their own queue so they cannot take the default workers:
+#   celery -A BrandExpertsEcommerce worker -Q design_render --concurrency=2
+CELERY_TASK_ROUTES = {
+    'customer.tasks.render_design_job': {'queue': 'design_render'},
+}
+# Renders allowed to wait at once; past this generate-image answers 503
+DESIGN_RENDER_MAX_PENDING = config('DESIGN_RENDER_MAX_PENDING', default=50, cast=int)
+# Disk cache of remote design images and fonts (see customer/design_assets.py)
+DESIGN_ASSET_CACHE_DIR = config('DESIGN_ASSET_CACHE_DIR', default=os.path.join(BASE_DIR, 'asset_cache'))
+DESIGN_ASSET_CACHE_MAX_BYTES = config('DESIGN_ASSET_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+
 # Create logs directory if it doesn't exist
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -528,6 +555,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'products_app.tasks.backup_database',
         'schedule': crontab(minute=0, hour=2, day_of_week='sunday'),
     },
+    'release-expired-stock-reservations': {
+        'task': 'products_app.tasks.release_expired_stock_reservations',
+        'schedule': crontab(minute='*/5'),
+    },
+    'collect-superseded-design-renders': {
+        'task': 'customer.tasks.collect_superseded_design_renders',
+        'schedule': crontab(minute=30, hour=3),
+    },
 }
 
 # # Debug print for troubleshooting
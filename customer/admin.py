@@ -96,10 +96,10 @@ class OrderAdmin(admin.ModelAdmin):
     def cart_items_display(self, obj):
         if obj.cart:
             items = []
-            for item in obj.cart.items.all():
+            for item in obj.cart.items.select_related('product', 'hire_designer'):
                 # Main item information
                 image_tag = format_html(
-                    '<img src="{}" width="50" height="50">', item.design_image
+                    '<img src="{}" width="50" height="50">', item.design_thumbnail or item.design_image
                 ) if item.design_image else "No Image"
 
                 cart_item_link = reverse(
@@ -122,56 +122,51 @@ class OrderAdmin(admin.ModelAdmin):
                     format_html('Total: {:.2f}', item.total_price)
                 ]
 
-                # Thickness info
-                if item.thickness_object_id and item.thickness_content_type:
-                    thickness_obj = item.thickness_content_type.get_object_for_this_type(id=item.thickness_object_id)
+                # Options, from the line's snapshot
+                thickness = item.get_option('thickness')
+                if thickness:
                     item_info.append(format_html(
                         '<strong>Thickness:</strong> {} ({} {})',
-                        thickness_obj.size,
-                        thickness_obj.price_percentage if hasattr(thickness_obj, 'price_percentage') else '',
-                        thickness_obj.price
+                        thickness['size'],
+                        thickness['price_percentage'] if thickness['price_percentage'] is not None else '',
+                        thickness['price']
                     ))
 
-                # Delivery info
-                if item.delivery_object_id and item.delivery_content_type:
-                    delivery_obj = item.delivery_content_type.get_object_for_this_type(id=item.delivery_object_id)
+                delivery = item.get_option('delivery')
+                if delivery:
                     item_info.append(format_html(
                         '<strong>Delivery:</strong> {} ({}% / {})',
-                        delivery_obj.name,
-                        delivery_obj.price_percentage or '0',
-                        delivery_obj.price_decimal or '0'
+                        delivery['name'],
+                        delivery['price_percentage'] or '0',
+                        delivery['price_decimal'] or '0'
                     ))
 
-                # Installation info
-                if item.installation_object_id and item.installation_content_type:
-                    installation_obj = item.installation_content_type.get_object_for_this_type(
-                        id=item.installation_object_id)
+                installation = item.get_option('installation')
+                if installation:
                     item_info.append(format_html(
                         '<strong>Installation:</strong> {} ({} days - {}% / {})',
-                        installation_obj.name,
-                        installation_obj.days,
-                        installation_obj.price_percentage or '0',
-                        installation_obj.price_decimal or '0'
+                        installation['name'],
+                        installation['days'],
+                        installation['price_percentage'] or '0',
+                        installation['price_decimal'] or '0'
                     ))
 
-                # Turnaround time info
-                if item.turnaround_object_id and item.turnaround_content_type:
-                    turnaround_obj = item.turnaround_content_type.get_object_for_this_type(id=item.turnaround_object_id)
+                turnaround_time = item.get_option('turnaround_time')
+                if turnaround_time:
                     item_info.append(format_html(
                         '<strong>Turnaround Time:</strong> {} ({}% / {})',
-                        turnaround_obj.name,
-                        turnaround_obj.price_percentage or '0',
-                        turnaround_obj.price_decimal or '0'
+                        turnaround_time['name'],
+                        turnaround_time['price_percentage'] or '0',
+                        turnaround_time['price_decimal'] or '0'
                     ))
 
-                # Distance info
-                if item.distance_object_id and item.distance_content_type:
-                    distance_obj = item.distance_content_type.get_object_for_this_type(id=item.distance_object_id)
+                distance = item.get_option('distance')
+                if distance:
                     item_info.append(format_html(
                         '<strong>Distance:</strong> {} ({}% / {})',
-                        distance_obj.km,
-                        distance_obj.price_percentage or '0',
-                        distance_obj.price_decimal or '0'
+                        distance['km'],
+                        distance['price_percentage'] or '0',
+                        distance['price_decimal'] or '0'
                     ))
 
                 # Additional info
@@ -256,7 +251,7 @@ admin.site.register(OTPRecord)
 
 @admin.register(CustomerDesign)
 class CustomerDesignAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer_id', 'product_name', 'product_max_width', 'product_max_height', 'quantity', 'created_at')
+    list_display = ('id', 'design_thumbnail', 'customer_id', 'product_name', 'product_max_width', 'product_max_height', 'quantity', 'created_at')
     list_filter = ('customer', 'product_name', 'created_at')
     search_fields = ('customer__user__username', 'anonymous_uuid', 'product_name')
     readonly_fields = ('id', 'created_at', 'updated_at')
@@ -279,6 +274,13 @@ class CustomerDesignAdmin(admin.ModelAdmin):
 
     customer_id.short_description = "Customer ID"
 
+    def design_thumbnail(self, obj):
+        """Thumbnail rendition of the design (the full render only for designs not backfilled)."""
+        url = obj.design_thumbnail_url or obj.design_image_url
+        return format_html('<img src="{}" width="50" height="50">', url) if url else "No Image"
+
+    design_thumbnail.short_description = "Design"
+
 
 admin.site.register(PasswordResetSession)
 
@@ -0,0 +1,363 @@
+"""
+Set-based cart writes for create_or_update_cart.
+
+All products, designers and options referenced by a cart payload are resolved
+with one query per table (options come from the cached compiled pricing), the
+payload is diffed against the cart's existing items and the result is written
+with bulk_create / bulk_update. The caller runs it inside one transaction.
+
+Every line is repriced with the shared pricing logic (size, unit, tiers,
+options, designer fee); the stored price is the server's and the client's
+figures are kept in client_price / client_total_price for the drift report.
+The pending totals are cached on the Cart so checkout reads one row.
+
+Each line also stores an option_snapshot: a JSON copy of its thickness,
+delivery, turnaround, installation and distance options, so orders, the admin
+and emails render options without resolving the generic foreign keys.
+
+Stock for the pending lines is reserved when checkout starts and committed
+when the order is placed, through products_app.inventory.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from products_app.inventory import commit_stock, release_reservations, reserve_stock
+from products_app.models import Designer_rate, Product
+from products_app.pricing import (
+    PriceQuoteError, compile_many, option_reference_fields, option_snapshot, options_for_references, price_line,
+)
+
+from .design_render import rendition_urls
+from .models import CartItem
+
+
+# (option kind, payload key, CartItem field prefix)
+CART_OPTION_FIELDS = (
+    ('delivery', 'deliveryId', 'delivery'),
+    ('thickness', 'thicknessId', 'thickness'),
+    ('turnaround_time', 'turnAroundId', 'turnaround'),
+    ('installation', 'Installation_type_id', 'installation'),
+    ('distance', 'distance', 'distance'),
+)
+
+CART_ITEM_UPDATE_FIELDS = [
+    'custom_width', 'custom_height', 'design_image', 'design_thumbnail', 'design_preview', 'quantity', 'price', 'total_price',
+    'client_price', 'client_total_price', 'option_snapshot', 'size_unit', 'status', 'hire_designer', 'design_description', 'is_smart',
+] + [f'{prefix}_{suffix}' for _kind, _key, prefix in CART_OPTION_FIELDS for suffix in ('content_type', 'object_id')]
+
+CENT = Decimal('0.01')
+# Client totals further than this from the server's are reported as drift
+PRICE_DRIFT_TOLERANCE = Decimal('0.01')
+
+
+class CartError(Exception):
+    """Raised when a cart payload cannot be applied; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise CartError(f"Invalid price {value}")
+
+
+def _parse_item(item_data):
+    size = item_data.get('size', {})
+    return {
+        'product_id': item_data.get('productid'),
+        'custom_width': size.get('width'),
+        'custom_height': size.get('height'),
+        'design_image': item_data.get('design_image'),
+        'quantity': item_data.get('quantity', 1),
+        'price': _to_decimal(item_data.get('price', 0)),
+        'total_price': _to_decimal(item_data.get('total', 0)),
+        'size_unit': item_data.get('unit', 'inches'),
+        'hire_designer_id': item_data.get('hire_designer_id', None),
+        'design_description': item_data.get('design_description', ''),
+        'is_smart': item_data.get('is_smart', False),
+        'option_ids': {key: item_data.get(key, None) for _kind, key, _prefix in CART_OPTION_FIELDS},
+    }
+
+
+def reprice_line(pricing, line, options, hire_designer):
+    """
+    Server (unit price, total price) for a parsed cart line, or None when the
+    line cannot be priced (unknown unit, product without dimensions); such a
+    line keeps the client's price.
+    """
+    try:
+        quantity = int(line['quantity'])
+        total = price_line(pricing, line['custom_width'], line['custom_height'], line['size_unit'],
+                           quantity, options)
+    except (PriceQuoteError, InvalidOperation, TypeError, ValueError):
+        return None
+
+    if hire_designer is not None and hire_designer.amount:
+        # Designer fee is a flat amount per line
+        total += hire_designer.amount
+    total = total.quantize(CENT)
+    unit_price = (total / quantity).quantize(CENT) if quantity else total
+    return unit_price, total
+
+
+def reprice_cart_item(item):
+    """
+    Reprice a saved CartItem after its quantity or size changed, with the options
+    it references, and refresh its cart's cached totals. A line the pricing
+    cannot handle keeps its unit price, times the new quantity.
+    """
+    pricing = compile_many([item.product_id]).get(item.product_id) if item.product_id else None
+    server_price = None
+    if pricing is not None:
+        references = [
+            (kind, getattr(item, f'{prefix}_content_type_id'), getattr(item, f'{prefix}_object_id'))
+            for kind, _key, prefix in CART_OPTION_FIELDS
+        ]
+        resolved = options_for_references(references)
+        line = {
+            'custom_width': item.custom_width,
+            'custom_height': item.custom_height,
+            'size_unit': item.size_unit,
+            'quantity': item.quantity,
+        }
+        server_price = reprice_line(pricing, line, [resolved.get(reference) for reference in references],
+                                    item.hire_designer)
+
+    if server_price:
+        item.price, item.total_price = server_price
+    elif item.price is not None:
+        item.total_price = (item.price * item.quantity).quantize(CENT)
+    item.save(update_fields=['price', 'total_price'])
+
+    if item.cart_id and item.status == 'pending':
+        refresh_cart_totals(item.cart)
+
+
+def refresh_cart_totals(cart):
+    """Recompute the cached pending totals of `cart` with one aggregate query."""
+    totals = CartItem.objects.filter(cart=cart, status='pending').aggregate(
+        total=Sum('total_price'), count=Sum('quantity')
+    )
+    cart.items_total = totals['total'] or Decimal('0.00')
+    cart.items_count = totals['count'] or 0
+    cart.priced_at = timezone.now()
+    cart.save(update_fields=['items_total', 'items_count', 'priced_at', 'updated_at'])
+    return cart.items_total, cart.items_count
+
+
+def cart_items_total(cart):
+    """Pending items total for checkout: the cached one, or a sum for carts never repriced."""
+    if cart.priced_at is not None and cart.items_total is not None:
+        return cart.items_total
+    return sum((item.total_price for item in cart.items.filter(status='pending')), Decimal('0.00'))
+
+
+def price_drift_items(cart_id=None):
+    """Pending cart items whose client total differs from the server total."""
+    items = CartItem.objects.filter(status='pending', client_total_price__isnull=False).filter(
+        Q(client_total_price__gt=F('total_price') + PRICE_DRIFT_TOLERANCE)
+        | Q(client_total_price__lt=F('total_price') - PRICE_DRIFT_TOLERANCE)
+    )
+    if cart_id:
+        items = items.filter(cart_id=cart_id)
+    return items.select_related('product').order_by('cart_id', 'id')
+
+
+def fill_option_snapshots(items):
+    """
+    Store the option snapshot of CartItems saved without one, resolving their
+    generic references with one query per option model. Returns the number filled.
+    """
+    items = [item for item in items if item.option_snapshot is None]
+    if not items:
+        return 0
+
+    def references(item):
+        return [
+            (kind, getattr(item, f'{prefix}_content_type_id'), getattr(item, f'{prefix}_object_id'))
+            for kind, _key, prefix in CART_OPTION_FIELDS
+        ]
+
+    options = options_for_references(reference for item in items for reference in references(item))
+    for item in items:
+        item.option_snapshot = {
+            reference[0]: option_snapshot(options[reference])
+            for reference in references(item) if reference in options
+        }
+    CartItem.objects.bulk_update(items, ['option_snapshot'])
+    return len(items)
+
+
+def upsert_cart_items(cart, cart_items_data):
+    """
+    Apply a create_or_update_cart payload to `cart` and refresh its cached totals.
+
+    Items are matched to existing CartItems by product, like update_or_create on
+    (cart, product); a product repeated in the payload ends up as one line with
+    the last values. Returns (cart items response list, total price, total items,
+    price drift list).
+    """
+    lines = [_parse_item(item_data) for item_data in cart_items_data]
+
+    for line in lines:
+        if not line['product_id']:
+            raise CartError("Product ID is required for each cart item")
+
+    products = Product.objects.in_bulk({line['product_id'] for line in lines})
+    products_by_key = {str(pk): product for pk, product in products.items()}
+    designer_ids = {line['hire_designer_id'] for line in lines if line['hire_designer_id']}
+    designers = {str(pk): designer for pk, designer in Designer_rate.objects.in_bulk(designer_ids).items()}
+
+    for line in lines:
+        if str(line['product_id']) not in products_by_key:
+            raise CartError(f"Product with ID {line['product_id']} not found", status_code=404)
+        if line['hire_designer_id'] and str(line['hire_designer_id']) not in designers:
+            raise CartError(f"Designer_rate with ID {line['hire_designer_id']} not found", status_code=404)
+
+    compiled = compile_many(products)
+
+    existing = {}
+    for item in CartItem.objects.filter(cart=cart, product_id__in=list(products)).order_by('id'):
+        existing.setdefault(item.product_id, item)
+
+    to_create = []
+    to_update = []
+    cart_items_list = []
+    price_drift = []
+
+    for line in lines:
+        product = products_by_key[str(line['product_id'])]
+        hire_designer = designers.get(str(line['hire_designer_id'])) if line['hire_designer_id'] else None
+        pricing = compiled[product.id]
+
+        # Product-specific option first, then the active global one
+        options = {}
+        option_fields = {}
+        for kind, key, prefix in CART_OPTION_FIELDS:
+            option_id = line['option_ids'][key]
+            option = pricing.resolve(kind, option_id, active_only=True) if option_id else None
+            options[key] = option
+            option_fields.update(option_reference_fields(prefix, option))
+
+        server_price = reprice_line(pricing, line, options.values(), hire_designer)
+        price, line_total = server_price if server_price else (line['price'], line['total_price'])
+        if server_price and abs(line['total_price'] - line_total) > PRICE_DRIFT_TOLERANCE:
+            price_drift.append({
+                "productid": product.id,
+                "client_total": float(line['total_price']),
+                "server_total": float(line_total),
+            })
+
+        renditions = rendition_urls(line['design_image'])
+        values = {
+            'custom_width': line['custom_width'],
+            'custom_height': line['custom_height'],
+            'design_image': line['design_image'],
+            'design_thumbnail': renditions['thumbnail'],
+            'design_preview': renditions['preview'],
+            'quantity': line['quantity'],
+            'price': price,
+            'total_price': line_total,
+            'client_price': line['price'],
+            'client_total_price': line['total_price'],
+            'option_snapshot': {
+                option.kind: option_snapshot(option) for option in options.values() if option is not None
+            },
+            'size_unit': line['size_unit'],
+            'status': 'pending',
+            'hire_designer': hire_designer,
+            'design_description': line['design_description'],
+            'is_smart': line['is_smart'],
+            **option_fields,
+        }
+
+        item = existing.get(product.id)
+        if item is None:
+            item = CartItem(cart=cart, product=product, **values)
+            existing[product.id] = item
+            to_create.append(item)
+        else:
+            for field, value in values.items():
+                setattr(item, field, value)
+            if item.pk and item not in to_update:
+                to_update.append(item)
+
+        cart_items_list.append({
+            "productid": product.id,
+            "name": product.name,
+            "quantity": line['quantity'],
+            "price": float(price),
+            "total": float(line_total),
+            "size": {
+                "width": line['custom_width'],
+                "height": line['custom_height']
+            },
+            "design_image": line['design_image'],
+            "unit": line['size_unit'],
+            "hire_designer_id": hire_designer.id if hire_designer else None,
+            "design_description": line['design_description'],
+            "is_smart": line['is_smart'],
+            **{key: option.id if option else None for key, option in options.items()},
+        })
+
+    # Stock is only touched when a line becomes 'ordered', never here, so skipping
+    # CartItem.save() is safe
+    if to_create:
+        CartItem.objects.bulk_create(to_create)
+    if to_update:
+        CartItem.objects.bulk_update(to_update, CART_ITEM_UPDATE_FIELDS)
+
+    total_price, total_items = refresh_cart_totals(cart)
+    return cart_items_list, total_price, total_items, price_drift
+
+
+# Stock
+
+def cart_stock_reference(cart_id):
+    return f"cart:{cart_id}"
+
+
+def _stock_lines(items):
+    return [(item.id, item.product_id, item.quantity) for item in items if item.product_id]
+
+
+def _shortages(results):
+    return [
+        {
+            "cart_item_id": result.key,
+            "product_id": result.product_id,
+            "requested": result.quantity,
+            "available": result.available,
+        }
+        for result in results if not result.reserved
+    ]
+
+
+def reserve_cart_stock(cart, items):
+    """
+    Hold stock for the pending lines of `cart` while it is paid for, replacing any
+    earlier hold of the same cart. Nothing is held if a line is short; the
+    shortages are returned (empty list on success).
+    """
+    reference = cart_stock_reference(cart.id)
+    release_reservations(reference)
+    shortages = _shortages(reserve_stock(_stock_lines(items), reference))
+    if shortages:
+        release_reservations(reference)
+    return shortages
+
+
+def commit_cart_stock(cart, items):
+    """Count the stock of the ordered lines as sold; returns the lines that could not get stock."""
+    return _shortages(commit_stock(_stock_lines(items), cart_stock_reference(cart.id)))
+
+
+def release_cart_stock(cart_id):
+    return release_reservations(cart_stock_reference(cart_id))
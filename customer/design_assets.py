@@ -0,0 +1,237 @@
+"""
+Remote assets of designs (StaticImage sources, fontURL TTFs), cached.
+
+Two levels:
+
+- On disk, content keyed by the sha256 of the URL under
+  DESIGN_ASSET_CACHE_DIR, with a small JSON sidecar holding the ETag and
+  Last-Modified. An asset fetched less than ASSET_FRESH_FOR ago is served
+  without any request; an older one is revalidated with If-None-Match /
+  If-Modified-Since (a 304 only refreshes the sidecar) and is still served if
+  the origin cannot be reached. The directory is kept under
+  DESIGN_ASSET_CACHE_MAX_BYTES by dropping the least recently used files (the
+  mtime is bumped on every hit).
+- In process, the decoded PIL Image / ImageFont objects, in an LRU bounded by
+  their approximate size, so a worker rendering designs that share brand
+  assets neither reads nor parses them again.
+
+Decoded images are shared: callers must treat them as read-only (resize or
+copy before drawing on them).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from PIL import Image, ImageFont
+
+
+ASSET_FRESH_FOR = timedelta(days=1)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Eviction trims the directory down to this share of the limit
+EVICT_TO = 0.9
+DECODED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+IMAGE_TIMEOUT = 10
+FONT_TIMEOUT = 5
+
+
+def _cache_dir():
+    return getattr(settings, 'DESIGN_ASSET_CACHE_DIR', os.path.join(settings.BASE_DIR, 'asset_cache'))
+
+
+def _max_bytes():
+    return getattr(settings, 'DESIGN_ASSET_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def asset_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _paths(url):
+    key = asset_key(url)
+    directory = os.path.join(_cache_dir(), key[:2])
+    return os.path.join(directory, key), os.path.join(directory, key + '.json')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, url, etag, last_modified):
+    _write_atomic(meta_path, json.dumps({
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+    }).encode('utf-8'))
+
+
+def _read_body(body_path):
+    try:
+        with open(body_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # mtime marks the last use, for LRU eviction
+    os.utime(body_path)
+    return data
+
+
+def evict(max_bytes=None):
+    """Drop least recently used assets until the directory is under the limit. Returns bytes freed."""
+    max_bytes = _max_bytes() if max_bytes is None else max_bytes
+    entries = []
+    total = 0
+    for root, _dirs, files in os.walk(_cache_dir()):
+        for name in files:
+            if name.endswith('.json') or name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    freed = 0
+    for _mtime, size, path in sorted(entries):
+        if total - freed <= max_bytes * EVICT_TO:
+            break
+        for stale in (path, path + '.json'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        freed += size
+    return freed
+
+
+def fetch_asset(url, timeout=IMAGE_TIMEOUT, session=None):
+    """Bytes of the asset at `url` (from the disk cache when possible), or None."""
+    body_path, meta_path = _paths(url)
+    meta = _read_meta(meta_path)
+    cached = _read_body(body_path) if meta else None
+
+    if cached is not None and time.time() - meta.get('fetched_at', 0) < ASSET_FRESH_FOR.total_seconds():
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        # Origin unreachable: a stale copy is better than no asset
+        return cached
+
+    if response.status_code == 304 and cached is not None:
+        # Not modified: the copy is fresh again (a 304 may omit the validators)
+        _write_meta(meta_path, url, response.headers.get('ETag') or meta.get('etag'),
+                    response.headers.get('Last-Modified') or meta.get('last_modified'))
+        return cached
+    if response.status_code != 200:
+        return cached
+
+    _write_atomic(body_path, response.content)
+    _write_meta(meta_path, url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    evict()
+    return response.content
+
+
+class DecodedLRU:
+    """Thread-safe LRU of decoded objects, bounded by their approximate size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _key, (_value, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+decoded_assets = DecodedLRU(DECODED_CACHE_MAX_BYTES)
+
+
+def load_image(url, session=None):
+    """Decoded RGBA image at `url` (shared, do not modify), or None if it cannot be loaded."""
+    key = ('image', url)
+    image = decoded_assets.get(key)
+    if image is not None:
+        return image
+    data = fetch_asset(url, timeout=IMAGE_TIMEOUT, session=session)
+    if data is None:
+        return None
+    image = Image.open(BytesIO(data)).convert("RGBA")
+    decoded_assets.put(key, image, image.width * image.height * 4)
+    return image
+
+
+def load_font(url, size, session=None):
+    """TrueType font at `url` in `size`, or None if it cannot be loaded."""
+    key = ('font', url, size)
+    font = decoded_assets.get(key)
+    if font is not None:
+        return font
+    data = fetch_asset(url, timeout=FONT_TIMEOUT, session=session)
+    if data is None:
+        return None
+    font = ImageFont.truetype(BytesIO(data), size)
+    decoded_assets.put(key, font, len(data))
+    return font
@@ -0,0 +1,509 @@
+"""
+Design rendering: CustomerDesign.design_data -> transparent PNG in MEDIA_ROOT/designs.
+
+Renders run off the request thread. generate_design_image only creates a
+DesignRenderJob and queues `customer.tasks.render_design_job` on the
+design_render Celery queue (CELERY_TASK_ROUTES), so renders have workers of
+their own and cannot take the API's. Clients poll the job until it is done
+(a status request waits at most a few seconds, see design_render_status).
+
+A design has at most one active job: asking again while one is queued or
+running returns that job. At most DESIGN_RENDER_MAX_PENDING jobs wait at once;
+past that the API answers 503 instead of queueing more.
+
+Remote images and fonts come through customer.design_assets (disk and
+in-process caches), so re-renders do no network I/O or re-parsing. All of a
+design's assets are fetched up front on a bounded thread pool sharing one
+pooled HTTP session, under an overall deadline, and the layers are composited
+afterwards: a render waits for its slowest asset, not the sum of them.
+
+Renders are content addressed: the PNG is designs/<key>.png where the key
+hashes the normalized design JSON, the canvas size and RENDERER_VERSION. An
+unchanged design is answered from the stored file without queueing anything
+(counted as a hit, see render_cache_stats); files no design or cart line
+points at any more, and old job rows, are deleted by a periodic task.
+
+Next to each render go its RENDITIONS (designs/<key>.thumbnail.png and
+<key>.preview.png), exposed on CustomerDesign and CartItem so lists, emails
+and the admin do not load the print-resolution file.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+from requests.adapters import HTTPAdapter
+
+from products_app.pricing import get_compiled_pricing
+
+from .design_assets import load_font, load_image
+from .models import DesignRenderCounter, DesignRenderJob
+
+
+ACTIVE_STATUSES = ('queued', 'running')
+# A job still active after this long lost its worker and no longer blocks a new one
+RENDER_JOB_STALE_AFTER = timedelta(minutes=10)
+DEFAULT_MAX_PENDING = 50
+
+# Remote assets of one render are fetched by this many threads, and the render
+# goes ahead without whatever is not in after ASSET_FETCH_DEADLINE seconds
+ASSET_FETCH_WORKERS = 8
+ASSET_FETCH_DEADLINE = 15
+
+# Part of every render key: bump when the output of the renderer changes
+RENDERER_VERSION = 1
+# Unreferenced renders younger than this are kept (a client may still be fetching them)
+SUPERSEDED_GRACE = timedelta(days=1)
+# Render jobs are deleted this long after they were created; clients poll for seconds
+RENDER_JOB_RETENTION = timedelta(days=7)
+
+# Downscaled copies stored next to every render, by longest edge in pixels;
+# the render itself is the print-resolution image
+RENDITIONS = {'thumbnail': 160, 'preview': 800}
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+def canvas_size(design, design_data):
+    """Canvas (width, height) in pixels: the product's max size, else the editor frame."""
+    if design.product and design.product_max_width and design.product_max_height:
+        return int(design.product_max_width), int(design.product_max_height)
+    frame_data = design_data.get("frame", {})
+    return int(frame_data.get("width", 1200)), int(frame_data.get("height", 1200))
+
+
+def collect_assets(design_data):
+    """Remote assets used by the layers: (image URLs, (font URL, size) pairs)."""
+    images = set()
+    fonts = set()
+    for scene in design_data.get("scenes", []):
+        for layer in scene.get("layers", []):
+            layer_type = layer.get("type")
+            if layer_type == "StaticImage" and layer.get("src"):
+                images.add(layer["src"])
+            elif layer_type == "StaticText" and layer.get("fontURL"):
+                try:
+                    fonts.add((layer["fontURL"], int(layer.get("fontSize", 20))))
+                except (TypeError, ValueError):
+                    pass
+    return images, fonts
+
+
+def _asset_session(workers):
+    # One keep-alive pool per host, sized for the fetch threads
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_assets(design_data, workers=ASSET_FETCH_WORKERS, deadline=ASSET_FETCH_DEADLINE):
+    """
+    Load every remote asset of the design concurrently. Returns
+    {('image', url): Image, ('font', url, size): ImageFont}; assets that fail or
+    are not ready by `deadline` seconds are left out (the layer is skipped or
+    falls back to the default font).
+    """
+    images, fonts = collect_assets(design_data)
+    jobs = {('image', url): (load_image, (url,)) for url in images}
+    jobs.update({('font', url, size): (load_font, (url, size)) for url, size in fonts})
+    if not jobs:
+        return {}
+
+    session = _asset_session(workers)
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(jobs)), thread_name_prefix='design-asset')
+    futures = {
+        executor.submit(loader, *args, session=session): key
+        for key, (loader, args) in jobs.items()
+    }
+    done, not_done = wait(futures, timeout=deadline)
+    # Stragglers finish (and fill the caches) in the background; the render does not wait
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    assets = {}
+    for future in done:
+        try:
+            asset = future.result()
+        except Exception as e:
+            print(f"Asset Error: {futures[future]} {str(e)}")
+            continue
+        if asset is not None:
+            assets[futures[future]] = asset
+    for future in not_done:
+        print(f"Asset Error: {futures[future]} not loaded within {deadline}s")
+    return assets
+
+
+def render_canvas(design_data, canvas_width, canvas_height, assets=None):
+    """
+    Draw every layer of every scene on a transparent RGBA canvas. Remote
+    assets are fetched up front, in parallel, unless `assets` is given.
+    """
+    if assets is None:
+        assets = fetch_assets(design_data)
+    canvas = Image.new("RGBA", (canvas_width, canvas_height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(canvas)
+
+    for scene in design_data.get("scenes", []):
+        for layer in scene.get("layers", []):
+            layer_type = layer.get("type")
+
+            # Convert negative coordinates to positive
+            left = max(0, int(layer.get("left", 0)))
+            top = max(0, int(layer.get("top", 0)))
+
+            if layer_type == "Background":
+                draw.rectangle(
+                    [
+                        left,
+                        top,
+                        left + int(layer["width"]),
+                        top + int(layer["height"])
+                    ],
+                    fill=layer.get("fill", "#FFFFFF")
+                )
+
+            elif layer_type == "StaticImage":
+                try:
+                    img = assets.get(('image', layer.get("src")))
+                    if img is not None:
+                        img = img.resize((
+                            int(layer["width"] * layer.get("scaleX", 1)),
+                            int(layer["height"] * layer.get("scaleY", 1))
+                        ))
+                        # Ensure image stays within canvas bounds
+                        paste_x = max(0, min(left, canvas_width - img.width))
+                        paste_y = max(0, min(top, canvas_height - img.height))
+                        canvas.paste(img, (paste_x, paste_y), img)
+                except Exception as e:
+                    print(f"Image Error: {str(e)}")
+
+            elif layer_type == "StaticText":
+                try:
+                    text = layer.get("text", "")
+                    fill_color = layer.get("fill", "#000000")
+                    font_size = int(layer.get("fontSize", 20))
+
+                    # Font from the prefetched assets, with fallback
+                    font = assets.get(('font', layer.get("fontURL"), font_size))
+                    if not font:
+                        font = ImageFont.load_default(size=font_size)
+
+                    text_x = max(0, min(left, canvas_width))
+                    text_y = max(0, min(top, canvas_height))
+                    draw.text((text_x, text_y), text, font=font, fill=fill_color)
+                except Exception as e:
+                    print(f"Text Error: {str(e)}")
+
+    return canvas
+
+
+def render_key(design_data, canvas_width, canvas_height):
+    """Content hash of a render: normalized design JSON, canvas size and renderer version."""
+    normalized = json.dumps(design_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    payload = f"{RENDERER_VERSION}:{canvas_width}x{canvas_height}:{normalized}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _designs_dir():
+    return os.path.join(settings.MEDIA_ROOT, "designs")
+
+
+def _render_url(key):
+    return settings.MEDIA_URL + "designs/" + f"{key}.png"
+
+
+# Renditions
+
+def rendition_name(image_name, rendition):
+    """designs/<stem>.png -> <stem>.<rendition>.png"""
+    stem = image_name[:-len('.png')] if image_name.endswith('.png') else image_name
+    return f"{stem}.{rendition}.png"
+
+
+def local_render_path(image_url):
+    """Path in MEDIA_ROOT/designs of a render URL (relative or absolute), or None for other URLs."""
+    if not image_url:
+        return None
+    path = urlparse(image_url).path
+    if not path.startswith(settings.MEDIA_URL + "designs/"):
+        return None
+    return os.path.join(_designs_dir(), os.path.basename(path))
+
+
+def rendition_urls(image_url):
+    """{rendition: URL} of the stored downscaled copies of a render; None for those missing."""
+    image_path = local_render_path(image_url)
+    urls = {}
+    for rendition in RENDITIONS:
+        name = rendition_name(os.path.basename(image_path), rendition) if image_path else None
+        if name and os.path.exists(os.path.join(_designs_dir(), name)):
+            urls[rendition] = image_url.rsplit('/', 1)[0] + '/' + name
+        else:
+            urls[rendition] = None
+    return urls
+
+
+def write_renditions(image_path, canvas=None):
+    """Write the missing downscaled copies of the render at `image_path` next to it."""
+    for rendition, longest_edge in RENDITIONS.items():
+        target = os.path.join(os.path.dirname(image_path), rendition_name(os.path.basename(image_path), rendition))
+        if os.path.exists(target):
+            continue
+        if canvas is None:
+            with Image.open(image_path) as stored:
+                canvas = stored.convert("RGBA")
+        image = canvas.copy()
+        image.thumbnail((longest_edge, longest_edge), Image.LANCZOS)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, "PNG", optimize=True)
+        os.replace(tmp_path, target)
+
+
+def _count(outcome):
+    counters = DesignRenderCounter.objects.filter(outcome=outcome)
+    if counters.update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DesignRenderCounter.objects.create(outcome=outcome, count=1)
+    except IntegrityError:
+        # Created by another process in the meantime
+        counters.update(count=F('count') + 1)
+
+
+def render_cache_stats():
+    counts = dict(DesignRenderCounter.objects.values_list('outcome', 'count'))
+    hits = counts.get('hit', 0)
+    misses = counts.get('miss', 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+def _use_render(design, key):
+    url = _render_url(key)
+    renditions = rendition_urls(url)
+    values = {
+        'design_image_url': url,
+        'render_hash': key,
+        'design_thumbnail_url': renditions['thumbnail'],
+        'design_preview_url': renditions['preview'],
+    }
+    if any(getattr(design, field) != value for field, value in values.items()):
+        for field, value in values.items():
+            setattr(design, field, value)
+        design.save(update_fields=list(values) + ['updated_at'])
+    return url
+
+
+def existing_render(design):
+    """URL of the stored render of the design's current content, or None if it has to be rendered."""
+    design_data = json.loads(design.design_data)
+    key = render_key(design_data, *canvas_size(design, design_data))
+    image_path = os.path.join(_designs_dir(), f"{key}.png")
+    if not os.path.exists(image_path):
+        return None
+    _count('hit')
+    # Renders stored before renditions existed get them now
+    write_renditions(image_path)
+    return _use_render(design, key)
+
+
+def render_design(design):
+    """
+    Render `design` unless a render of the same content is already stored, and
+    point design_image_url at it. Returns the URL.
+    """
+    design_data = json.loads(design.design_data)
+    canvas_width, canvas_height = canvas_size(design, design_data)
+    key = render_key(design_data, canvas_width, canvas_height)
+    image_path = os.path.join(_designs_dir(), f"{key}.png")
+
+    if os.path.exists(image_path):
+        _count('hit')
+        write_renditions(image_path)
+    else:
+        _count('miss')
+        canvas = render_canvas(design_data, canvas_width, canvas_height)
+        os.makedirs(_designs_dir(), exist_ok=True)
+        # Renditions first, then the render moved in (written aside, so a reader
+        # never sees a partial file); an existing render always has its renditions
+        write_renditions(image_path, canvas)
+        tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+        canvas.save(tmp_path, "PNG")
+        os.replace(tmp_path, image_path)
+
+    return _use_render(design, key)
+
+
+def _stem(name):
+    return name.split('.', 1)[0]
+
+
+def collect_superseded_renders(grace=SUPERSEDED_GRACE):
+    """
+    Delete files in MEDIA_ROOT/designs that no design and no cart line points
+    at any more, once older than `grace`. Returns the number of files deleted.
+    """
+    from .models import CartItem, CustomerDesign
+
+    designs_dir = _designs_dir()
+    if not os.path.isdir(designs_dir):
+        return 0
+
+    referenced = set()
+    for urls in (
+        CustomerDesign.objects.filter(design_image_url__isnull=False).values_list('design_image_url', flat=True),
+        CartItem.objects.filter(design_image__isnull=False).values_list('design_image', flat=True),
+    ):
+        for url in urls.iterator(chunk_size=2000):
+            referenced.add(_stem(os.path.basename(urlparse(url).path)))
+
+    cutoff = time.time() - grace.total_seconds()
+    deleted = 0
+    with os.scandir(designs_dir) as entries:
+        for entry in entries:
+            # A render and its renditions share the stem; leftover .tmp files always go
+            if not entry.is_file() or (_stem(entry.name) in referenced and not entry.name.endswith('.tmp')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    deleted += 1
+            except OSError:
+                pass
+    return deleted
+
+
+def prune_render_jobs(retention=RENDER_JOB_RETENTION):
+    """Delete render jobs created more than `retention` ago. Returns the number deleted."""
+    deleted, _by_model = DesignRenderJob.objects.filter(created_at__lt=timezone.now() - retention).delete()
+    return deleted
+
+
+# Jobs
+
+def _active_jobs():
+    return DesignRenderJob.objects.filter(
+        status__in=ACTIVE_STATUSES, created_at__gte=timezone.now() - RENDER_JOB_STALE_AFTER
+    )
+
+
+def request_render(design):
+    """
+    A finished job if the design's current content is already rendered, else
+    its active render job or a new one queued after commit. Raises RenderQueueFull when too many jobs are already waiting.
+    """
+    from .tasks import render_design_job
+
+    # Unchanged design: answered at once from the stored render, with the job
+    # that produced it, so asking again does not add a row per request
+    image_url = existing_render(design)
+    if image_url is not None:
+        job = DesignRenderJob.objects.filter(design=design, status='done', image_url=image_url) \
+            .order_by('-finished_at').first()
+        if job is None:
+            # Rendered for another design with the same content, or pruned
+            now = timezone.now()
+            job = DesignRenderJob.objects.create(design=design, status='done', image_url=image_url,
+                                                 started_at=now, finished_at=now)
+        return job
+
+    job = _active_jobs().filter(design=design).order_by('-created_at').first()
+    if job is not None:
+        return job
+
+    max_pending = getattr(settings, 'DESIGN_RENDER_MAX_PENDING', DEFAULT_MAX_PENDING)
+    if _active_jobs().count() >= max_pending:
+        raise RenderQueueFull("Too many designs are being rendered, please retry shortly")
+
+    job = DesignRenderJob.objects.create(design=design)
+    transaction.on_commit(lambda: render_design_job.delay(str(job.id)))
+    return job
+
+
+def run_render_job(job_id):
+    """Worker side of a job: render, then record the outcome on the job."""
+    claimed = DesignRenderJob.objects.filter(id=job_id, status='queued').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    job = DesignRenderJob.objects.select_related('design__product').get(id=job_id)
+    try:
+        job.image_url = render_design(job.design)
+        job.status = 'done'
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'image_url', 'error', 'finished_at'])
+    return job
+
+
+def design_price(design):
+    """Total for the design's size and quantity, with the same pricing as ProductPriceView."""
+    pricing = get_compiled_pricing(design.product_id) if design.product_id else None
+    if not pricing:
+        return 0
+    try:
+        from_unit = design.unit if design.unit else 'cm'
+        width = Decimal(str(design.width)) if design.width is not None else None
+        height = Decimal(str(design.height)) if design.height is not None else None
+        quantity = design.quantity if design.quantity is not None else 1
+        return float(pricing.base_price(width, height, from_unit, quantity))
+    except (KeyError, InvalidOperation, TypeError, AttributeError) as e:
+        print(f"Price calculation error: {str(e)}")
+        return 0
+
+
+def render_job_data(job, request):
+    """The render-status resource; a finished job carries what generate_design_image used to return."""
+    data = {
+        "job_id": str(job.id),
+        "design_id": str(job.design_id),
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == 'done':
+        design = job.design
+        product = design.product
+        data["result"] = {
+            "amazon_url": product.amazon_url if product and product.amazon_url else None,
+            "allow_direct_add_to_cart": product.allow_direct_add_to_cart if product else False,
+            "id": product.id if product else None,
+            "name": product.name if product else "Unnamed Product",
+            "design_image": request.build_absolute_uri(job.image_url),
+            **{
+                f"design_{rendition}": request.build_absolute_uri(url) if url else None
+                for rendition, url in rendition_urls(job.image_url).items()
+            },
+            "quantity": design.quantity,
+            "timestamp": int(job.finished_at.timestamp() * 1000),
+            "total": round(design_price(design), 2),
+            "customSize": {
+                "width": float(design.width) if design.width else 1,
+                "height": float(design.height) if design.height else 1,
+                "unit": design.unit if design.unit else "cm"
+            }
+        }
+    return data
@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from customer.design_render import local_render_path, rendition_urls, write_renditions
+from customer.models import CartItem, CustomerDesign
+
+
+class Command(BaseCommand):
+    help = ("Write the thumbnail and preview renditions of existing design renders and fill "
+            "CustomerDesign.design_*_url / CartItem.design_thumbnail and design_preview, in chunks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        designs = CustomerDesign.objects.filter(design_image_url__isnull=False, design_thumbnail_url__isnull=True)
+        filled = 0
+        missing = 0
+        last_pk = None
+        while True:
+            batch = designs.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch.only('pk', 'design_image_url', 'design_thumbnail_url', 'design_preview_url')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            to_update = []
+            for design in batch:
+                image_path = local_render_path(design.design_image_url)
+                if not image_path or not os.path.exists(image_path):
+                    missing += 1
+                    continue
+                write_renditions(image_path)
+                renditions = rendition_urls(design.design_image_url)
+                design.design_thumbnail_url = renditions['thumbnail']
+                design.design_preview_url = renditions['preview']
+                to_update.append(design)
+            CustomerDesign.objects.bulk_update(to_update, ['design_thumbnail_url', 'design_preview_url'])
+            filled += len(to_update)
+            self.stdout.write(f"Designs: {filled} filled, {missing} without a local render")
+
+        items = CartItem.objects.filter(design_image__isnull=False, design_thumbnail__isnull=True)
+        items_filled = 0
+        last_id = 0
+        while True:
+            batch = list(items.filter(id__gt=last_id).order_by('id').only('id', 'design_image')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            to_update = []
+            for item in batch:
+                image_path = local_render_path(item.design_image)
+                if image_path and os.path.exists(image_path):
+                    write_renditions(image_path)
+                renditions = rendition_urls(item.design_image)
+                if renditions['thumbnail']:
+                    item.design_thumbnail = renditions['thumbnail']
+                    item.design_preview = renditions['preview']
+                    to_update.append(item)
+            CartItem.objects.bulk_update(to_update, ['design_thumbnail', 'design_preview'])
+            items_filled += len(to_update)
+            self.stdout.write(f"Cart items: {items_filled} filled (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Filled renditions for {filled} designs and {items_filled} cart items ({missing} designs without a local render)"
+        ))
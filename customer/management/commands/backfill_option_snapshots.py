@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from customer.cart import fill_option_snapshots
+from customer.models import CartItem
+
+
+class Command(BaseCommand):
+    help = "Fill CartItem.option_snapshot for lines saved before snapshots existed, in id order and in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--ordered-only', action='store_true',
+                            help="Only lines that belong to an order (status other than pending)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        items = CartItem.objects.filter(option_snapshot__isnull=True)
+        if options['ordered_only']:
+            items = items.exclude(status='pending')
+
+        filled = 0
+        last_id = 0
+        while True:
+            batch = list(items.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            filled += fill_option_snapshots(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Filled {filled} cart items (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Filled option snapshots for {filled} cart items"))
@@ -0,0 +1,99 @@
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+
+from customer.design_assets import decoded_assets
+from customer.design_render import fetch_assets, render_canvas
+
+
+def _png(index, size=256):
+    buffer = BytesIO()
+    Image.new("RGBA", (size, size), ((index * 37) % 256, (index * 91) % 256, 128, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _asset_server(assets, latency):
+    """Local HTTP stand-in for the asset hosts: serves `assets` by path after `latency` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = assets.get(self.path)
+            time.sleep(latency)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', f'"{hash(body)}"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Command(BaseCommand):
+    help = ("Time the asset fetch of a multi-layer design, sequential vs parallel, "
+            "against a local HTTP server with artificial latency (cold caches each run).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layers', type=int, default=12)
+        parser.add_argument('--latency', type=float, default=0.3, help="Seconds the stand-in waits per asset")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        layers = options['layers']
+        assets = {f"/asset-{index}.png": _png(index) for index in range(layers)}
+        server = _asset_server(assets, options['latency'])
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        design_data = {"scenes": [{"layers": [
+            {"type": "StaticImage", "src": base_url + path, "left": 10 * index, "top": 10 * index,
+             "width": 128, "height": 128}
+            for index, path in enumerate(assets)
+        ]}]}
+
+        try:
+            results = {}
+            for label, workers in (('sequential', 1), ('parallel', options['workers'])):
+                timings = []
+                for _ in range(options['repeat']):
+                    with tempfile.TemporaryDirectory() as cache_dir, \
+                            override_settings(DESIGN_ASSET_CACHE_DIR=cache_dir):
+                        decoded_assets.clear()
+                        started = time.perf_counter()
+                        fetched = fetch_assets(design_data, workers=workers)
+                        render_canvas(design_data, 1200, 1200, assets=fetched)
+                        timings.append(time.perf_counter() - started)
+                        if len(fetched) != layers:
+                            self.stderr.write(f"{label}: only {len(fetched)} of {layers} assets loaded")
+                results[label] = min(timings)
+                self.stdout.write(f"{label:<11} workers={workers:<3} best of {options['repeat']}: {results[label]:.3f}s")
+
+            # Warm caches: no network at all
+            with tempfile.TemporaryDirectory() as cache_dir, override_settings(DESIGN_ASSET_CACHE_DIR=cache_dir):
+                decoded_assets.clear()
+                fetch_assets(design_data, workers=options['workers'])
+                started = time.perf_counter()
+                render_canvas(design_data, 1200, 1200)
+                self.stdout.write(f"{'warm':<11} workers={options['workers']:<3} {time.perf_counter() - started:.3f}s")
+        finally:
+            server.shutdown()
+            decoded_assets.clear()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{layers} assets at {options['latency']}s each: "
+            f"{results['sequential'] / results['parallel']:.1f}x faster in parallel"
+        ))
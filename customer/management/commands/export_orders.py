@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from customer.order_export import (
+    EXPORT_CHUNK_SIZE, ExportFilterError, export_queryset, iter_csv, iter_export_rows, write_xlsx,
+)
+
+
+class Command(BaseCommand):
+    help = "Export orders, one row per cart line, as CSV or XLSX for finance."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Date or datetime, e.g. 2025-01-01")
+        parser.add_argument('--to', dest='date_to', help="Date (inclusive) or datetime")
+        parser.add_argument('--status', action='append', default=[], help="Order status; repeat for several")
+        parser.add_argument('--payment-status')
+        parser.add_argument('--payment-method')
+        parser.add_argument('--format', dest='output_format', default='csv', choices=['csv', 'xlsx'])
+        parser.add_argument('--output', help="File to write to (default: stdout, CSV only)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            orders = export_queryset(
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+                statuses=options['status'],
+                payment_status=options['payment_status'],
+                payment_method=options['payment_method'],
+            )
+        except ExportFilterError as e:
+            raise CommandError(str(e))
+
+        rows = iter_export_rows(orders, chunk_size=options['chunk_size'])
+
+        if options['output_format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError("--output is required for xlsx")
+            write_xlsx(rows, options['output'])
+        elif not options['output']:
+            for chunk in iter_csv(rows):
+                self.stdout.write(chunk, ending='')
+            return
+        else:
+            with open(options['output'], 'w', newline='') as output:
+                for chunk in iter_csv(rows):
+                    output.write(chunk)
+
+        self.stderr.write(self.style.SUCCESS(f"Orders exported to {options['output']}"))
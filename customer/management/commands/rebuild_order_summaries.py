@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from customer.models import Order
+from customer.order_summary import refresh_order_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OrderSummary read model from orders and their carts, in id order and in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--customer-id', type=int, help="Only the orders of this customer")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        orders = Order.objects.all()
+        if options['customer_id']:
+            orders = orders.filter(customer_id=options['customer_id'])
+
+        rebuilt = 0
+        last_id = 0
+        while True:
+            ids = list(orders.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            refresh_order_summaries(ids)
+            rebuilt += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Rebuilt {rebuilt} order summaries (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} order summaries"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0069_cart_items_total_cart_items_count_cart_priced_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='option_snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0070_cartitem_option_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='customer.order')),
+                ('status', models.CharField(choices=[('ordered', 'Ordered'), ('shipped', 'Shipped'), ('arrived', 'Arrived'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='ordered', max_length=15)),
+                ('payment_status', models.CharField(blank=True, max_length=100, null=True)),
+                ('ordered_date', models.DateTimeField()),
+                ('delivered_date', models.DateTimeField(blank=True, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('items_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.PositiveIntegerField(default=0)),
+                ('first_product_name', models.CharField(blank=True, default='', max_length=900)),
+                ('thumbnail', models.URLField(blank=True, max_length=900, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_summaries', to='customer.customer')),
+            ],
+            options={
+                'verbose_name_plural': 'Order Summaries',
+                'indexes': [models.Index(fields=['customer', '-ordered_date', '-order'], name='customer_or_custome_cb84a7_idx')],
+            },
+        ),
+    ]
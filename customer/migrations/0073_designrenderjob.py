@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0072_paymentconfirmation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesignRenderJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('image_url', models.URLField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('design', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_jobs', to='customer.customerdesign')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['design', 'status'], name='customer_de_design__c07bc1_idx')],
+            },
+        ),
+    ]
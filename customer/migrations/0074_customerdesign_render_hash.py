@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0073_designrenderjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdesign',
+            name='render_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0074_customerdesign_render_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='design_preview',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='design_thumbnail',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerdesign',
+            name='design_preview_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerdesign',
+            name='design_thumbnail_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0075_design_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesignRenderCounter',
+            fields=[
+                ('outcome', models.CharField(choices=[('hit', 'Hit'), ('miss', 'Miss')], max_length=10, primary_key=True, serialize=False)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
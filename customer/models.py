@@ -4,6 +4,7 @@ import random
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 import string
+from decimal import Decimal
 
 # Create your models here.
 customer_status = (('lead','LEAD'),('client','CLIENT'),('data','Data'))
@@ -136,6 +137,10 @@ class Cart(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     higher_designer = models.BooleanField(default=False, null=True, blank=True)
     site_visit = models.BooleanField(default=False, null=True, blank=True)
+    # Server priced totals of the pending items, refreshed by customer.cart
+    items_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    items_count = models.PositiveIntegerField(default=0)
+    priced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Cart for {self.customer.user.first_name} ({self.status})"
@@ -155,10 +160,16 @@ class CartItem(models.Model):
     custom_height = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     size_unit = models.CharField(max_length=10, choices=SIZE_CHOICES, default='cm')
     design_image = models.URLField(null=True, blank=True)
+    # Downscaled copies of design_image for lists, emails and the admin
+    design_thumbnail = models.URLField(null=True, blank=True)
+    design_preview = models.URLField(null=True, blank=True)
     # Order Status
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2,blank=True)
+    # Prices as sent by the client, kept for the price drift report
+    client_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    client_total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     status = models.CharField(max_length=15, choices=CART_ITEM_STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     hire_designer = models.ForeignKey(Designer_rate,on_delete=models.CASCADE,null=True,blank=True)
@@ -193,33 +204,42 @@ class CartItem(models.Model):
     distance_object_id = models.PositiveIntegerField(null=True, blank=True)
     distance = GenericForeignKey('distance_content_type', 'distance_object_id')
     is_smart = models.BooleanField(default=False, null=True, blank=True)
-
-    def save(self, *args, **kwargs):
-        """Override save to handle stock reduction when status changes to ordered"""
-        is_new = self._state.adding
-
-        if not is_new:
-            # Get the original object from database
-            try:
-                old_obj = CartItem.objects.get(pk=self.pk)
-                # If status changed to 'ordered', reduce stock
-                if (old_obj.status != 'ordered' and self.status == 'ordered' and
-                        self.product and self.quantity):
-                    self.reduce_product_stock()
-            except CartItem.DoesNotExist:
-                pass
-
-        super().save(*args, **kwargs)
-
-    def reduce_product_stock(self):
-        """Reduce product stock when item is ordered"""
-        try:
-            if hasattr(self.product, 'inventory_stock'):
-                inventory_stock = self.product.inventory_stock
-                return inventory_stock.reduce_stock(self.quantity)
-        except Exception as e:
-            print(f"Error reducing stock: {e}")
-        return False
+    # Copy of the five options above taken when the line is saved:
+    # {kind: {id, source, name, size, km, unit, days, description, price_percentage, price_decimal, price}}
+    option_snapshot = models.JSONField(null=True, blank=True)
+
+    SNAPSHOT_DECIMAL_FIELDS = ('price_percentage', 'price_decimal', 'price')
+
+    def get_option(self, kind):
+        """
+        An option of this line ('thickness', 'delivery', 'turnaround_time',
+        'installation' or 'distance') as a dict, from the snapshot when there is
+        one, else from the generic foreign key.
+        """
+        if self.option_snapshot is not None:
+            option = self.option_snapshot.get(kind)
+            if option is None:
+                return None
+            return {
+                field: Decimal(value) if field in self.SNAPSHOT_DECIMAL_FIELDS and value is not None else value
+                for field, value in option.items()
+            }
+
+        row = getattr(self, kind)
+        if row is None:
+            return None
+        return {
+            'id': row.id,
+            'name': getattr(row, 'name', None),
+            'size': getattr(row, 'size', None),
+            'km': getattr(row, 'km', None),
+            'unit': getattr(row, 'unit', None),
+            'days': getattr(row, 'days', None),
+            'description': getattr(row, 'description', None),
+            'price_percentage': getattr(row, 'price_percentage', None),
+            'price_decimal': getattr(row, 'price_decimal', None),
+            'price': getattr(row, 'price', None),
+        }
 
     def __str__(self):
         return self.product.name
@@ -268,6 +288,48 @@ class Order(models.Model):
         return f"Order {self.id} - {self.customer.user.first_name} ({self.status})"
 
 
+class OrderSummary(models.Model):
+    """
+    Denormalized row per order for the customer's order history list, so the
+    list never touches carts, items or options. Kept in step by
+    customer/signals.py; rebuild with `manage.py rebuild_order_summaries`.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='order_summaries')
+    status = models.CharField(max_length=15, choices=Order.ORDER_STATUS_CHOICES, default='ordered')
+    payment_status = models.CharField(max_length=100, null=True, blank=True)
+    ordered_date = models.DateTimeField()
+    delivered_date = models.DateTimeField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    items_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    first_product_name = models.CharField(max_length=900, blank=True, default='')
+    thumbnail = models.URLField(max_length=900, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Order Summaries"
+        indexes = [models.Index(fields=['customer', '-ordered_date', '-order'])]
+
+    def __str__(self):
+        return f"Order #{self.order_id} summary"
+
+
+class PaymentConfirmation(models.Model):
+    """
+    One row per Stripe PaymentIntent turned into an order. The unique
+    payment_intent_id makes confirm_payment idempotent: a retry or a double
+    submit finds the row and gets the same order back.
+    """
+    payment_intent_id = models.CharField(max_length=255, unique=True)
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment_confirmation')
+    cart = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_confirmations')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.payment_intent_id} -> Order #{self.order_id}"
+
+
 
 
 # OTP RECORDS
@@ -322,6 +384,11 @@ class CustomerDesign(models.Model):
     # JSON design data (stored as text for MySQL compatibility)
     design_data = models.TextField()
     design_image_url = models.URLField(null=True, blank=True)  # New field for design image URL
+    # Downscaled copies of design_image_url (the print-resolution render)
+    design_thumbnail_url = models.URLField(null=True, blank=True)
+    design_preview_url = models.URLField(null=True, blank=True)
+    # Hash of the design JSON and canvas size design_image_url was rendered from
+    render_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -342,6 +409,51 @@ class CustomerDesign(models.Model):
             )
         ]
 
+
+class DesignRenderJob(models.Model):
+    """
+    One render of a CustomerDesign to PNG, run by a Celery worker on the
+    design_render queue (see customer/design_render.py). Clients poll it by id.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    design = models.ForeignKey(CustomerDesign, on_delete=models.CASCADE, related_name='render_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    image_url = models.URLField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['design', 'status'])]
+
+    def __str__(self):
+        return f"Render {self.id} of design {self.design_id} ({self.status})"
+
+
+class DesignRenderCounter(models.Model):
+    """
+    Render cache hit/miss totals. Counted in the database so the web processes
+    (hits answered at once) and the render workers add up to one figure.
+    """
+    OUTCOME_CHOICES = [
+        ('hit', 'Hit'),
+        ('miss', 'Miss'),
+    ]
+
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, primary_key=True)
+    count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.outcome}: {self.count}"
+
 from django.utils import timezone
 from datetime import timedelta
 
@@ -0,0 +1,192 @@
+"""
+Order export for finance: one row per cart line with the order, customer,
+address, VAT and site visit fee repeated on each line (orders without lines
+get one row).
+
+Orders are read with iterator(chunk_size=...) and the date, status and payment
+filters run in SQL, so memory stays flat however many orders match. CSV is
+streamed as it is produced; XLSX goes through xlsxwriter's constant_memory mode
+into a temporary file.
+"""
+import csv
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import CartItem, Order
+
+
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_COLUMNS = [
+    'order_id', 'ordered_date', 'status', 'payment_method', 'payment_status', 'transaction_id',
+    'order_amount', 'vat_percentage', 'vat_amount', 'site_visit', 'site_visit_fee', 'delivered_date',
+    'customer_id', 'customer_name', 'customer_email',
+    'company_name', 'address_line1', 'address_line2', 'city', 'state', 'zip_code', 'country',
+    'cart_item_id', 'product_id', 'product_name', 'width', 'height', 'unit', 'quantity',
+    'unit_price', 'line_total', 'hire_designer', 'design_description',
+    'thickness', 'delivery', 'turnaround_time', 'installation', 'distance',
+]
+
+OPTION_KINDS = ('thickness', 'delivery', 'turnaround_time', 'installation', 'distance')
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def _date_filter(value, upper):
+    """
+    ordered_date lookup for a date or datetime bound. A plain date as upper bound
+    includes that whole day. Kept as a range on the column so the index is used.
+    """
+    # Date first: parse_datetime also accepts "2025-01-31" and reads it as midnight
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        raise ExportFilterError(f"Invalid date: {value}")
+    if day is not None:
+        if upper:
+            return {'ordered_date__lt': _aware(datetime.combine(day + timedelta(days=1), time.min))}
+        moment = datetime.combine(day, time.min)
+    if moment is None:
+        raise ExportFilterError(f"Invalid date: {value}")
+    return {'ordered_date__lte' if upper else 'ordered_date__gte': _aware(moment)}
+
+
+def _aware(moment):
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(date_from=None, date_to=None, statuses=None, payment_status=None, payment_method=None):
+    """Orders to export, oldest first, with the filters applied in SQL."""
+    orders = Order.objects.select_related('customer__user', 'address', 'cart').prefetch_related(
+        Prefetch('cart__items', queryset=CartItem.objects.select_related('product', 'hire_designer').order_by('id'))
+    )
+    if date_from:
+        orders = orders.filter(**_date_filter(date_from, upper=False))
+    if date_to:
+        orders = orders.filter(**_date_filter(date_to, upper=True))
+    if statuses:
+        valid = {value for value, _label in Order.ORDER_STATUS_CHOICES}
+        unknown = [value for value in statuses if value not in valid]
+        if unknown:
+            raise ExportFilterError(f"Invalid status: {', '.join(unknown)}")
+        orders = orders.filter(status__in=statuses)
+    if payment_status:
+        orders = orders.filter(payment_status__icontains=payment_status)
+    if payment_method:
+        orders = orders.filter(payment_method=payment_method)
+    return orders.order_by('ordered_date', 'id')
+
+
+def _option_text(option):
+    if option is None:
+        return ''
+    label = option.get('name') or option.get('size') or option.get('km') or option.get('id')
+    if option.get('price_percentage'):
+        return f"{label} ({option['price_percentage']}%)"
+    price = option.get('price_decimal') or option.get('price')
+    return f"{label} ({price})" if price else str(label)
+
+
+def iter_export_rows(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """One dict per exported line, keyed by EXPORT_COLUMNS."""
+    for order in orders.iterator(chunk_size=chunk_size):
+        customer = order.customer
+        user = customer.user if customer else None
+        address = order.address
+        order_columns = {
+            'order_id': order.id,
+            'ordered_date': order.ordered_date,
+            'status': order.status,
+            'payment_method': order.payment_method,
+            'payment_status': order.payment_status,
+            'transaction_id': order.transaction_id,
+            'order_amount': order.amount,
+            'vat_percentage': order.vat_percentage,
+            'vat_amount': order.vat_amount,
+            'site_visit': order.site_visit,
+            'site_visit_fee': order.site_visit_fee,
+            'delivered_date': order.delivered_date,
+            'customer_id': customer.id if customer else None,
+            'customer_name': f"{user.first_name} {user.last_name}".strip() if user else '',
+            'customer_email': user.email if user else '',
+            'company_name': address.company_name if address else '',
+            'address_line1': address.address_line1 if address else '',
+            'address_line2': address.address_line2 if address else '',
+            'city': address.city if address else '',
+            'state': address.state if address else '',
+            'zip_code': address.zip_code if address else '',
+            'country': address.country if address else '',
+        }
+
+        items = list(order.cart.items.all()) if order.cart else []
+        if not items:
+            yield {column: order_columns.get(column) for column in EXPORT_COLUMNS}
+            continue
+
+        for item in items:
+            designer = item.hire_designer
+            yield {
+                **order_columns,
+                'cart_item_id': item.id,
+                'product_id': item.product_id,
+                'product_name': item.product.name if item.product else '',
+                'width': item.custom_width,
+                'height': item.custom_height,
+                'unit': item.size_unit,
+                'quantity': item.quantity,
+                'unit_price': item.price,
+                'line_total': item.total_price,
+                'hire_designer': f"{designer.get_rate_type_display()} {designer.hours or ''} ({designer.amount})" if designer else '',
+                'design_description': item.design_description or '',
+                # Options from the line's snapshot (see CartItem.get_option)
+                **{kind: _option_text(item.get_option(kind)) for kind in OPTION_KINDS},
+            }
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_cell(row[column]) for column in EXPORT_COLUMNS])
+
+
+def write_xlsx(rows, output):
+    """
+    Write the rows to `output` (path or binary file object) as an XLSX workbook.
+    xlsxwriter's constant_memory mode flushes each row to disk as it is written.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet("Orders")
+    worksheet.write_row(0, 0, EXPORT_COLUMNS)
+    for row_number, row in enumerate(rows, start=1):
+        worksheet.write_row(row_number, 0, [
+            float(row[column]) if isinstance(row[column], Decimal) else _cell(row[column])
+            for column in EXPORT_COLUMNS
+        ])
+    workbook.close()
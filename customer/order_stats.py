@@ -0,0 +1,47 @@
+"""
+Statistics block of the admin order list.
+
+One conditional aggregate (a Sum and a filtered Count per status) over the
+filtered orders, cached per filter set for a short time.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Order
+
+
+ORDER_STATS_TIMEOUT = 30
+ORDER_STATS_KEY = "orders:stats"
+
+
+def order_statistics(orders):
+    """total_orders, total_amount and status_counts of `orders` in one query."""
+    aggregates = {
+        'total_orders': Count('id', distinct=True),
+        'total_amount': Sum('amount'),
+    }
+    for status_value, _label in Order.ORDER_STATUS_CHOICES:
+        aggregates[f'status_{status_value}'] = Count('id', filter=Q(status=status_value), distinct=True)
+
+    row = orders.order_by().aggregate(**aggregates)
+    return {
+        "total_orders": row['total_orders'],
+        "total_amount": row['total_amount'] or 0,
+        "status_counts": {
+            status_value: row[f'status_{status_value}'] for status_value, _label in Order.ORDER_STATUS_CHOICES
+        },
+    }
+
+
+def cached_order_statistics(orders, filters):
+    """order_statistics, cached for ORDER_STATS_TIMEOUT seconds per `filters` dict."""
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+    key = f"{ORDER_STATS_KEY}:{digest}"
+    statistics = cache.get(key)
+    if statistics is None:
+        statistics = order_statistics(orders)
+        cache.set(key, statistics, ORDER_STATS_TIMEOUT)
+    return statistics
@@ -0,0 +1,78 @@
+"""
+OrderSummary read model: what the "My Orders" list shows (status, totals,
+item count, thumbnail), one row per order.
+
+Rows are rebuilt from the order and its cart with one aggregate query per
+batch, after commit, whenever an order or one of its cart items is saved.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CartItem, Order, OrderSummary
+
+
+SUMMARY_FIELDS = [
+    'customer', 'status', 'payment_status', 'ordered_date', 'delivered_date', 'amount',
+    'items_count', 'total_quantity', 'first_product_name', 'thumbnail',
+]
+
+
+def _summary_rows(order_ids):
+    first_item = CartItem.objects.filter(cart_id=OuterRef('cart_id')).order_by('id')
+    return Order.objects.filter(id__in=order_ids).annotate(
+        summary_items_count=Count('cart__items'),
+        summary_total_quantity=Sum('cart__items__quantity'),
+        summary_product_name=Subquery(first_item.values('product__name')[:1]),
+        # The customer's design (its thumbnail when there is one), else the product picture
+        summary_thumbnail=Coalesce(
+            Subquery(first_item.values('design_thumbnail')[:1]),
+            Subquery(first_item.values('design_image')[:1]),
+            Subquery(first_item.values('product__image1')[:1]),
+        ),
+    )
+
+
+def refresh_order_summaries(order_ids):
+    """Rebuild the OrderSummary rows of these orders (and drop those of deleted orders)."""
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+
+    existing = set(OrderSummary.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+    # bulk_update does not apply auto_now, so the time is set on the rows
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for order in _summary_rows(order_ids):
+        summary = OrderSummary(
+            order_id=order.id,
+            customer_id=order.customer_id,
+            status=order.status,
+            payment_status=order.payment_status,
+            ordered_date=order.ordered_date,
+            delivered_date=order.delivered_date,
+            amount=order.amount,
+            items_count=order.summary_items_count,
+            total_quantity=order.summary_total_quantity or 0,
+            first_product_name=order.summary_product_name or '',
+            thumbnail=order.summary_thumbnail,
+            updated_at=now,
+        )
+        (to_update if order.id in existing else to_create).append(summary)
+        existing.discard(order.id)
+
+    if to_create:
+        OrderSummary.objects.bulk_create(to_create)
+    if to_update:
+        OrderSummary.objects.bulk_update(to_update, SUMMARY_FIELDS + ['updated_at'])
+    if existing:
+        OrderSummary.objects.filter(order_id__in=existing).delete()
+
+
+def schedule_summary_refresh(order_ids):
+    # After commit, so the rows are built from the final order and cart state
+    order_ids = list(order_ids)
+    if order_ids:
+        transaction.on_commit(lambda: refresh_order_summaries(order_ids))
@@ -0,0 +1,158 @@
+"""
+Card payment confirmation: turns a succeeded Stripe PaymentIntent into an order.
+
+Idempotent on the PaymentIntent id. A PaymentConfirmation row (unique
+payment_intent_id) is written with the order, so a retry or double submit is
+answered from it without calling Stripe or touching the cart again. The cart
+row is locked while the order is written and every write (order, confirmation,
+cart, stock, line statuses) happens in one transaction. The confirmation email
+and the CRM update are queued as independent Celery tasks once that transaction
+commits, so the response never waits on SMTP and a failing email does not hold
+back the CRM update.
+
+Stripe is reached through `retrieve_intent` (stripe.PaymentIntent.retrieve by
+default), which tests replace with a local stub.
+"""
+import logging
+from decimal import Decimal
+
+import stripe
+from celery import group
+from django.db import IntegrityError, transaction
+
+from products_app.checkout_config import get_checkout_config
+
+from .cart import cart_items_total, commit_cart_stock, fill_option_snapshots, refresh_cart_totals, release_cart_stock
+from .models import Cart, Customer_Address, Order, PaymentConfirmation
+
+logger = logging.getLogger(__name__)
+
+
+# Intent statuses after which the held stock is given back
+FAILED_INTENT_STATUSES = ('canceled', 'requires_payment_method')
+
+
+class PaymentError(Exception):
+    """Raised when a payment cannot be confirmed; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def confirmed_order(payment_intent_id):
+    confirmation = PaymentConfirmation.objects.select_related('order').filter(
+        payment_intent_id=payment_intent_id
+    ).first()
+    return confirmation.order if confirmation else None
+
+
+def confirm_card_payment(payment_intent_id, cart_id, retrieve_intent=None):
+    """
+    Place the order paid by `payment_intent_id`. Returns (order, created);
+    created is False when the intent had already been confirmed.
+    """
+    if not payment_intent_id or not cart_id:
+        raise PaymentError("payment_intent_id and cart_id are required")
+
+    order = confirmed_order(payment_intent_id)
+    if order is not None:
+        return order, False
+
+    intent = (retrieve_intent or stripe.PaymentIntent.retrieve)(payment_intent_id)
+    if intent.status != 'succeeded':
+        if intent.status in FAILED_INTENT_STATUSES:
+            release_cart_stock(cart_id)
+        raise PaymentError("Payment failed.")
+
+    metadata = getattr(intent, 'metadata', None) or {}
+    if metadata.get('cart_id') is not None and str(metadata.get('cart_id')) != str(cart_id):
+        raise PaymentError("Payment does not belong to this cart.")
+
+    try:
+        return _place_order(payment_intent_id, cart_id), True
+    except IntegrityError:
+        # Another request confirmed the same intent first
+        order = confirmed_order(payment_intent_id)
+        if order is None:
+            raise
+        return order, False
+
+
+def _place_order(payment_intent_id, cart_id):
+    with transaction.atomic():
+        try:
+            cart = Cart.objects.select_for_update().select_related('customer__user').get(id=cart_id)
+        except Cart.DoesNotExist:
+            raise PaymentError("Cart not found.", status_code=404)
+
+        # Checked again under the cart lock: a concurrent confirm of this intent has finished by now
+        order = confirmed_order(payment_intent_id)
+        if order is not None:
+            return order
+
+        customer = cart.customer
+        customer_address = Customer_Address.objects.filter(customer=customer).order_by('-id').first()
+        if customer_address is None:
+            raise PaymentError("Customer address not found.")
+
+        checkout_config = get_checkout_config()
+        site_visit_fee = checkout_config.site_visit_fee(cart.site_visit)
+        base_price, vat_amount, total_with_vat = checkout_config.apply_vat(cart_items_total(cart) + site_visit_fee)
+
+        order = Order.objects.create(
+            customer=customer,
+            address=customer_address,
+            cart=cart,
+            payment_method='card',
+            payment_status='paid',
+            amount=total_with_vat,
+            transaction_id=payment_intent_id,
+            site_visit=cart.site_visit,
+            site_visit_fee=site_visit_fee,
+            vat_percentage=checkout_config.vat_percentage,
+            vat_amount=vat_amount,
+        )
+        PaymentConfirmation.objects.create(payment_intent_id=payment_intent_id, order=order, cart=cart)
+
+        cart.status = 'checked_out'
+        cart.save(update_fields=['status', 'updated_at'])
+
+        cart_items = list(cart.items.filter(status='pending'))
+        # Payment is taken: the order goes ahead even if a line lost its stock
+        stock_shortages = commit_cart_stock(cart, cart_items)
+        if stock_shortages:
+            logger.warning(f"Order {order.id} (payment {payment_intent_id}) placed with stock shortages: {stock_shortages}")
+        fill_option_snapshots(cart_items)
+        cart.items.filter(id__in=[item.id for item in cart_items]).update(status='ordered')
+        refresh_cart_totals(cart)
+
+        customer_email = customer.user.email if customer and customer.user else None
+        transaction.on_commit(lambda: schedule_order_notifications(order.id, customer_email))
+
+    return order
+
+
+def schedule_order_notifications(order_id, customer_email):
+    from pep_app.tasks import link_contact_and_update_status
+
+    from .tasks import send_order_confirmation_email
+
+    tasks = [send_order_confirmation_email.si(order_id)]
+    if customer_email:
+        tasks.append(link_contact_and_update_status.si(customer_email))
+    group(tasks).apply_async()
+
+
+def order_amounts(order):
+    """Amounts of a card order as create_payment_intent showed them: base, VAT, total."""
+    vat_amount = order.vat_amount or Decimal('0.00')
+    return {
+        'base_product_amount': float(order.amount - vat_amount),
+        'vat_percentage': float(order.vat_percentage or 0),
+        'vat_amount': float(vat_amount),
+        'total_with_vat': float(order.amount),
+        'site_visit': order.site_visit,
+        'site_visit_fee': float(order.site_visit_fee or 0),
+    }
@@ -106,7 +106,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = [
             'id', 'product', 'custom_width', 'custom_height', 'size_unit',
-            'design_image', 'quantity', 'price', 'total_price', 'hire_designer',
+            'design_image', 'design_thumbnail', 'design_preview', 'quantity', 'price', 'total_price', 'hire_designer',
             'status', 'created_at', 'is_smart', 'design_description',
             # Remove the direct foreign key fields from here
             'thickness_details', 'delivery_details', 'turnaround_details',
@@ -114,54 +114,56 @@ class CartItemSerializer(serializers.ModelSerializer):
         ]
         # Remove the extra_kwargs since we're not including the FK fields in response
 
+    # Options come from the line's snapshot (CartItem.get_option), not the generic foreign keys
+
     def get_thickness_details(self, obj):
-        if obj.thickness:
+        thickness = obj.get_option('thickness')
+        if thickness:
             return {
-                'id': obj.thickness.id,
-                'size': getattr(obj.thickness, 'size', None),
-                'price': getattr(obj.thickness, 'price', None) or
-                         getattr(obj.thickness, 'price_decimal', None)
+                'id': thickness['id'],
+                'size': thickness['size'],
+                'price': thickness['price'] or thickness['price_decimal']
             }
         return None
 
     def get_delivery_details(self, obj):
-        if obj.delivery:
+        delivery = obj.get_option('delivery')
+        if delivery:
             return {
-                'id': obj.delivery.id,
-                'name': getattr(obj.delivery, 'name', None),
-                'price': getattr(obj.delivery, 'price_decimal', None) or
-                         getattr(obj.delivery, 'price_percentage', None)
+                'id': delivery['id'],
+                'name': delivery['name'],
+                'price': delivery['price_decimal'] or delivery['price_percentage']
             }
         return None
 
     def get_turnaround_details(self, obj):
-        if obj.turnaround_time:
+        turnaround_time = obj.get_option('turnaround_time')
+        if turnaround_time:
             return {
-                'id': obj.turnaround_time.id,
-                'name': getattr(obj.turnaround_time, 'name', None),
-                'price': getattr(obj.turnaround_time, 'price_decimal', None) or
-                         getattr(obj.turnaround_time, 'price_percentage', None)
+                'id': turnaround_time['id'],
+                'name': turnaround_time['name'],
+                'price': turnaround_time['price_decimal'] or turnaround_time['price_percentage']
             }
         return None
 
     def get_installation_details(self, obj):
-        if obj.installation:
+        installation = obj.get_option('installation')
+        if installation:
             return {
-                'id': obj.installation.id,
-                'name': getattr(obj.installation, 'name', None),
-                'days': getattr(obj.installation, 'days', None),
-                'price': getattr(obj.installation, 'price_decimal', None) or
-                         getattr(obj.installation, 'price_percentage', None)
+                'id': installation['id'],
+                'name': installation['name'],
+                'days': installation['days'],
+                'price': installation['price_decimal'] or installation['price_percentage']
             }
         return None
 
     def get_distance_details(self, obj):
-        if obj.distance:
+        distance = obj.get_option('distance')
+        if distance:
             return {
-                'id': obj.distance.id,
-                'km': getattr(obj.distance, 'km', None),
-                'price': getattr(obj.distance, 'price_decimal', None) or
-                         getattr(obj.distance, 'price_percentage', None)
+                'id': distance['id'],
+                'km': distance['km'],
+                'price': distance['price_decimal'] or distance['price_percentage']
             }
         return None
 
@@ -188,6 +190,24 @@ class CartItemCreateUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
+class CartItemUpdateSerializer(serializers.ModelSerializer):
+    """Fields a customer may change on a pending line; the prices are recomputed by the server."""
+
+    class Meta:
+        model = CartItem
+        fields = [
+            'id', 'custom_width', 'custom_height', 'size_unit', 'design_image', 'quantity',
+            'design_description', 'is_smart', 'price', 'total_price', 'status',
+        ]
+        read_only_fields = ['id', 'price', 'total_price', 'status']
+
+    def validate_quantity(self, value):
+        """Ensure quantity is at least 1."""
+        if value < 1:
+            raise serializers.ValidationError("Quantity must be at least 1.")
+        return value
+
+
 class CustomerAddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer_Address
@@ -251,8 +271,10 @@ class CustomerDesignSerializer(serializers.ModelSerializer):
         model = CustomerDesign
         fields = [
             'id', 'customer', 'anonymous_uuid', 'product',
-            'width', 'height', 'unit', 'quantity', 'design_data', 'design_image_url'
+            'width', 'height', 'unit', 'quantity', 'design_data', 'design_image_url',
+            'design_thumbnail_url', 'design_preview_url'
         ]
+        read_only_fields = ['design_thumbnail_url', 'design_preview_url']
         extra_kwargs = {
             'customer': {'required': False},
             'product': {'required': False},
@@ -429,4 +451,19 @@ class OrderCreateUpdateSerializer(serializers.ModelSerializer):
         valid_methods = [choice[0] for choice in Order.PAYMENT_METHOD_CHOICES]
         if value not in valid_methods:
             raise serializers.ValidationError(f"Invalid payment method. Must be one of: {', '.join(valid_methods)}")
-        return value
\ No newline at end of file
+        return value
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='order_id', read_only=True)
+    detail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderSummary
+        fields = [
+            'id', 'status', 'payment_status', 'ordered_date', 'delivered_date', 'amount',
+            'items_count', 'total_quantity', 'first_product_name', 'thumbnail', 'detail_url'
+        ]
+
+    def get_detail_url(self, obj):
+        # Full order (cart, items, options) from OrderDetailView, loaded when the order is opened
+        return f"/orders_detail/{obj.order_id}/"
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from customer.models import CartItem, Order
+from customer.order_summary import schedule_summary_refresh
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_summary(sender, instance, **kwargs):
+    """
+    Rebuild the order's OrderSummary once the transaction that saved it commits
+    """
+    schedule_summary_refresh([instance.pk])
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def refresh_cart_order_summaries(sender, instance, **kwargs):
+    """
+    A line of an ordered cart changed (e.g. from the admin): rebuild the summaries of its orders
+    """
+    if instance.cart_id:
+        schedule_summary_refresh(Order.objects.filter(cart_id=instance.cart_id).values_list('id', flat=True))
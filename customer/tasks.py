@@ -0,0 +1,78 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_order_confirmation_email(self, order_id):
+    """
+    Email the customer the confirmation of a card order (queued by
+    customer.payments once the order is committed).
+    """
+    from .models import Order
+    from .payments import order_amounts
+
+    order = Order.objects.select_related('customer__user', 'address').get(id=order_id)
+    user = order.customer.user if order.customer else None
+    if user is None or not user.email:
+        logger.warning(f"Order {order_id} has no customer email, confirmation not sent")
+        return
+
+    cart_items = list(order.cart.items.filter(status='ordered').select_related('product')) if order.cart_id else []
+    amounts = order_amounts(order)
+    address = order.address
+    html_message = render_to_string('order_confirmation.html', {
+        'order': order,
+        'cart_items': cart_items,
+        'product_price': float(sum(item.total_price for item in cart_items)),
+        'base_product_amount': amounts['base_product_amount'],
+        'vat_percentage': amounts['vat_percentage'],
+        'vat_amount': amounts['vat_amount'],
+        'total_with_vat': amounts['total_with_vat'],
+        'customer_name': user.first_name,
+        'customer_email': user.email,
+        'billing_address': f"{address.address_line1}, {address.city}, {address.zip_code}" if address else '',
+        'transaction_id': order.transaction_id,
+        'site_visit_fee': amounts['site_visit_fee'],
+    })
+    try:
+        send_mail(
+            'Order Confirmation',
+            strip_tags(html_message),
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+            html_message=html_message,
+        )
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
+
+@shared_task(soft_time_limit=120, time_limit=150)
+def render_design_job(job_id):
+    """
+    Render a CustomerDesign for a DesignRenderJob. Routed to the design_render
+    queue (CELERY_TASK_ROUTES) so renders run on their own workers.
+    """
+    from .design_render import run_render_job
+
+    run_render_job(job_id)
+
+
+@shared_task
+def collect_superseded_design_renders():
+    """
+    Delete design renders nothing points at any more and old render jobs
+    (scheduled in CELERY_BEAT_SCHEDULE).
+    """
+    from .design_render import collect_superseded_renders, prune_render_jobs
+
+    deleted = collect_superseded_renders()
+    pruned = prune_render_jobs()
+    logger.info(f"Deleted {deleted} superseded design renders and {pruned} old render jobs")
+    return deleted
@@ -1,3 +1,259 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products_app.inventory import restock
+from products_app.models import CustomUser, Product, VAT
+
+from .cart import refresh_cart_totals
+from .design_render import collect_superseded_renders, render_cache_stats, render_key, request_render
+from .models import (
+    Cart, CartItem, Customer, Customer_Address, CustomerDesign, DesignRenderJob, Order, OrderSummary,
+    PaymentConfirmation,
+)
+from .order_export import ExportFilterError, export_queryset
+from .payments import PaymentError, confirm_card_payment
+
+
+class StripeStub:
+    """Local stand-in for stripe.PaymentIntent.retrieve: answers from a dict of intents."""
+
+    def __init__(self, **intents):
+        self.intents = intents
+        self.calls = []
+
+    def retrieve(self, payment_intent_id):
+        self.calls.append(payment_intent_id)
+        return self.intents[payment_intent_id]
+
+
+class ConfirmCardPaymentTests(TestCase):
+    def setUp(self):
+        VAT.objects.create(percentage=Decimal('5.00'), is_inclusive=False)
+        user = CustomUser.objects.create(username="buyer", email="buyer@example.com", first_name="Buyer")
+        self.customer = Customer.objects.create(user=user)
+        Customer_Address.objects.create(customer=self.customer, address_line1="Street 1", city="Sharjah")
+
+        self.product = Product.objects.create(name="Sign", price=Decimal('10.00'))
+        restock(self.product.id, 10)
+        self.cart = Cart.objects.create(customer=self.customer, items_total=Decimal('100.00'), items_count=2)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2,
+                                price=Decimal('50.00'), total_price=Decimal('100.00'))
+        self.cart.priced_at = self.cart.created_at
+        self.cart.save()
+
+    def intent(self, status='succeeded'):
+        return SimpleNamespace(status=status, metadata={'cart_id': str(self.cart.id)})
+
+    def test_places_order_once(self):
+        stripe_stub = StripeStub(pi_1=self.intent())
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            order, created = confirm_card_payment('pi_1', self.cart.id, retrieve_intent=stripe_stub.retrieve)
+
+        self.assertTrue(created)
+        self.assertEqual(order.amount, Decimal('105.00'))
+        self.assertEqual(order.vat_amount, Decimal('5.00'))
+        self.assertEqual(order.transaction_id, 'pi_1')
+        self.assertEqual(self.cart.items.get().status, 'ordered')
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.status, 'checked_out')
+        # No pending lines are left, so the cached totals are empty
+        self.assertEqual((self.cart.items_total, self.cart.items_count), (Decimal('0.00'), 0))
+        # Email and CRM update are queued after commit, not run inline
+        self.assertTrue(callbacks)
+
+    def test_retry_returns_the_same_order_without_calling_stripe(self):
+        stripe_stub = StripeStub(pi_1=self.intent())
+        order, _created = confirm_card_payment('pi_1', self.cart.id, retrieve_intent=stripe_stub.retrieve)
+
+        again, created = confirm_card_payment('pi_1', self.cart.id, retrieve_intent=stripe_stub.retrieve)
+
+        self.assertFalse(created)
+        self.assertEqual(again.id, order.id)
+        self.assertEqual(stripe_stub.calls, ['pi_1'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(PaymentConfirmation.objects.count(), 1)
+
+    def test_failed_intent_places_no_order(self):
+        stripe_stub = StripeStub(pi_2=self.intent(status='requires_payment_method'))
+
+        with self.assertRaises(PaymentError):
+            confirm_card_payment('pi_2', self.cart.id, retrieve_intent=stripe_stub.retrieve)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.get().status, 'pending')
+
+    def test_intent_for_another_cart_is_refused(self):
+        stripe_stub = StripeStub(pi_3=SimpleNamespace(status='succeeded', metadata={'cart_id': '999999'}))
+
+        with self.assertRaises(PaymentError):
+            confirm_card_payment('pi_3', self.cart.id, retrieve_intent=stripe_stub.retrieve)
+
+        self.assertFalse(Order.objects.exists())
+
+
+class UpdateCartItemTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="shopper", email="shopper@example.com")
+        self.cart = Cart.objects.create(customer=Customer.objects.create(user=user))
+        product = Product.objects.create(name="Sign", price=Decimal('0.50'))
+        self.item = CartItem.objects.create(cart=self.cart, product=product, quantity=1, size_unit='cm',
+                                            custom_width=Decimal('10'), custom_height=Decimal('10'),
+                                            price=Decimal('50.00'), total_price=Decimal('50.00'))
+        CartItem.objects.create(cart=self.cart, product=product, quantity=1,
+                                price=Decimal('20.00'), total_price=Decimal('20.00'))
+        refresh_cart_totals(self.cart)
+
+    def patch(self, item, data):
+        return self.client.patch(reverse('update_cart_item', args=[item.id]), data, content_type='application/json')
+
+    def test_quantity_change_reprices_line_and_cart_totals(self):
+        response = self.patch(self.item, {'quantity': 3, 'price': '1.00'})
+
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        # Server price for the new quantity; a client price is ignored
+        self.assertEqual((self.item.price, self.item.total_price), (Decimal('50.00'), Decimal('150.00')))
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.items_total, self.cart.items_count), (Decimal('170.00'), 4))
+
+    def test_ordered_line_is_not_updated(self):
+        CartItem.objects.filter(pk=self.item.pk).update(status='ordered')
+
+        response = self.patch(self.item, {'quantity': 3})
+
+        self.assertEqual(response.status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 1)
+
+
+class OrderExportDateFilterTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="finance", email="finance@example.com")
+        customer = Customer.objects.create(user=user)
+        address = Customer_Address.objects.create(customer=customer, address_line1="Street 1", city="Dubai")
+        self.orders = {}
+        for day, hour in ((30, 9), (31, 15), (31, 23)):
+            order = Order.objects.create(customer=customer, address=address, amount=Decimal('10.00'))
+            # ordered_date is auto_now_add, so set it afterwards
+            Order.objects.filter(pk=order.pk).update(
+                ordered_date=datetime(2025, 1, day, hour, tzinfo=dt_timezone.utc))
+            self.orders[(day, hour)] = order.pk
+
+    def exported(self, **filters):
+        return list(export_queryset(**filters).values_list('pk', flat=True))
+
+    def test_date_only_upper_bound_includes_the_whole_day(self):
+        self.assertEqual(self.exported(date_to='2025-01-31'), list(self.orders.values()))
+
+    def test_date_only_lower_bound_starts_at_midnight(self):
+        self.assertEqual(self.exported(date_from='2025-01-31'),
+                         [self.orders[(31, 15)], self.orders[(31, 23)]])
+
+    def test_datetime_upper_bound_is_exact(self):
+        self.assertEqual(self.exported(date_to='2025-01-31T15:00:00Z'),
+                         [self.orders[(30, 9)], self.orders[(31, 15)]])
+
+    def test_invalid_date_is_refused(self):
+        with self.assertRaises(ExportFilterError):
+            self.exported(date_to='2025-02-30')
+
+
+class OrderSummaryTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="history", email="history@example.com")
+        self.customer = Customer.objects.create(user=user)
+        address = Customer_Address.objects.create(customer=self.customer, address_line1="Street 1", city="Dubai")
+        product = Product.objects.create(name="Banner", price=Decimal('20.00'), image1="banner.png")
+        cart = Cart.objects.create(customer=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.create(cart=cart, product=product, quantity=3,
+                                    price=Decimal('20.00'), total_price=Decimal('60.00'))
+            self.order = Order.objects.create(customer=self.customer, address=address, cart=cart,
+                                              amount=Decimal('60.00'))
+
+    def test_summary_is_created_with_the_order(self):
+        summary = OrderSummary.objects.get(order=self.order)
+        self.assertEqual(summary.customer_id, self.customer.id)
+        self.assertEqual(summary.status, 'ordered')
+        self.assertEqual(summary.items_count, 1)
+        self.assertEqual(summary.total_quantity, 3)
+        self.assertEqual(summary.first_product_name, "Banner")
+        self.assertIsNotNone(summary.updated_at)
+
+    def test_status_change_refreshes_the_summary(self):
+        created_at = OrderSummary.objects.get(order=self.order).updated_at
+
+        self.order.status = 'shipped'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+        summary = OrderSummary.objects.get(order=self.order)
+        self.assertEqual(summary.status, 'shipped')
+        self.assertGreaterEqual(summary.updated_at, created_at)
+
+
+class DesignRenderStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='/media/')
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.designs_dir = os.path.join(media_root, 'designs')
+        os.makedirs(self.designs_dir)
+
+    def write(self, name, age=timedelta(days=2)):
+        path = os.path.join(self.designs_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'png')
+        modified = time.time() - age.total_seconds()
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_collect_deletes_only_old_unreferenced_files(self):
+        CustomerDesign.objects.create(
+            anonymous_uuid=uuid.uuid4(), design_data='{}', design_image_url='http://testserver/media/designs/aaa.png')
+        user = CustomUser.objects.create(username="designer", email="designer@example.com")
+        cart = Cart.objects.create(customer=Customer.objects.create(user=user))
+        CartItem.objects.create(cart=cart, product=Product.objects.create(name="Sign", price=Decimal('10.00')),
+                                total_price=Decimal('10.00'), design_image='/media/designs/bbb.png')
+
+        kept = [
+            self.write('aaa.png'),
+            self.write('aaa.thumbnail.png'),   # rendition of a referenced render
+            self.write('bbb.png'),
+            self.write('ddd.png', age=timedelta(hours=1)),   # unreferenced, within the grace period
+        ]
+        deleted = [
+            self.write('ccc.png'),
+            self.write('ccc.preview.png'),
+            self.write('aaa.png.0f1e.tmp'),    # leftover of an interrupted write
+        ]
+
+        self.assertEqual(collect_superseded_renders(grace=timedelta(days=1)), len(deleted))
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+        self.assertFalse(any(os.path.exists(path) for path in deleted))
+
+    def test_stored_render_reuses_its_job_and_counts_hits(self):
+        design = CustomerDesign.objects.create(anonymous_uuid=uuid.uuid4(), design_data='{}')
+        key = render_key({}, 1200, 1200)
+        for name in (f'{key}.png', f'{key}.thumbnail.png', f'{key}.preview.png'):
+            self.write(name)
+
+        first = request_render(design)
+        second = request_render(design)
+
+        self.assertEqual(first.status, 'done')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(DesignRenderJob.objects.count(), 1)
+        self.assertEqual(render_cache_stats()['hits'], 2)
@@ -41,6 +41,7 @@ urlpatterns = [
     # CartITEM Delete
 
     path("cartitem/delete/<int:cart_item_id>/", views.DeleteCartItemView.as_view(), name="delete_cart_item"),
+    path('cart/price-drift/', views.cart_price_drift, name='cart-price-drift'),
 
     # Order
 
@@ -71,6 +72,7 @@ urlpatterns = [
     #Order Detail view
 
     path('orders_detail/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
+    path('my-orders/', views.my_order_summaries, name='my-order-summaries'),
 
     # Send RFQ
     path("send-rfq/", views.RFQRequestView.as_view(), name="send_rfq"),
@@ -85,6 +87,8 @@ urlpatterns = [
 
     # GET DESIGNS
     path('generate-image/<uuid:uid>/', views.generate_design_image, name='generate_design_image'),
+    path('design-render/stats/', views.design_render_stats, name='design_render_stats'),
+    path('design-render/<uuid:job_id>/', views.design_render_status, name='design_render_status'),
 
     # send otp
     path('send-otp/', views.send_otp, name='send_otp'),
@@ -97,6 +101,7 @@ urlpatterns = [
     path('new/orders/<int:pk>/', views.order_detail, name='order-detail'),
     path('orders/<int:pk>/update-status/', views.update_order_status, name='update-order-status'),
     path('orders/status-options/', views.order_status_options, name='order-status-options'),
+    path('orders/export/', views.export_orders, name='export-orders'),
 
     # Image store
     # path('image/upload/', views.upload_image, name='upload_image'),
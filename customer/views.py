@@ -1,8 +1,7 @@
 import json
-import os
 import tempfile
 import time
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 
 import requests
 from django.db.models import Q
@@ -11,9 +10,10 @@ from pep_app .tasks import link_contact_and_update_status
 from django.conf import settings
 from django.core.cache import cache
 from django.core.mail import send_mail
-from django.db import IntegrityError
-from django.http import JsonResponse, HttpResponse
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.generics import RetrieveAPIView
@@ -22,8 +22,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, serializers
 
-from products_app.models import VAT, site_visit, Delivery, GlobalDelivery, GlobalThickness, Thickness, TurnaroundTime, \
-    GlobalTurnaroundTime, InstallationType, GlobalInstallationType, GlobalDistance, Distance
+from products_app.checkout_config import get_checkout_config
+from products_app.pagination import cursor_requested, paginate_keyset
+from .cart import (
+    CartError, cart_items_total, commit_cart_stock, fill_option_snapshots, price_drift_items, refresh_cart_totals,
+    reprice_cart_item, reserve_cart_stock, upsert_cart_items,
+)
+from .design_render import RenderQueueFull, render_cache_stats, render_job_data, request_render
+from .order_export import ExportFilterError, export_queryset, iter_csv, iter_export_rows, write_xlsx
+from .order_stats import cached_order_statistics
+from .payments import PaymentError, confirm_card_payment, order_amounts
 from .serializers import *
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import *
@@ -2400,7 +2408,7 @@ from rest_framework import status
 from .models import Cart, CartItem, Customer, Product
 from .serializers import CartItemSerializer
 from rest_framework.decorators import api_view
-from .models import Cart, CartItem, Customer, Product, Designer_rate
+from .models import Cart, CartItem, Customer, Product
 
 
 @api_view(['POST'])
@@ -2417,137 +2425,21 @@ def create_or_update_cart(request):
     except Customer.DoesNotExist:
         return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    # Get or create the cart
-    cart, created = Cart.objects.get_or_create(customer=customer, status='active')
-    cart.site_visit = site_visit
-    cart.save()
-
-    if not created:
-        CartItem.objects.filter(cart=cart, status='pending').delete()
-
-    # Process each cart item in the request
-    total_price = 0
-    total_items = 0
-    cart_items_list = []
-
-    for item_data in cart_items_data:
-        product_id = item_data.get('productid')
-        product_name = item_data.get('name')
-        custom_width = item_data.get('size', {}).get('width')
-        custom_height = item_data.get('size', {}).get('height')
-        design_image = item_data.get('design_image')
-        quantity = item_data.get('quantity', 1)
-        price = float(item_data.get('price', 0))
-        total_price_item = float(item_data.get('total', 0))
-        size_unit = item_data.get('unit', 'inches')
-        hire_designer_id = item_data.get('hire_designer_id', None)
-        design_description = item_data.get('design_description', '')
-        is_smart = item_data.get('is_smart', False)
-        # New fields
-        delivery_id = item_data.get('deliveryId', None)
-        thickness_id = item_data.get('thicknessId', None)
-        turn_around_id = item_data.get('turnAroundId', None)
-        installation_type_id = item_data.get('Installation_type_id', None)
-        distance_id = item_data.get('distance', None)
-
-        if not product_id:
-            return Response({"error": "Product ID is required for each cart item"}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            return Response({"error": f"Product with ID {product_id} not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Fetch the Designer_rate instance if hire_designer_id is provided
-        hire_designer = None
-        if hire_designer_id:
-            try:
-                hire_designer = Designer_rate.objects.get(id=hire_designer_id)
-            except Designer_rate.DoesNotExist:
-                return Response({"error": f"Designer_rate with ID {hire_designer_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+    try:
+        with transaction.atomic():
+            # Get or create the cart
+            cart, created = Cart.objects.get_or_create(customer=customer, status='active')
+            cart.site_visit = site_visit
+            cart.save()
 
-        # Helper function to get the appropriate model instance
-        def get_option_instance(model_class, global_model_class, product_relation_name, option_id):
-            if not option_id:
-                return None
-            try:
-                # First try to get from product-specific options
-                instance = model_class.objects.filter(
-                    product=product,
-                    id=option_id
-                ).first()
-                if not instance:
-                    # If not found, try global options
-                    instance = global_model_class.objects.filter(
-                        id=option_id,
-                        is_active=True
-                    ).first()
-                return instance
-            except Exception:
-                return None
-
-        # Get all option instances
-        delivery = get_option_instance(Delivery, GlobalDelivery, 'deliveries', delivery_id)
-        thickness = get_option_instance(Thickness, GlobalThickness, 'thicknesses', thickness_id)
-        turnaround_time = get_option_instance(TurnaroundTime, GlobalTurnaroundTime, 'turnaround_times', turn_around_id)
-        installation_type = get_option_instance(InstallationType, GlobalInstallationType, 'installation_types',
-                                                installation_type_id)
-        distance = get_option_instance(Distance, GlobalDistance, 'distances', distance_id)
-
-        # Create or update the cart item
-        cart_item, item_created = CartItem.objects.update_or_create(
-            cart=cart,
-            product=product,
-            defaults={
-                'custom_width': custom_width,
-                'custom_height': custom_height,
-                'design_image': design_image,
-                'quantity': quantity,
-                'price': price,
-                'total_price': total_price_item,
-                'size_unit': size_unit,
-                'status': 'pending',
-                'hire_designer': hire_designer,
-                'design_description': design_description,
-                'delivery': delivery,
-                'thickness': thickness,
-                'turnaround_time': turnaround_time,
-                'installation': installation_type,
-                'distance': distance,
-                'is_smart': is_smart
-            }
-        )
+            if not created:
+                CartItem.objects.filter(cart=cart, status='pending').delete()
 
-        total_price += total_price_item
-        total_items += quantity
-
-        # Prepare option IDs for response
-        def get_option_id(instance):
-            return instance.id if instance else None
-
-        cart_items_list.append({
-            "productid": product.id,
-            "name": product.name,
-            "quantity": quantity,
-            "price": price,
-            "total": total_price_item,
-            "size": {
-                "width": custom_width,
-                "height": custom_height
-            },
-            "design_image": design_image,
-            "unit": size_unit,
-            "hire_designer_id": hire_designer.id if hire_designer else None,
-            "design_description": design_description,
-            "is_smart": is_smart,
-            # New fields in response
-            "deliveryId": get_option_id(delivery),
-            "thicknessId": get_option_id(thickness),
-            "turnAroundId": get_option_id(turnaround_time),
-            "Installation_type_id": get_option_id(installation_type),
-            "distance": get_option_id(distance)
-        })
+            # Resolve and write all cart items in bulk
+            # Reprices every line and caches the totals on the cart
+            cart_items_list, total_price, total_items, price_drift = upsert_cart_items(cart, cart_items_data)
+    except CartError as e:
+        return Response({"error": e.message}, status=e.status_code)
 
     # Prepare response
     response_data = {
@@ -2558,7 +2450,8 @@ def create_or_update_cart(request):
             "site_visit": cart.site_visit,
             "cart_items": cart_items_list,
             "total_items": total_items,
-            "total_price": total_price
+            "total_price": float(total_price),
+            "price_drift": price_drift
         }
     }
 
@@ -2680,10 +2573,14 @@ def create_or_update_cart(request):
 class UpdateCartItemView(APIView):
     def patch(self, request, cart_item_id):
         cart_item = get_object_or_404(CartItem, id=cart_item_id)  # Get the CartItem or return 404
+        if cart_item.status != 'pending':
+            return Response({"error": "Only pending cart items can be updated"}, status=status.HTTP_400_BAD_REQUEST)
         serializer = CartItemUpdateSerializer(cart_item, data=request.data, partial=True)
 
         if serializer.is_valid():
-            serializer.save()
+            # Server price for the new quantity/size, and the cart's cached totals with it
+            with transaction.atomic():
+                reprice_cart_item(serializer.save())
             return Response({"message": "CartItem updated successfully", "data": serializer.data}, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -2693,10 +2590,38 @@ class UpdateCartItemView(APIView):
 class DeleteCartItemView(APIView):
     def delete(self, request, cart_item_id):
         cart_item = get_object_or_404(CartItem, id=cart_item_id)  # Fetch CartItem or return 404
+        cart = cart_item.cart
         cart_item.delete()
+        if cart is not None and cart_item.status == 'pending':
+            refresh_cart_totals(cart)
         return Response({"message": "CartItem deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
+# Cart price drift report
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_price_drift(request):
+    """Pending cart lines whose client total differs from the server priced total."""
+    items = price_drift_items(cart_id=request.GET.get('cart_id'))
+    data = [
+        {
+            "cart_item_id": item.id,
+            "cart_id": item.cart_id,
+            "product_id": item.product_id,
+            "product_name": item.product.name if item.product else None,
+            "quantity": item.quantity,
+            "client_price": float(item.client_price) if item.client_price is not None else None,
+            "client_total": float(item.client_total_price),
+            "server_price": float(item.price) if item.price is not None else None,
+            "server_total": float(item.total_price),
+            "difference": float(item.client_total_price - item.total_price),
+        }
+        for item in items
+    ]
+    return Response({"status": "success", "count": len(data), "data": data})
+
+
 
 # Order Creation
 @api_view(["POST"])
@@ -2706,41 +2631,55 @@ def create_order(request):
     payment_status = request.data.get("payment_status")
     payment_method = request.data.get("payment_method")
 
-    # Validate cart
-    try:
-        cart = Cart.objects.get(id=cart_id, status="active")
-    except Cart.DoesNotExist:
-        return Response({"error": "Invalid or inactive cart."}, status=status.HTTP_400_BAD_REQUEST)
+    # One transaction from the stock reservation to the cart status, with the cart
+    # locked: a concurrent checkout of the same cart waits and then finds it checked out
+    with transaction.atomic():
+        # Validate cart
+        try:
+            cart = Cart.objects.select_for_update().get(id=cart_id, status="active")
+        except Cart.DoesNotExist:
+            return Response({"error": "Invalid or inactive cart."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Validate customer address
-    try:
-        customer_address = Customer_Address.objects.get(id=customer_address_id)
-    except Customer_Address.DoesNotExist:
-        return Response({"error": "Invalid customer address."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Calculate total order amount
-    cart_items = cart.items.filter(status="pending")
-    if not cart_items.exists():
-        return Response({"error": "Cart is empty or already processed."}, status=status.HTTP_400_BAD_REQUEST)
-
-    total_amount = sum(item.total_price for item in cart_items)
-
-    # Create Order
-    order = Order.objects.create(
-        customer=cart.customer,
-        address=customer_address,
-        cart=cart,
-        payment_method=payment_method,
-        payment_status=payment_status,
-        amount=total_amount,
-    )
+        # Validate customer address
+        try:
+            customer_address = Customer_Address.objects.get(id=customer_address_id)
+        except Customer_Address.DoesNotExist:
+            return Response({"error": "Invalid customer address."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Calculate total order amount
+        cart_items = cart.items.filter(status="pending")
+        if not cart_items.exists():
+            return Response({"error": "Cart is empty or already processed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        total_amount = cart_items_total(cart)
+
+        # Take the stock for every line up front; refuse the order if any line is short
+        shortages = reserve_cart_stock(cart, cart_items)
+        if shortages:
+            return Response({"error": "Insufficient stock.", "shortages": shortages}, status=status.HTTP_409_CONFLICT)
+
+        # Create Order
+        order = Order.objects.create(
+            customer=cart.customer,
+            address=customer_address,
+            cart=cart,
+            payment_method=payment_method,
+            payment_status=payment_status,
+            amount=total_amount,
+        )
+
+        commit_cart_stock(cart, cart_items)
+
+        # Freeze the options of lines saved before snapshots existed
+        fill_option_snapshots(cart_items)
 
-    # Update CartItem statuses to "ordered"
-    cart_items.update(status="ordered")
+        # Update CartItem statuses to "ordered"
+        cart_items.update(status="ordered")
+        refresh_cart_totals(cart)
 
-    # Update Cart status to "checked_out"
-    cart.status = "checked_out"
-    cart.save()
+        # Update Cart status to "checked_out"
+        cart.status = "checked_out"
+        cart.save()
 
     return Response({"message": "Order created successfully.", "order_id": order.id}, status=status.HTTP_201_CREATED)
 
@@ -2770,29 +2709,16 @@ def create_payment_intent(request):
 
             # Fetch the cart and its items
             cart = Cart.objects.get(id=cart_id)
-            cart_items = cart.items.filter(status='pending')
-
-            # Calculate the base total price (without tax adjustments)
-            total_price = sum(item.total_price for item in cart_items)
-            # Add 350 AED if site_visit is True
-            if cart.site_visit:
-                # Fetch the first site_visit amount from the database
-                site_visit_obj = site_visit.objects.first()
-                if site_visit_obj and site_visit_obj.amount:
-                    total_price += Decimal(str(site_visit_obj.amount))  # Add site_visit amount to the total price
-            # Fetch VAT settings from the database (default to 5% exclusive tax)
-            vat = VAT.objects.first()
-            vat_percentage = Decimal(vat.percentage) if vat else Decimal('5.00')
-            is_vat_inclusive = vat.is_inclusive if vat else False  # Check if VAT is inclusive
-
-            if is_vat_inclusive:
-                base_price = total_price / (Decimal('1') + vat_percentage / Decimal('100'))
-                vat_amount = total_price - base_price
-                total_with_vat = total_price  # No additional tax applied
-            else:
-                base_price = total_price
-                vat_amount = (total_price * vat_percentage) / Decimal('100')
-                total_with_vat = total_price + vat_amount
+
+            # Server priced total cached on the cart (without tax adjustments)
+            total_price = cart_items_total(cart)
+            # Site visit fee and VAT from the shared checkout settings cache (no queries once cached)
+            checkout_config = get_checkout_config()
+            site_visit_fee = checkout_config.site_visit_fee(cart.site_visit)
+            total_price += site_visit_fee
+            vat_percentage = checkout_config.vat_percentage
+            is_vat_inclusive = checkout_config.vat_inclusive
+            base_price, vat_amount, total_with_vat = checkout_config.apply_vat(total_price)
 
 
             print("TOTAL PRICE ==", total_price)
@@ -2806,6 +2732,11 @@ def create_payment_intent(request):
             # Fetch customer's latest billing address
             customer_address = Customer_Address.objects.filter(customer=customer).latest('id')
 
+            # Hold the stock while the customer pays (released on failure or after the TTL)
+            shortages = reserve_cart_stock(cart, cart.items.filter(status='pending'))
+            if shortages:
+                return JsonResponse({'error': 'Insufficient stock', 'shortages': shortages}, status=409)
+
             # Create a PaymentIntent with Stripe
             intent = stripe.PaymentIntent.create(
                 amount=int(total_with_vat * 100),  # Convert to cents
@@ -2836,7 +2767,7 @@ def create_payment_intent(request):
                 'total_with_vat': float(total_with_vat),
                 'is_vat_inclusive': is_vat_inclusive,
                 'site_visit': cart.site_visit,
-                'site_visit_fee': float(site_visit_obj.amount) if cart.site_visit and site_visit_obj else 0.00
+                'site_visit_fee': float(site_visit_fee)
             })
 
         except Exception as e:
@@ -2860,109 +2791,20 @@ def confirm_payment(request):
             payment_intent_id = data.get('payment_intent_id')
             cart_id = data.get('cart_id')
 
-            # Retrieve the PaymentIntent from Stripe
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-
-            if intent.status == 'succeeded':
-                # Fetch the cart and its items
-                cart = Cart.objects.get(id=cart_id)
-                customer = cart.customer
-                cart_items = cart.items.filter(status='pending')
-
-                # Calculate the base total price (without tax adjustments)
-                total_price = sum(item.total_price for item in cart_items)
-                product_price = total_price
-                # Add site_visit amount if site_visit is True
-                site_visit_fee = Decimal('0.00')
-                link_contact_and_update_status.delay(customer.user.email)
-                if cart.site_visit:
-                    # Fetch the first site_visit amount from the database
-                    site_visit_obj = site_visit.objects.first()
-                    if site_visit_obj and site_visit_obj.amount:
-                        site_visit_fee = Decimal(str(site_visit_obj.amount))
-                        total_price += site_visit_fee  # Add site_visit amount to the total price
-
-                # Fetch VAT settings from the database (default to 5% exclusive tax)
-                vat = VAT.objects.first()
-                vat_percentage = Decimal(vat.percentage) if vat else Decimal('5.00')
-                is_vat_inclusive = vat.is_inclusive if vat else False  # Check if VAT is inclusive
-
-                if is_vat_inclusive:
-                    base_price = total_price / (Decimal('1') + vat_percentage / Decimal('100'))
-                    vat_amount = total_price - base_price
-                    total_with_vat = total_price  # No additional tax applied
-                else:
-                    base_price = total_price
-                    vat_amount = (total_price * vat_percentage) / Decimal('100')
-                    total_with_vat = total_price + vat_amount
-
-                # Get the latest customer address
-                customer_address = Customer_Address.objects.filter(customer=customer).latest('id')
-
-                # Create an order with the transaction ID and VAT details
-                order = Order.objects.create(
-                    customer=customer,
-                    address=customer_address,
-                    cart=cart,
-                    payment_method='card',
-                    payment_status='paid',
-                    amount=total_with_vat,  # Use total_with_vat instead of total_price
-                    transaction_id=payment_intent_id, # Add from cart
-                    site_visit=cart.site_visit,
-                    site_visit_fee=site_visit_fee,  # Store site visit fee
-                    vat_percentage=vat_percentage,  # Store VAT percentage
-                    vat_amount=vat_amount  # Store VAT amount
-                )
-
-                # Update cart and cart item statuses
-                cart.status = 'checked_out'
-                cart.save()
-
-                for item in cart_items:
-                    item.status = 'ordered'
-                    item.save()
-
-                # Send email to the customer with billing details
-                subject = 'Order Confirmation'
-                html_message = render_to_string('order_confirmation.html', {
-                    'order': order,
-                    'cart_items': cart_items,
-                    'product_price': float(product_price),
-                    'base_product_amount': float(base_price),
-                    'vat_percentage': float(vat_percentage),
-                    'vat_amount': float(vat_amount),
-                    'total_with_vat': float(total_with_vat),
-                    'customer_name': customer.user.first_name,
-                    'customer_email': customer.user.email,
-                    'billing_address': f"{customer_address.address_line1}, {customer_address.city}, {customer_address.zip_code}",
-                    'transaction_id': payment_intent_id,
-                    'site_visit_fee': float(site_visit_fee)  # Include site visit fee in email
-                })
-                plain_message = strip_tags(html_message)
-                send_mail(
-                    subject,
-                    plain_message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [customer.user.email],
-                    html_message=html_message,
-                )
-
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Payment successful!',
-                    'order_id': order.id,
-                    'transaction_id': payment_intent_id,
-                    'base_product_amount': float(base_price),
-                    'vat_percentage': float(vat_percentage),
-                    'vat_amount': float(vat_amount),
-                    'total_with_vat': float(total_with_vat),
-                    'site_visit': order.site_visit,
-                    'site_visit_fee': float(site_visit_fee)  # Include site visit fee in response
-                })
+            # Idempotent on the PaymentIntent: a retry returns the order already placed
+            order, created = confirm_card_payment(payment_intent_id, cart_id)
 
-            else:
-                return JsonResponse({'success': False, 'message': 'Payment failed.'}, status=400)
+            return JsonResponse({
+                'success': True,
+                'message': 'Payment successful!' if created else 'Payment already confirmed.',
+                'order_id': order.id,
+                'transaction_id': payment_intent_id,
+                'already_processed': not created,
+                **order_amounts(order),
+            })
 
+        except PaymentError as e:
+            return JsonResponse({'success': False, 'message': e.message}, status=e.status_code)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -3015,7 +2857,7 @@ class OrderDetailView(APIView):
         Get detailed information for a specific order
         """
         # Get the order or return 404
-        order = get_object_or_404(Order, id=pk)
+        order = get_object_or_404(Order.objects.select_related('customer__user', 'address', 'cart'), id=pk)
 
         # Check if the requesting user is the owner of the order
         if request.user != order.customer.user:
@@ -3093,8 +2935,8 @@ class RFQRequestView(APIView):
             type='email'
         )
 
-        # Calculate VAT amount (5%)
-        vat_amount = float(total) * 0.05
+        # VAT share of the quoted total, at the configured rate
+        vat_amount = float(total) * float(get_checkout_config().vat_percentage) / 100
         subtotal_without_vat = float(total) - vat_amount
 
         # Format currency values
@@ -3335,6 +3177,8 @@ class CustomerDesignView(APIView):
             'unit': design.unit,
             'quantity': design.quantity,
             'design_image_url': design.design_image_url,  # Include design_image_url in response
+            'design_thumbnail_url': design.design_thumbnail_url,
+            'design_preview_url': design.design_preview_url,
         })
 
         return Response(
@@ -3370,183 +3214,76 @@ class GenerateAnonymousUUID(APIView):
 # GET DESIGN
 
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
-from .models import CustomerDesign
-
-
-def convert_units(value, from_unit, to_unit):
-    """Convert a value from one unit to another using meter as base unit"""
-    unit_to_meters = {
-        'mm': Decimal('0.001'),
-        'cm': Decimal('0.01'),
-        'meter': Decimal('1'),
-        'inches': Decimal('0.0254'),
-        'feet': Decimal('0.3048'),
-        'yard': Decimal('0.9144'),
-    }
-
-    if from_unit not in unit_to_meters or to_unit not in unit_to_meters:
-        raise ValueError("Invalid unit provided")
+from .models import CustomerDesign, DesignRenderJob
 
-    value_in_meters = Decimal(str(value)) * unit_to_meters[from_unit]
-    return value_in_meters / unit_to_meters[to_unit]
 
 def generate_design_image(request, uid):
-    # Fetch the design from the database
+    """
+    Queue a render of the design and answer at once with the job; the image
+    and price are on the job's status resource once it is done. An unchanged
+    design comes back as a finished job straight away.
+    """
     design = get_object_or_404(CustomerDesign, id=uid)
 
     try:
-        design_data = json.loads(design.design_data)
+        json.loads(design.design_data)
     except json.JSONDecodeError as e:
         return JsonResponse({"error": f"Invalid JSON: {e}"}, status=400)
 
-    # Determine canvas size
-    product = design.product
-    if product and design.product_max_width and design.product_max_height:
-        canvas_width = int(design.product_max_width)
-        canvas_height = int(design.product_max_height)
-    else:
-        frame_data = design_data.get("frame", {})
-        canvas_width = int(frame_data.get("width", 1200))
-        canvas_height = int(frame_data.get("height", 1200))
-
-
-
-    # Create TRANSPARENT canvas (RGBA with alpha=0)
-    canvas = Image.new("RGBA", (canvas_width, canvas_height), (255, 255, 255, 0))
-    draw = ImageDraw.Draw(canvas)
-
-    # Process all layers
-    for scene in design_data.get("scenes", []):
-        for layer in scene.get("layers", []):
-            layer_type = layer.get("type")
-
-            # Convert negative coordinates to positive
-            left = max(0, int(layer.get("left", 0)))
-            top = max(0, int(layer.get("top", 0)))
-
-            if layer_type == "Background":
-                # Draw background rectangle
-                draw.rectangle(
-                    [
-                        left,
-                        top,
-                        left + int(layer["width"]),
-                        top + int(layer["height"])
-                    ],
-                    fill=layer.get("fill", "#FFFFFF")
-                )
+    try:
+        job = request_render(design)
+    except RenderQueueFull as e:
+        return JsonResponse({"error": str(e)}, status=503)
 
-            elif layer_type == "StaticImage":
-                try:
-                    response = requests.get(layer["src"], timeout=10)
-                    if response.status_code == 200:
-                        img = Image.open(BytesIO(response.content)).convert("RGBA")
-                        img = img.resize((
-                            int(layer["width"] * layer.get("scaleX", 1)),
-                            int(layer["height"] * layer.get("scaleY", 1))
-                        ))
-                        # Ensure image stays within canvas bounds
-                        paste_x = max(0, min(left, canvas_width - img.width))
-                        paste_y = max(0, min(top, canvas_height - img.height))
-                        canvas.paste(img, (paste_x, paste_y), img)
-                except Exception as e:
-                    print(f"Image Error: {str(e)}")
-
-            elif layer_type == "StaticText":
-                try:
-                    text = layer.get("text", "")
-                    fill_color = layer.get("fill", "#000000")
-                    font_size = int(layer.get("fontSize", 20))
-
-                    # Load font with fallback
-                    font = None
-                    if "fontURL" in layer:
-                        try:
-                            font_data = requests.get(layer["fontURL"], timeout=5).content
-                            font = ImageFont.truetype(BytesIO(font_data), font_size)
-                        except:
-                            pass
-                    if not font:
-                        font = ImageFont.load_default(size=font_size)
-
-                    # Calculate text position
-                    text_x = max(0, min(left, canvas_width))
-                    text_y = max(0, min(top, canvas_height))
-
-                    draw.text((text_x, text_y), text, font=font, fill=fill_color)
-                except Exception as e:
-                    print(f"Text Error: {str(e)}")
-
-    # Save as PNG with transparency
-    image_filename = f"{uid}_{uuid.uuid4().hex}.png"
-    image_path = os.path.join(settings.MEDIA_ROOT, "designs", image_filename)
-    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-    canvas.save(image_path, "PNG")
-
-    # Update model
-    design.design_image_url = settings.MEDIA_URL + "designs/" + image_filename
-    design.save()
-
-    # Calculate total price
-    total_price = 0
-    if product and product.price:
-        try:
-            from_unit = design.unit if design.unit else 'cm'
-            to_unit = product.size
+    return JsonResponse({
+        **render_job_data(job, request),
+        "status_url": request.build_absolute_uri(reverse('design_render_status', args=[job.id])),
+    }, status=200 if job.status == 'done' else 202)
 
-            # Handle width conversion or default to product's minimum
-            if design.width is not None:
-                width = Decimal(str(design.width))
-                converted_width = convert_units(width, from_unit, to_unit)
-            else:
-                # Directly use product's min width in its native unit
-                converted_width = product.min_width
 
-            # Handle height conversion or default to product's minimum
-            if design.height is not None:
-                height = Decimal(str(design.height))
-                converted_height = convert_units(height, from_unit, to_unit)
-            else:
-                # Directly use product's min height in its native unit
-                converted_height = product.min_height
+# Longest a status request may wait for a render to finish. Kept short: each
+# waiting request holds a web worker, so clients poll rather than hang on
+RENDER_STATUS_MAX_WAIT = 3
+# Seconds a client should wait before polling an unfinished job again
+RENDER_STATUS_POLL_INTERVAL = 1
 
-            area = converted_width * converted_height
-            quantity = design.quantity if design.quantity is not None else 1
-            total_price = float(area * product.price * quantity)
 
-        except (ValueError, InvalidOperation, TypeError, AttributeError) as e:
-            print(f"Price calculation error: {str(e)}")
+def design_render_status(request, job_id):
+    """
+    Status of a render job. With ?wait=<seconds> (at most RENDER_STATUS_MAX_WAIT)
+    the request waits until the job finishes or the time is up. An unfinished
+    job is answered with a Retry-After header telling the client when to poll again.
+    """
+    job = get_object_or_404(DesignRenderJob.objects.select_related('design__product'), id=job_id)
 
-    response_data = {
-        "amazon_url": product.amazon_url if product and product.amazon_url else None,
-        "allow_direct_add_to_cart": product.allow_direct_add_to_cart if product else False,
-        "id": product.id if product else None,
-        "name": product.name if product else "Unnamed Product",
-        "design_image": request.build_absolute_uri(design.design_image_url),
-        "quantity": design.quantity,
-        "timestamp": int(time.time() * 1000),  # Current timestamp in milliseconds
-        "total": round(total_price, 2),
-        "customSize": {
-            "width": float(design.width) if design.width else 1,
-            "height": float(design.height) if design.height else 1,
-            "unit": design.unit if design.unit else "cm"
-        }
-    }
-    return JsonResponse(response_data)
-    # return JsonResponse({
-    #     "product_name":product.name,
-    #     "image_url": request.build_absolute_uri(design.design_image_url),
-    #     "canvas_width": canvas_width,
-    #     "canvas_height": canvas_height,
-    #     "product_id": str(product.id) if product else None,
-    #     "quantity": design.quantity,
-    #     "total_price": product.price
-    # })
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0), RENDER_STATUS_MAX_WAIT)
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+
+    deadline = time.monotonic() + wait
+    while job.status in ('queued', 'running') and time.monotonic() < deadline:
+        time.sleep(0.5)
+        job.refresh_from_db(fields=['status', 'image_url', 'error', 'finished_at'])
+
+    response = JsonResponse(render_job_data(job, request))
+    if job.status in ('queued', 'running'):
+        response['Retry-After'] = str(RENDER_STATUS_POLL_INTERVAL)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def design_render_stats(request):
+    """Hit/miss counts of the design render cache."""
+    return Response({
+        "status": "success",
+        "data": render_cache_stats()
+    })
 
 
 from .models import PasswordResetSession
@@ -4429,7 +4166,7 @@ def order_list(request):
         # Get all orders with related data for performance
         orders = Order.objects.all().select_related(
             'customer', 'customer__user', 'address', 'cart'
-        ).prefetch_related('cart__items', 'cart__items__product').order_by('-ordered_date')
+        ).prefetch_related('cart__items', 'cart__items__product', 'cart__items__hire_designer').order_by('-ordered_date')
 
         # Apply filters
         status_filter = request.GET.get('status')
@@ -4487,73 +4224,79 @@ def order_list(request):
             'delivered_date', '-delivered_date', 'status'
         ]
 
-        if sort_by in valid_sort_fields:
-            orders = orders.order_by(sort_by)
-        else:
-            orders = orders.order_by('-ordered_date')  # Default sorting
-
-        # Pagination
-        page_size = int(request.GET.get('page_size', 20))
-        page_number = int(request.GET.get('page', 1))
-
-        # Validate pagination parameters
-        if page_size < 1 or page_size > 100:
-            return Response({
-                "status": "error",
-                "message": "page_size must be between 1 and 100"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        if page_number < 1:
-            return Response({
-                "status": "error",
-                "message": "page must be greater than 0"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        paginator = Paginator(orders, page_size)
+        sort_field = sort_by if sort_by in valid_sort_fields else '-ordered_date'  # Default sorting
+        orders = orders.order_by(sort_field)
 
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+        # Cursor pagination (opt-in): no OFFSET scan and no COUNT unless asked for
+        if cursor_requested(request):
+            try:
+                page_items, pagination = paginate_keyset(orders, [sort_field], request)
+            except ValueError as e:
+                return Response({
+                    "status": "error",
+                    "message": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Pagination
+            page_size = int(request.GET.get('page_size', 20))
+            page_number = int(request.GET.get('page', 1))
 
-        serializer = OrderListSerializer(page_obj, many=True)
+            # Validate pagination parameters
+            if page_size < 1 or page_size > 100:
+                return Response({
+                    "status": "error",
+                    "message": "page_size must be between 1 and 100"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get order statistics
-        total_orders = orders.count()
-        total_amount = sum(order.amount for order in orders if order.amount)
+            if page_number < 1:
+                return Response({
+                    "status": "error",
+                    "message": "page must be greater than 0"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        status_counts = {}
-        for status_choice in Order.ORDER_STATUS_CHOICES:
-            status_counts[status_choice[0]] = orders.filter(status=status_choice[0]).count()
+            paginator = Paginator(orders, page_size)
 
-        return Response({
-            "status": "success",
-            "data": serializer.data,
-            "pagination": {
+            try:
+                page_obj = paginator.page(page_number)
+            except PageNotAnInteger:
+                page_obj = paginator.page(1)
+            except EmptyPage:
+                page_obj = paginator.page(paginator.num_pages)
+
+            page_items = page_obj
+            pagination = {
                 "current_page": page_obj.number,
                 "total_pages": paginator.num_pages,
                 "total_items": paginator.count,
                 "page_size": page_size,
                 "has_next": page_obj.has_next(),
                 "has_previous": page_obj.has_previous(),
-            },
-            "statistics": {
-                "total_orders": total_orders,
-                "total_amount": total_amount,
-                "status_counts": status_counts
-            },
-            "filters_applied": {
-                "status": status_filter,
-                "payment_method": payment_method,
-                "payment_status": payment_status,
-                "customer_id": customer_id,
-                "search": search,
-                "date_from": date_from,
-                "date_to": date_to,
-                "sort_by": sort_by
             }
+
+        serializer = OrderListSerializer(page_items, many=True)
+
+        filters_applied = {
+            "status": status_filter,
+            "payment_method": payment_method,
+            "payment_status": payment_status,
+            "customer_id": customer_id,
+            "search": search,
+            "date_from": date_from,
+            "date_to": date_to,
+            "sort_by": sort_by
+        }
+
+        # Get order statistics: one aggregate query, cached briefly per filter set; ?stats=false skips it
+        statistics = None
+        if request.GET.get('stats', 'true').lower() not in ('false', '0', 'no'):
+            statistics = cached_order_statistics(orders, filters_applied)
+
+        return Response({
+            "status": "success",
+            "data": serializer.data,
+            "pagination": pagination,
+            "statistics": statistics,
+            "filters_applied": filters_applied
         })
 
     except Exception as e:
@@ -4563,6 +4306,53 @@ def order_list(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Order export
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_orders(request):
+    """
+    Export orders, one row per cart line, as CSV (streamed) or XLSX.
+    Filters: date_from, date_to, status (comma separated), payment_status, payment_method.
+    """
+    file_format = request.GET.get('file_format', 'csv')
+    if file_format not in ('csv', 'xlsx'):
+        return Response({
+            "status": "error",
+            "message": "file_format must be csv or xlsx"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    statuses = [value for value in request.GET.get('status', '').split(',') if value]
+    try:
+        orders = export_queryset(
+            date_from=request.GET.get('date_from'),
+            date_to=request.GET.get('date_to'),
+            statuses=statuses,
+            payment_status=request.GET.get('payment_status'),
+            payment_method=request.GET.get('payment_method'),
+        )
+    except ExportFilterError as e:
+        return Response({
+            "status": "error",
+            "message": str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    filename = f"orders_{timezone.now().strftime('%Y%m%d%H%M%S')}"
+    if file_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(iter_export_rows(orders)), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    # Deleted when the response closes the file
+    output = tempfile.TemporaryFile()
+    write_xlsx(iter_export_rows(orders), output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f"{filename}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def order_detail(request, pk):
@@ -4572,7 +4362,7 @@ def order_detail(request, pk):
     try:
         order = Order.objects.select_related(
             'customer', 'customer__user', 'address', 'cart'
-        ).prefetch_related('cart__items', 'cart__items__product').get(pk=pk)
+        ).prefetch_related('cart__items', 'cart__items__product', 'cart__items__hire_designer').get(pk=pk)
     except Order.DoesNotExist:
         return Response({
             "status": "error",
@@ -4666,4 +4456,40 @@ def update_order_status(request, pk):
         "status": "success",
         "message": f"Order status updated to {new_status}",
         "data": OrderListSerializer(order).data
-    })
\ No newline at end of file
+    })
+
+# Customer order history (OrderSummary read model)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_order_summaries(request):
+    """
+    The signed in customer's orders, newest first, read from OrderSummary only.
+    Cursor paginated (?cursor=...&page_size=...); each row links to its full detail.
+    """
+    try:
+        customer = Customer.objects.get(user=request.user)
+    except Customer.DoesNotExist:
+        return Response({
+            "status": "error",
+            "message": "Customer not found"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    summaries = OrderSummary.objects.filter(customer=customer)
+    order_status = request.GET.get('status')
+    if order_status:
+        summaries = summaries.filter(status=order_status)
+
+    try:
+        rows, pagination = paginate_keyset(summaries, ['-ordered_date', '-pk'], request)
+    except ValueError as e:
+        return Response({
+            "status": "error",
+            "message": str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "status": "success",
+        "data": OrderSummarySerializer(rows, many=True).data,
+        "pagination": pagination
+    })
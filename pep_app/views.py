@@ -732,6 +732,7 @@ from rest_framework.response import Response
 from django.db.models import Q, Count
 from .models import Contact, Partners, Accounts
 from .serializers import ContactSerializer
+from products_app.pagination import cursor_requested, paginate_keyset
 
 
 @api_view(['GET'])
@@ -774,13 +775,30 @@ def all_contacts_list(request):
         if email_deliverability_filter:
             contacts = contacts.filter(email_deliverability__icontains=email_deliverability_filter)
 
-        # Get total count before pagination
-        total_count = contacts.count()
-
-        # Apply pagination
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        paginated_contacts = contacts.order_by('-created_at')[start_index:end_index]
+        if cursor_requested(request):
+            # Cursor pagination (opt-in): no OFFSET scan and no COUNT unless asked for
+            try:
+                paginated_contacts, pagination = paginate_keyset(contacts, ['-created_at'], request,
+                                                                 default_page_size=50, max_page_size=500)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+            total_count = pagination.get('total_items')
+        else:
+            # Get total count before pagination
+            total_count = contacts.count()
+
+            # Apply pagination
+            start_index = (page - 1) * page_size
+            end_index = start_index + page_size
+            paginated_contacts = contacts.order_by('-created_at')[start_index:end_index]
+            pagination = {
+                'page': page,
+                'page_size': page_size,
+                'total_count': total_count,
+                'total_pages': (total_count + page_size - 1) // page_size,
+                'has_next': end_index < total_count,
+                'has_previous': page > 1
+            }
 
         # Get statistics
         status_counts = contacts.values('status').annotate(count=Count('id'))
@@ -814,14 +832,7 @@ def all_contacts_list(request):
                 }
                 for contact in paginated_contacts
             ],
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_count': total_count,
-                'total_pages': (total_count + page_size - 1) // page_size,
-                'has_next': end_index < total_count,
-                'has_previous': page > 1
-            },
+            'pagination': pagination,
             'filters': {
                 'search': search,
                 'status': status_filter,
@@ -0,0 +1,317 @@
+"""
+Type-ahead suggestions for the search box.
+
+Product names, alternate names and category names are kept as sorted lists of
+lowercase keys and looked up with bisect, so a keystroke is a binary search plus
+a bounded scan and never reaches the database.
+
+The suggestion source ({(type, id): [(name, image), ...]}) lives in the cache
+under a version. When a product or category is saved or deleted, only that
+row is read back after commit: its entries are replaced in the cached source
+and the change is appended to a short change log. A process that sees a new
+version replays the logged changes on its index; it rebuilds the index from the
+cached source only when the log no longer reaches back to its own version.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Product
+
+
+AUTOCOMPLETE_VERSION_KEY = "autocomplete:version"
+AUTOCOMPLETE_SOURCE_KEY = "autocomplete:entries"
+AUTOCOMPLETE_CHANGES_KEY = "autocomplete:changes"
+AUTOCOMPLETE_LOCK_KEY = "autocomplete:lock"
+AUTOCOMPLETE_LOCK_TIMEOUT = 30
+# Seconds a process serves its index before looking at the shared version again
+VERSION_CHECK_INTERVAL = 2
+# Changes kept in the log; a process further behind than this rebuilds its index
+MAX_LOGGED_CHANGES = 200
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 20
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+def _keys(name):
+    """(whole-name key, [keys from every later word onwards]) of a name."""
+    key = _normalize(name)
+    parts = key.split(" ")
+    return key, [" ".join(parts[start:]) for start in range(1, len(parts))]
+
+
+def _product_entries(rows):
+    for product_id, name, alternate_names, image in rows:
+        names = [(name, image)] if name else []
+        names += [
+            (alternate_name.strip(), image)
+            for alternate_name in (alternate_names or '').split(',') if alternate_name.strip()
+        ]
+        if names:
+            yield ('product', product_id), names
+
+
+def _category_entries(rows):
+    for category_id, name, image in rows:
+        if name:
+            yield ('category', category_id), [(name, image)]
+
+
+def _product_rows(products):
+    return products.values_list('id', 'name', 'alternate_names', 'image1')
+
+
+def _category_rows(categories):
+    return categories.values_list('id', 'category_name', 'category_image')
+
+
+def load_source():
+    """Names to suggest, straight from the database: {(type, id): [(name, image), ...]}."""
+    source = dict(_product_entries(_product_rows(Product.objects.all())))
+    source.update(_category_entries(_category_rows(Category.objects.all())))
+    return source
+
+
+def load_entries(kind, item_id):
+    """Names to suggest for one product or category; [] if it is gone or has no name."""
+    if kind == 'product':
+        entries = dict(_product_entries(_product_rows(Product.objects.filter(id=item_id))))
+    else:
+        entries = dict(_category_entries(_category_rows(Category.objects.filter(id=item_id))))
+    return entries.get((kind, item_id), [])
+
+
+@contextmanager
+def _source_lock(attempts=40, delay=0.05):
+    """Serialize writers of the cached source; yields False if the lock was not obtained."""
+    for _attempt in range(attempts):
+        if cache.add(AUTOCOMPLETE_LOCK_KEY, 1, AUTOCOMPLETE_LOCK_TIMEOUT):
+            break
+        time.sleep(delay)
+    else:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        cache.delete(AUTOCOMPLETE_LOCK_KEY)
+
+
+def _store_source(version, source, changes):
+    cache.set_many({AUTOCOMPLETE_SOURCE_KEY: (version, source), AUTOCOMPLETE_CHANGES_KEY: changes}, None)
+    cache.set(AUTOCOMPLETE_VERSION_KEY, version, None)
+    _expire_version_check()
+
+
+def rebuild_autocomplete_source():
+    """Reload the whole suggestion source into the cache under a new version."""
+    with _source_lock():
+        # An empty log makes every process rebuild from the new source
+        _store_source(time.time_ns(), load_source(), [])
+
+
+def update_autocomplete_entries(kind, item_id):
+    """Replace one product's or category's suggestions in the cached source and log the change."""
+    names = load_entries(kind, item_id)
+    with _source_lock() as locked:
+        cached = cache.get(AUTOCOMPLETE_SOURCE_KEY)
+        if cached is None:
+            # Nothing to patch: the next lookup loads the whole source
+            return
+        if not locked:
+            # Another writer is stuck; drop the source rather than risk losing its
+            # change, and move the version so every process reloads
+            cache.delete(AUTOCOMPLETE_SOURCE_KEY)
+            cache.set(AUTOCOMPLETE_VERSION_KEY, time.time_ns(), None)
+            _expire_version_check()
+            return
+
+        previous_version, source = cached
+        if names:
+            source[(kind, item_id)] = names
+        else:
+            source.pop((kind, item_id), None)
+        version = time.time_ns()
+        changes = (cache.get(AUTOCOMPLETE_CHANGES_KEY) or [])[-(MAX_LOGGED_CHANGES - 1):]
+        changes.append((previous_version, version, (kind, item_id), names))
+        _store_source(version, source, changes)
+
+
+def schedule_autocomplete_update(kind, item_id):
+    # After commit, so the update reads the committed row
+    transaction.on_commit(lambda: update_autocomplete_entries(kind, item_id))
+
+
+class PrefixIndex:
+    """
+    Suggestions keyed two ways: by the whole name (`phrases`) and by every later
+    word onwards (`words`), so "board" also finds "Acrylic Board". Both are
+    lists of (key, (type, id, name, image)) sorted by key.
+    """
+
+    def __init__(self, source=None):
+        self.entries = {}
+        self.phrases = []
+        self.words = []
+        for item_key, names in (source or {}).items():
+            self.entries[item_key] = names
+            for name, image in names:
+                phrase, words = _keys(name)
+                suggestion = (*item_key, name, image)
+                self.phrases.append((phrase, suggestion))
+                self.words.extend((word, suggestion) for word in words)
+        self.phrases.sort(key=lambda pair: pair[0])
+        self.words.sort(key=lambda pair: pair[0])
+
+    def copy(self):
+        index = PrefixIndex()
+        index.entries = dict(self.entries)
+        index.phrases = list(self.phrases)
+        index.words = list(self.words)
+        return index
+
+    @staticmethod
+    def _insert(pairs, key, suggestion):
+        pairs.insert(bisect_right(pairs, key, key=lambda pair: pair[0]), (key, suggestion))
+
+    @staticmethod
+    def _remove(pairs, key, suggestion):
+        position = bisect_left(pairs, key, key=lambda pair: pair[0])
+        while position < len(pairs) and pairs[position][0] == key:
+            if pairs[position][1] == suggestion:
+                del pairs[position]
+                return
+            position += 1
+
+    def replace(self, item_key, names):
+        """Swap the suggestions of one (type, id) for `names`; an empty list removes it."""
+        for name, image in self.entries.pop(item_key, ()):
+            phrase, words = _keys(name)
+            suggestion = (*item_key, name, image)
+            self._remove(self.phrases, phrase, suggestion)
+            for word in words:
+                self._remove(self.words, word, suggestion)
+        if not names:
+            return
+        self.entries[item_key] = names
+        for name, image in names:
+            phrase, words = _keys(name)
+            suggestion = (*item_key, name, image)
+            self._insert(self.phrases, phrase, suggestion)
+            for word in words:
+                self._insert(self.words, word, suggestion)
+
+    def _scan(self, pairs, prefix, seen, results, limit):
+        position = bisect_left(pairs, prefix, key=lambda pair: pair[0])
+        while position < len(pairs) and len(results) < limit and pairs[position][0].startswith(prefix):
+            kind, item_id, name, image = pairs[position][1]
+            if (kind, item_id) not in seen:
+                seen.add((kind, item_id))
+                results.append({"type": kind, "id": item_id, "name": name, "image": image})
+            position += 1
+
+    def suggest(self, query, limit=DEFAULT_SUGGESTIONS):
+        """Names starting with `query` first, then names with a later word starting with it."""
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+        seen = set()
+        results = []
+        self._scan(self.phrases, prefix, seen, results, limit)
+        self._scan(self.words, prefix, seen, results, limit)
+        return results
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+# time.monotonic() of the last version check; None forces the next lookup to check
+_version_checked_at = None
+
+
+def _expire_version_check():
+    """Make this process look at the version on its next lookup (it just changed it)."""
+    global _version_checked_at
+    _version_checked_at = None
+
+
+def _changes_since(version):
+    """
+    ({(type, id): names} changed after `version`, version after the last of
+    them), or None if the log does not reach back to `version`.
+    """
+    changes = cache.get(AUTOCOMPLETE_CHANGES_KEY) or []
+    for position, (previous_version, _version, _item_key, _names) in enumerate(changes):
+        if previous_version == version:
+            changed = {item_key: names for _previous, _version, item_key, names in changes[position:]}
+            return changed, changes[-1][1]
+    return None
+
+
+def get_prefix_index():
+    """
+    This process's PrefixIndex. The shared version is read at most every
+    VERSION_CHECK_INTERVAL seconds, so other processes' changes show up within
+    that delay and most keystrokes touch no cache at all.
+    """
+    global _version_checked_at
+
+    checked_at = _version_checked_at
+    now = time.monotonic()
+    if _index is not None and checked_at is not None and now - checked_at < VERSION_CHECK_INTERVAL:
+        return _index
+
+    index = _current_prefix_index()
+    _version_checked_at = now
+    return index
+
+
+def _current_prefix_index():
+    """
+    When the version moved, the logged changes are applied to a copy of the
+    index (readers keep using the old one meanwhile); the index is rebuilt from
+    the cached source only if the log cannot bring it up to date.
+    """
+    global _index, _index_version
+
+    version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+    if _index is not None and version is not None and version == _index_version:
+        return _index
+
+    with _index_lock:
+        if _index is not None and version is not None and version == _index_version:
+            return _index
+
+        if _index is not None and version is not None:
+            replay = _changes_since(_index_version)
+            if replay is not None:
+                changed, replayed_version = replay
+                index = _index.copy()
+                for item_key, names in changed.items():
+                    index.replace(item_key, names)
+                _index, _index_version = index, replayed_version
+                return _index
+
+        cached = cache.get(AUTOCOMPLETE_SOURCE_KEY)
+        if cached is None:
+            # Cold cache: the only time a lookup reads the whole table
+            rebuild_autocomplete_source()
+            cached = cache.get(AUTOCOMPLETE_SOURCE_KEY) or (time.time_ns(), load_source())
+
+        source_version, source = cached
+        if version is None:
+            # Version key evicted: adopt the source's version
+            cache.add(AUTOCOMPLETE_VERSION_KEY, source_version, None)
+        _index, _index_version = PrefixIndex(source), source_version
+        return _index
+
+
+def suggest(query, limit=DEFAULT_SUGGESTIONS):
+    return get_prefix_index().suggest(query, max(1, min(limit, MAX_SUGGESTIONS)))
@@ -0,0 +1,88 @@
+"""
+Response cache for the public catalog read endpoints.
+
+All cached responses share one catalog version. The signals in
+products_app/signals.py bump it whenever a product, category, option, banner,
+offer or testimonial changes, so a cached entry is never served after the data
+behind it changed. The version is also the time of the last change, which gives
+every response an ETag and Last-Modified header browsers and Cloudflare can
+revalidate against with a 304.
+
+The version lives in the shared default cache (Redis, see CACHES in
+settings.py), so every worker answers a URL with the same ETag and
+Last-Modified and a bump from any process or Celery task reaches all.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version():
+    """Current catalog version (time.time_ns() of the last catalog change)."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def _request_fingerprint(request):
+    # Serializers build absolute media URLs from the request, so key on the full URL
+    raw = f"{request.build_absolute_uri()}|{request.META.get('HTTP_ACCEPT', '')}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def catalog_cache(view_func):
+    """
+    Cache successful GET responses of a catalog view under the catalog version.
+
+    Works on function views (below @api_view/@permission_classes) and, through
+    method_decorator, on APIView.get.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_func(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        fingerprint = _request_fingerprint(request)
+        etag = quote_etag(f"{version}-{fingerprint}")
+        last_modified = version // 1_000_000_000
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _add_validators(Response(status=not_modified.status_code), etag, last_modified)
+
+        key = f"catalog:response:{version}:{fingerprint}"
+        cached = cache.get(key)
+        if cached is not None:
+            return _add_validators(Response(cached), etag, last_modified)
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and hasattr(response, 'data'):
+            cache.set(key, response.data, CATALOG_CACHE_TIMEOUT)
+            _add_validators(response, etag, last_modified)
+        return response
+
+    return wrapper
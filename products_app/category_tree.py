@@ -0,0 +1,112 @@
+"""
+Materialized category tree: parent categories -> categories -> product ids.
+
+Built in one pass from five flat queries (parents, categories, statuses and the
+two M2M through tables) and cached until a category, parent category, status or
+product changes or either M2M relation changes (see products_app/signals.py).
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Category, ParentCategory, Product, Product_status
+
+
+CATEGORY_TREE_KEY = "catalog:category-tree"
+CATEGORY_TREE_VERSION_KEY = "catalog:category-tree:version"
+CATEGORY_TREE_TIMEOUT = 60 * 60 * 24
+
+
+def build_category_tree():
+    parents = {
+        row['id']: {**row, "category_ids": [], "product_ids": set()}
+        for row in ParentCategory.objects.order_by('id').values('id', 'name', 'description', 'image')
+    }
+    categories = {
+        row['id']: {
+            "id": row['id'],
+            "name": row['category_name'],
+            "description": row['description'],
+            "image": row['category_image'],
+            "parent_category_ids": [],
+            "product_ids": [],
+        }
+        for row in Category.objects.order_by('id').values('id', 'category_name', 'description', 'category_image')
+    }
+
+    for category_id, parent_id in Category.parent_categories.through.objects.order_by(
+            'parentcategory_id', 'category_id').values_list('category_id', 'parentcategory_id'):
+        categories[category_id]["parent_category_ids"].append(parent_id)
+        parents[parent_id]["category_ids"].append(category_id)
+
+    for product_id, category_id in Product.categories.through.objects.order_by(
+            'category_id', 'product_id').values_list('product_id', 'category_id'):
+        categories[category_id]["product_ids"].append(product_id)
+
+    for parent in parents.values():
+        for category_id in parent["category_ids"]:
+            parent["product_ids"].update(categories[category_id]["product_ids"])
+        parent["product_ids"] = sorted(parent["product_ids"])
+        parent["child_categories_count"] = len(parent["category_ids"])
+        parent["products_count"] = len(parent["product_ids"])
+
+    for category in categories.values():
+        category["products_count"] = len(category["product_ids"])
+
+    return {
+        "parent_categories": list(parents.values()),
+        "categories": list(categories.values()),
+        "status_options": [
+            {"id": status_id, "status": status_name}
+            for status_id, status_name in Product_status.objects.order_by('id').values_list('id', 'status')
+        ],
+    }
+
+
+def _tree_version():
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_TREE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    # Keyed by version so a build racing with a change is never stored as current
+    key = f"{CATEGORY_TREE_KEY}:{_tree_version()}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, CATEGORY_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.set(CATEGORY_TREE_VERSION_KEY, time.time_ns(), None)
+
+
+def filter_options_from_tree(tree):
+    """The `available_filters` block of product_filter_list."""
+    parent_names = {parent["id"]: parent["name"] for parent in tree["parent_categories"]}
+    return {
+        "parent_categories": [
+            {
+                "id": parent["id"],
+                "name": parent["name"],
+                "child_categories_count": parent["child_categories_count"]
+            }
+            for parent in tree["parent_categories"]
+        ],
+        "categories": [
+            {
+                "id": category["id"],
+                "name": category["name"],
+                "parent_categories": [
+                    {"id": parent_id, "name": parent_names[parent_id]}
+                    for parent_id in category["parent_category_ids"]
+                ]
+            }
+            for category in tree["categories"]
+        ],
+        "status_options": tree["status_options"],
+    }
@@ -0,0 +1,80 @@
+"""
+Checkout configuration: the VAT rate and mode and the site visit fee.
+
+VAT and site_visit are single-row settings tables read by every payment
+intent, payment confirmation, RFQ quote and the site-visit endpoint. They are
+read once into a CheckoutConfig and kept in the shared cache until either table
+changes (see products_app/signals.py), so those paths run no configuration
+queries and a change in the admin reaches every worker.
+"""
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import VAT, site_visit
+
+
+CHECKOUT_CONFIG_KEY = "checkout:config"
+CHECKOUT_CONFIG_VERSION_KEY = "checkout:config:version"
+CHECKOUT_CONFIG_TIMEOUT = 60 * 60 * 24
+
+# Used when no VAT row exists
+DEFAULT_VAT_PERCENTAGE = Decimal('5.00')
+
+
+class CheckoutConfig(namedtuple('CheckoutConfig', ['vat_percentage', 'vat_inclusive', 'site_visit_amount'])):
+    """
+    vat_percentage: Decimal; vat_inclusive: bool (VAT already in the prices);
+    site_visit_amount: Decimal, or None when no fee is configured.
+    """
+    __slots__ = ()
+
+    def site_visit_fee(self, requested):
+        """Fee to charge for a cart with site_visit set to `requested`."""
+        if requested and self.site_visit_amount:
+            return self.site_visit_amount
+        return Decimal('0.00')
+
+    def apply_vat(self, total):
+        """(base price, VAT amount, total with VAT) for a Decimal total."""
+        if self.vat_inclusive:
+            base_price = total / (Decimal('1') + self.vat_percentage / Decimal('100'))
+            return base_price, total - base_price, total
+        vat_amount = (total * self.vat_percentage) / Decimal('100')
+        return total, vat_amount, total + vat_amount
+
+
+def load_checkout_config():
+    vat = VAT.objects.order_by('id').first()
+    visit = site_visit.objects.order_by('id').first()
+    return CheckoutConfig(
+        vat_percentage=Decimal(vat.percentage) if vat else DEFAULT_VAT_PERCENTAGE,
+        vat_inclusive=vat.is_inclusive if vat else False,
+        site_visit_amount=Decimal(str(visit.amount)) if visit and visit.amount is not None else None,
+    )
+
+
+
+def _config_version():
+    version = cache.get(CHECKOUT_CONFIG_VERSION_KEY)
+    if version is None:
+        cache.add(CHECKOUT_CONFIG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CHECKOUT_CONFIG_VERSION_KEY)
+    return version
+
+
+def get_checkout_config():
+    # Keyed by version so a load racing with a change is never stored as current
+    key = f"{CHECKOUT_CONFIG_KEY}:{_config_version()}"
+    config = cache.get(key)
+    if config is None:
+        config = load_checkout_config()
+        cache.set(key, tuple(config), CHECKOUT_CONFIG_TIMEOUT)
+        return config
+    return CheckoutConfig(*config)
+
+
+def invalidate_checkout_config():
+    cache.set(CHECKOUT_CONFIG_VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,315 @@
+"""
+Stock: the one place that changes it.
+
+InventoryStock.current_stock is the authoritative level. Every change to it is
+appended to the StockMovement ledger in the same transaction (restock, sale,
+adjustment, reservation, release), so a product's level is always the sum of
+its movements; `stock_level_from_ledger` recomputes it from scratch.
+Product.stock is a read-only mirror refreshed with a queryset update, never
+through Product.save().
+
+Stock only goes down through conditional UPDATEs
+(`current_stock = current_stock - n WHERE current_stock >= n`), issued as one
+statement for a whole order, so concurrent checkouts can never take more than
+is on hand. The InventoryStock rows of an order are locked in product id order
+first, which gives each line a definite answer and keeps concurrent orders from
+deadlocking.
+
+A checkout reserves its lines (stock is taken at once and held under a
+StockReservation with a TTL), then commits them when the order is placed or
+releases them when payment fails. Held reservations past their TTL are
+released by `release_expired_reservations`, run from Celery beat.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, PositiveIntegerField, Q, Subquery, Sum, When
+from django.utils import timezone
+
+from .models import InventoryStock, Product, StockMovement, StockReservation
+
+
+RESERVATION_TTL = timedelta(minutes=15)
+EXPIRED_BATCH_SIZE = 500
+
+# A line to reserve: `key` identifies it to the caller (e.g. the cart item id)
+ReservationLine = namedtuple('ReservationLine', ['key', 'product_id', 'quantity'])
+# Outcome of one line; `available` is the stock seen when it was decided
+LineResult = namedtuple('LineResult', ['key', 'product_id', 'quantity', 'reserved', 'available'])
+
+
+class _StockMoved(Exception):
+    """The bulk UPDATE matched fewer rows than planned (stock changed without a row lock)."""
+
+
+def _demand(lines):
+    demand = {}
+    for line in lines:
+        demand[line.product_id] = demand.get(line.product_id, 0) + line.quantity
+    return demand
+
+
+def _per_product(field, demand, sign=1):
+    """CASE expression adding sign * demand[product_id] to `field`."""
+    return Case(
+        *[When(product_id=product_id, then=F(field) + sign * quantity) for product_id, quantity in demand.items()],
+        default=F(field),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _take_bulk(demand):
+    """One conditional UPDATE taking demand[product_id] units from each product; returns rows matched."""
+    condition = reduce(lambda left, right: left | right, [
+        Q(product_id=product_id, current_stock__gte=quantity) for product_id, quantity in demand.items()
+    ])
+    return InventoryStock.objects.filter(condition).update(current_stock=_per_product('current_stock', demand, -1))
+
+
+def _take(product_id, quantity):
+    return InventoryStock.objects.filter(product_id=product_id, current_stock__gte=quantity).update(
+        current_stock=F('current_stock') - quantity
+    ) == 1
+
+
+def _give_back(demand):
+    if demand:
+        InventoryStock.objects.filter(product_id__in=list(demand)).update(
+            current_stock=_per_product('current_stock', demand)
+        )
+
+
+def _count_sold(demand):
+    if demand:
+        InventoryStock.objects.filter(product_id__in=list(demand)).update(
+            total_sold=_per_product('total_sold', demand)
+        )
+
+
+def _sync_product_stock(product_ids):
+    """Mirror current_stock into Product.stock without Product.save() (and its signals)."""
+    if product_ids:
+        Product.objects.filter(id__in=list(product_ids)).update(stock=Subquery(
+            InventoryStock.objects.filter(product_id=OuterRef('pk')).values('current_stock')[:1]
+        ))
+
+
+def _record(movements):
+    """
+    Append StockMovements for changes already applied to current_stock (in this
+    transaction) and refresh Product.stock. balance_after is worked back from
+    the level each product has now.
+    """
+    movements = [movement for movement in movements if movement.quantity]
+    if not movements:
+        return
+    product_ids = {movement.product_id for movement in movements}
+    balances = dict(InventoryStock.objects.filter(product_id__in=product_ids).values_list('product_id', 'current_stock'))
+    for movement in reversed(movements):
+        movement.balance_after = balances[movement.product_id]
+        balances[movement.product_id] -= movement.quantity
+    StockMovement.objects.bulk_create(movements)
+    _sync_product_stock(product_ids)
+
+
+def _stock_row(product_id):
+    """The product's InventoryStock row, locked; created at zero if missing."""
+    InventoryStock.objects.get_or_create(product_id=product_id)
+    return InventoryStock.objects.select_for_update().get(product_id=product_id)
+
+
+def restock(product_id, quantity, notes='', reference=''):
+    """Add stock received for a product. Returns the new level."""
+    with transaction.atomic():
+        _stock_row(product_id)
+        InventoryStock.objects.filter(product_id=product_id).update(
+            current_stock=F('current_stock') + quantity,
+            total_restocked=F('total_restocked') + quantity,
+            last_restocked=timezone.now(),
+        )
+        movement = StockMovement(product_id=product_id, kind='restock', quantity=quantity,
+                                 reference=reference, notes=notes)
+        _record([movement])
+    return movement.balance_after
+
+
+def set_stock_level(product_id, level, notes='', reference=''):
+    """Set a product's level after a stock count; the difference is recorded as an adjustment."""
+    with transaction.atomic():
+        stock = _stock_row(product_id)
+        InventoryStock.objects.filter(product_id=product_id).update(current_stock=level)
+        _record([StockMovement(product_id=product_id, kind='adjustment', quantity=level - stock.current_stock,
+                               reference=reference, notes=notes)])
+    return level
+
+
+def record_sale(product_id, quantity, reference=''):
+    """Take `quantity` units as sold outside a checkout; False (and nothing changes) if short."""
+    with transaction.atomic():
+        if not _take(product_id, quantity):
+            return False
+        _count_sold({product_id: quantity})
+        _record([StockMovement(product_id=product_id, kind='sale', quantity=-quantity, reference=reference)])
+    return True
+
+
+def stock_level_from_ledger(product_ids=None):
+    """Levels recomputed from the ledger: {product_id: sum of movements}."""
+    movements = StockMovement.objects.all()
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=list(product_ids))
+    return dict(movements.values('product_id').annotate(level=Sum('quantity')).values_list('product_id', 'level'))
+
+
+# Reservations
+
+def reserve_stock(lines, reference, ttl=RESERVATION_TTL):
+    """
+    Take stock for each line and hold it under `reference` for `ttl`.
+
+    `lines` are ReservationLines or (key, product_id, quantity) tuples. Lines are
+    decided in order; a line that does not fit what is left is refused and the
+    others still go through. Returns one LineResult per line.
+    """
+    lines = [ReservationLine(*line) for line in lines]
+    if not lines:
+        return []
+
+    with transaction.atomic():
+        product_ids = sorted({line.product_id for line in lines})
+        remaining = dict(
+            InventoryStock.objects.select_for_update().filter(product_id__in=product_ids)
+            .order_by('product_id').values_list('product_id', 'current_stock')
+        )
+
+        results = []
+        for line in lines:
+            available = remaining.get(line.product_id, 0)
+            reserved = available >= line.quantity
+            if reserved:
+                remaining[line.product_id] = available - line.quantity
+            results.append(LineResult(line.key, line.product_id, line.quantity, reserved, available))
+
+        granted = [index for index, result in enumerate(results) if result.reserved and result.quantity > 0]
+        demand = _demand(lines[index] for index in granted)
+        if demand:
+            try:
+                with transaction.atomic():
+                    if _take_bulk(demand) != len(demand):
+                        raise _StockMoved
+            except _StockMoved:
+                # Only without row locks: retake line by line, each one still conditional
+                for index in granted:
+                    if not _take(lines[index].product_id, lines[index].quantity):
+                        results[index] = results[index]._replace(reserved=False)
+                granted = [index for index in granted if results[index].reserved]
+
+        granted_lines = [lines[index] for index in granted]
+        expires_at = timezone.now() + ttl
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                product_id=line.product_id, reference=reference, line_key=str(line.key),
+                quantity=line.quantity, expires_at=expires_at,
+            )
+            for line in granted_lines
+        ])
+        _record([
+            StockMovement(product_id=line.product_id, kind='reservation', quantity=-line.quantity, reference=reference)
+            for line in granted_lines
+        ])
+
+    return results
+
+
+def _held(queryset):
+    return list(queryset.filter(status='held').select_for_update().order_by('product_id', 'id'))
+
+
+def release_reservations(reference):
+    """Give back the stock held under `reference`. Returns the number of reservations released."""
+    with transaction.atomic():
+        held = _held(StockReservation.objects.filter(reference=reference))
+        return _release(held)
+
+
+def _release(held):
+    if not held:
+        return 0
+    _give_back(_demand(held))
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in held]).update(
+        status='released', updated_at=timezone.now()
+    )
+    _record([
+        StockMovement(product_id=reservation.product_id, kind='release', quantity=reservation.quantity,
+                      reference=reservation.reference)
+        for reservation in held
+    ])
+    return len(held)
+
+
+def commit_stock(lines, reference):
+    """
+    Turn the stock held under `reference` into sales, taking stock now for lines
+    that hold none (no earlier reservation, or it was released on expiry).
+    Returns one LineResult per line; a refused line means the product ran out.
+    """
+    lines = [ReservationLine(*line) for line in lines]
+    with transaction.atomic():
+        held = _held(StockReservation.objects.filter(reference=reference))
+        held_by_key = {}
+        for reservation in held:
+            held_by_key.setdefault(reservation.line_key, []).append(reservation)
+
+        results = []
+        missing = []
+        committed = []
+        for line in lines:
+            reservations = held_by_key.pop(str(line.key), [])
+            if sum(reservation.quantity for reservation in reservations) == line.quantity:
+                committed.extend(reservations)
+                results.append(LineResult(line.key, line.product_id, line.quantity, True, None))
+            else:
+                # Quantity changed since the reservation: hold it again at the new size
+                _release(reservations)
+                missing.append(line)
+                results.append(None)
+
+        # Reservations for lines no longer in the order
+        _release([reservation for reservations in held_by_key.values() for reservation in reservations])
+
+        if missing:
+            retaken = iter(reserve_stock(missing, reference))
+            results = [result if result is not None else next(retaken) for result in results]
+            committed.extend(_held(StockReservation.objects.filter(
+                reference=reference, line_key__in=[str(line.key) for line in missing]
+            )))
+
+        if committed:
+            StockReservation.objects.filter(id__in=[reservation.id for reservation in committed]).update(
+                status='committed', updated_at=timezone.now()
+            )
+            _count_sold(_demand(committed))
+            # The held units become sold units: the level does not move
+            movements = []
+            for reservation in committed:
+                movements.append(StockMovement(product_id=reservation.product_id, kind='release',
+                                               quantity=reservation.quantity, reference=reference))
+                movements.append(StockMovement(product_id=reservation.product_id, kind='sale',
+                                               quantity=-reservation.quantity, reference=reference))
+            _record(movements)
+
+    return results
+
+
+def release_expired_reservations(batch_size=EXPIRED_BATCH_SIZE):
+    """Release held reservations past their TTL, a batch at a time. Returns the number released."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(StockReservation.objects.filter(status='held', expires_at__lt=timezone.now())
+                       .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return released
+            released += _release(_held(StockReservation.objects.filter(id__in=ids)))
@@ -0,0 +1,71 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products_app.price_matrix import iter_csv, iter_json, iter_price_matrix
+from products_app.pricing import PriceQuoteError, UNIT_CONVERSION, get_compiled_pricing
+
+
+def _decimal_list(value):
+    try:
+        return [Decimal(item).quantize(Decimal('0.01')) for item in value.split(',') if item.strip()]
+    except InvalidOperation:
+        raise CommandError(f"Invalid number list: {value}")
+
+
+def _int_list(value):
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise CommandError(f"Invalid id list: {value}")
+
+
+class Command(BaseCommand):
+    help = "Write the full price grid (widths x heights x quantities x options) for a product as CSV or JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('--widths', type=_decimal_list, required=True, help="Comma separated, e.g. 50,100,150")
+        parser.add_argument('--heights', type=_decimal_list, required=True, help="Comma separated, e.g. 50,100,150")
+        parser.add_argument('--quantities', type=_int_list, default=[1], help="Comma separated, e.g. 1,5,10")
+        parser.add_argument('--unit', default='cm', choices=list(UNIT_CONVERSION))
+        parser.add_argument('--thickness-ids', type=_int_list, default=[])
+        parser.add_argument('--turnaround-ids', type=_int_list, default=[])
+        parser.add_argument('--delivery-ids', type=_int_list, default=[])
+        parser.add_argument('--installation-type-ids', type=_int_list, default=[])
+        parser.add_argument('--distance-ids', type=_int_list, default=[])
+        parser.add_argument('--format', dest='output_format', default='csv', choices=['csv', 'json'])
+        parser.add_argument('--output', help="File to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        pricing = get_compiled_pricing(options['product_id'])
+        if pricing is None:
+            raise CommandError(f"Product with ID {options['product_id']} not found")
+
+        option_ids = {
+            'thickness_id': options['thickness_ids'],
+            'turnaround_id': options['turnaround_ids'],
+            'delivery_id': options['delivery_ids'],
+            'installation_type_id': options['installation_type_ids'],
+            'distance_id': options['distance_ids'],
+        }
+        try:
+            rows = iter_price_matrix(pricing, options['widths'], options['heights'], options['quantities'],
+                                     options['unit'], option_ids)
+        except PriceQuoteError as e:
+            raise CommandError(e.message)
+
+        if options['output_format'] == 'csv':
+            chunks = iter_csv(rows)
+        else:
+            chunks = iter_json(rows, pricing.product_id, options['unit'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Price matrix written to {options['output']}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from products_app.models import Product, ProductSearchDocument
+from products_app.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ProductSearchDocument row of every product (initial fill or after bulk imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+        for start in range(0, len(product_ids), batch_size):
+            refresh_search_documents(product_ids[start:start + batch_size])
+
+        # Documents of products removed outside the ORM
+        ProductSearchDocument.objects.exclude(product_id__in=product_ids).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search documents for {len(product_ids)} products"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0051_product_created_at_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='products_app.product')),
+                ('name', models.CharField(blank=True, default='', max_length=900)),
+                ('alternate_names', models.CharField(blank=True, default='', max_length=900)),
+                ('description', models.TextField(blank=True, default='')),
+                ('category_names', models.TextField(blank=True, default='')),
+                ('parent_category_names', models.TextField(blank=True, default='')),
+                ('price', models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product Search Documents',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0052_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(db_index=True, help_text='Checkout holding the stock, e.g. cart:12', max_length=100)),
+                ('line_key', models.CharField(blank=True, default='', max_length=100)),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('committed', 'Committed'), ('released', 'Released')], default='held', max_length=10)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='products_app.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Reservations',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='products_ap_status_6154df_idx')],
+            },
+        ),
+    ]
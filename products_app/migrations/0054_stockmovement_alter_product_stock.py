@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_stock_ledger(apps, schema_editor):
+    """
+    Give every product an InventoryStock row and open its ledger with the
+    current level, then make Product.stock mirror it.
+    """
+    Product = apps.get_model('products_app', 'Product')
+    InventoryStock = apps.get_model('products_app', 'InventoryStock')
+    StockMovement = apps.get_model('products_app', 'StockMovement')
+
+    InventoryStock.objects.bulk_create([
+        InventoryStock(product_id=product_id, current_stock=stock or 0)
+        for product_id, stock in Product.objects.filter(inventory_stock__isnull=True).values_list('id', 'stock')
+    ])
+
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, kind='adjustment', quantity=current_stock,
+                      balance_after=current_stock, notes='Opening balance')
+        for product_id, current_stock in InventoryStock.objects.filter(current_stock__gt=0)
+        .values_list('product_id', 'current_stock').iterator()
+    ], batch_size=1000)
+
+    Product.objects.update(stock=models.Subquery(
+        InventoryStock.objects.filter(product_id=models.OuterRef('pk')).values('current_stock')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0053_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('restock', 'Restock'), ('sale', 'Sale'), ('adjustment', 'Adjustment'), ('reservation', 'Reservation'), ('release', 'Reservation released')], max_length=15)),
+                ('quantity', models.IntegerField(help_text='Positive when stock comes in, negative when it goes out')),
+                ('balance_after', models.IntegerField()),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('notes', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products_app.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Movements',
+                'indexes': [models.Index(fields=['product', 'id'], name='products_ap_product_bebbc5_idx')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(open_stock_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:45
+
+from django.db import migrations
+
+
+def build_search_documents(apps, schema_editor):
+    """
+    Give every existing product its ProductSearchDocument, with the same field
+    values as products_app.search.document_fields.
+    """
+    Product = apps.get_model('products_app', 'Product')
+    ProductSearchDocument = apps.get_model('products_app', 'ProductSearchDocument')
+
+    products = Product.objects.filter(search_document__isnull=True).order_by('id') \
+        .prefetch_related('categories__parent_categories')
+    documents = []
+    for product in products.iterator(chunk_size=500):
+        categories = list(product.categories.all())
+        parent_names = []
+        for category in categories:
+            for parent_category in category.parent_categories.all():
+                if parent_category.name and parent_category.name not in parent_names:
+                    parent_names.append(parent_category.name)
+
+        documents.append(ProductSearchDocument(
+            product_id=product.id,
+            name=product.name or '',
+            alternate_names=product.alternate_names or '',
+            description=product.description or '',
+            category_names=' '.join(category.category_name for category in categories if category.category_name),
+            parent_category_names=' '.join(parent_names),
+            price=product.price,
+        ))
+        if len(documents) >= 500:
+            ProductSearchDocument.objects.bulk_create(documents)
+            documents = []
+    ProductSearchDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0054_stockmovement_alter_product_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
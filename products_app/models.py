@@ -160,14 +160,12 @@ class ProductTier(models.Model):
         if self.start_quantity >= self.end_quantity:
             raise ValidationError("Start quantity must be less than end quantity")
 
-        # Check for overlapping tiers
-        overlapping_tiers = ProductTier.objects.filter(
-            product=self.product,
-            tier_level__lt=self.tier_level,  # Only check lower tiers
-            end_quantity__gte=self.start_quantity
-        ).exclude(pk=self.pk)
-
-        if overlapping_tiers.exists():
+        # Check for overlapping tiers against the product's cached tier index
+        if self.product_id is None:
+            return
+        from .pricing import get_compiled_pricing
+        pricing = get_compiled_pricing(self.product_id)
+        if pricing and pricing.tier_index.overlaps_lower_tier(self.tier_level, self.start_quantity, exclude_pk=self.pk):
             raise ValidationError("Tier ranges cannot overlap with lower tiers")
 
 
@@ -214,7 +212,9 @@ class Product(models.Model):
     allow_direct_add_to_cart = models.BooleanField(
         default=False,null=True,blank=True,help_text="Allow Direct Add to Cart (Without Customization)")
 
-    stock = models.PositiveIntegerField(null=True,blank=True)
+    # Read-only mirror of InventoryStock.current_stock, kept for filtering and sorting;
+    # stock changes go through products_app/inventory.py
+    stock = models.PositiveIntegerField(null=True,blank=True,editable=False)
 
     disable_customization = models.BooleanField(default=False,null=True,blank=True,help_text="Disable Customization")
 
@@ -238,21 +238,22 @@ class Product(models.Model):
         """
         Get the appropriate price for a given quantity based on tier pricing
         """
-        if not self.is_tiered:
-            return self.price
+        return self.get_prices_for_quantities([quantity])[0]
 
-        # Find the appropriate tier for the quantity
-        tier = self.tiers.filter(
-            start_quantity__lte=quantity,
-            end_quantity__gte=quantity
-        ).first()
+    def get_prices_for_quantities(self, quantities):
+        """
+        Tier prices for several quantities at once (quantity-break tables).
+        Uses the cached tier index from products_app.pricing, no query per quantity.
+        """
+        if not self.is_tiered or self.pk is None:
+            return [self.price for _quantity in quantities]
 
-        if tier:
-            return tier.price
-        else:
-            # If quantity exceeds all tiers, use the highest tier price
-            highest_tier = self.tiers.order_by('-tier_level').first()
-            return highest_tier.price if highest_tier else self.price
+        from .pricing import get_compiled_pricing
+        pricing = get_compiled_pricing(self.pk)
+        if pricing is None:
+            return [self.price for _quantity in quantities]
+        # If quantity exceeds all tiers, the highest tier price is used
+        return pricing.tier_index.prices_for(quantities, default=self.price)
 
     def get_available_thicknesses(self):
         """Return product-specific thicknesses or global ones if none exist"""
@@ -335,58 +336,6 @@ class Product(models.Model):
                     price_percentage=global_distance.price_percentage,
                     price_decimal=global_distance.price_decimal
                 )
-                from django.db.models.signals import post_save, post_migrate
-                from django.dispatch import receiver
-                from django.db import transaction
-                @receiver(post_save, sender=Product)
-                def create_inventory_stock(sender, instance, created, **kwargs):
-                    """
-                    Automatically create InventoryStock when a new Product is created
-                    """
-                    if created:
-                        InventoryStock.objects.get_or_create(
-                            product=instance,
-                            defaults={
-                                'current_stock': instance.stock if instance.stock else 0,
-                                'low_stock_threshold': 10
-                            }
-                        )
-
-                @receiver(post_save, sender=Product)
-                def update_inventory_stock(sender, instance, **kwargs):
-                    """
-                    Update InventoryStock when Product stock is updated
-                    """
-                    if hasattr(instance, 'inventory_stock'):
-                        # Only update if there's a difference to avoid infinite loops
-                        if instance.inventory_stock.current_stock != (instance.stock or 0):
-                            instance.inventory_stock.current_stock = instance.stock or 0
-                            instance.inventory_stock.save()
-
-                @receiver(post_migrate)
-                def create_inventory_stock_for_existing_products(sender, **kwargs):
-                    """
-                    Create InventoryStock records for existing products after migrations
-                    """
-                    from products_app.models import Product, InventoryStock
-
-                    # Only run for the products_app
-                    if sender.name == 'products_app':
-                        with transaction.atomic():
-                            # Get products that don't have inventory_stock
-                            products_without_inventory = Product.objects.filter(
-                                inventory_stock__isnull=True
-                            )
-
-                            for product in products_without_inventory:
-                                InventoryStock.objects.get_or_create(
-                                    product=product,
-                                    defaults={
-                                        'current_stock': product.stock if product.stock else 0,
-                                        'low_stock_threshold': 1
-                                    }
-                                )
-                            print(f"Created InventoryStock for {products_without_inventory.count()} existing products")
 
 
 class Standard_sizes(models.Model):
@@ -648,17 +597,101 @@ class InventoryStock(models.Model):
             return 'in_stock'
 
     def reduce_stock(self, quantity):
-        """Reduce stock by given quantity"""
-        if self.current_stock >= quantity:
-            self.current_stock -= quantity
-            self.total_sold += quantity
-            self.save()
-            return True
-        return False
+        """Reduce stock by given quantity (recorded as a sale)"""
+        from products_app.inventory import record_sale
+
+        sold = record_sale(self.product_id, quantity)
+        self.refresh_from_db()
+        return sold
 
     def restore_stock(self, quantity):
-        """Restore/Add stock by given quantity"""
-        self.current_stock += quantity
-        self.total_restocked += quantity
-        self.save()
-        return True
\ No newline at end of file
+        """Restore/Add stock by given quantity (recorded as a restock)"""
+        from products_app.inventory import restock
+
+        restock(self.product_id, quantity)
+        self.refresh_from_db()
+        return True
+
+
+class StockMovement(models.Model):
+    """
+    Ledger of every change to InventoryStock.current_stock: the sum of a
+    product's movements is its current stock, and `balance_after` is the level
+    right after the movement. Written only by products_app/inventory.py.
+    """
+    KIND_CHOICES = [
+        ('restock', 'Restock'),
+        ('sale', 'Sale'),
+        ('adjustment', 'Adjustment'),
+        ('reservation', 'Reservation'),
+        ('release', 'Reservation released'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Positive when stock comes in, negative when it goes out")
+    balance_after = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True, default='')
+    notes = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Stock Movements"
+        indexes = [models.Index(fields=['product', 'id'])]
+
+    def __str__(self):
+        return f"{self.product_id} {self.kind} {self.quantity:+d} -> {self.balance_after}"
+
+class StockReservation(models.Model):
+    """
+    Stock held for a checkout (see products_app/inventory.py). The units leave
+    InventoryStock.current_stock when the reservation is made; they are given
+    back if it is released or expires, and counted as sold when it is committed.
+    """
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+    reference = models.CharField(max_length=100, db_index=True, help_text="Checkout holding the stock, e.g. cart:12")
+    line_key = models.CharField(max_length=100, blank=True, default='')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Stock Reservations"
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    def __str__(self):
+        return f"{self.reference} - {self.product_id} x {self.quantity} ({self.status})"
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Denormalized text of a product used by the search index (products_app/search.py).
+    Kept up to date from signals; rebuild with `manage.py rebuild_search_documents`.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    name = models.CharField(max_length=900, blank=True, default='')
+    alternate_names = models.CharField(max_length=900, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    category_names = models.TextField(blank=True, default='')
+    parent_category_names = models.TextField(blank=True, default='')
+    price = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Product Search Documents"
+
+    def __str__(self):
+        return f"Search document for {self.name or self.product_id}"
@@ -0,0 +1,181 @@
+"""
+Keyset (cursor) pagination for the admin list endpoints.
+
+Opt in with `?pagination=cursor` (first page) or `?cursor=<token>` (next pages).
+Rows are ordered by the list's sort fields plus `id` and each page starts
+strictly after the last row of the previous one, so there is no OFFSET scan and
+rows inserted meanwhile neither shift nor repeat pages. The cursor is an opaque
+base64 token holding the sort fields and the last row's values.
+
+Counting is optional: `count=exact` runs COUNT(*), `count=approx` reads MySQL's
+table statistics for unfiltered lists and otherwise counts at most
+APPROX_COUNT_LIMIT rows.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import reduce
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+APPROX_COUNT_LIMIT = 10000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def cursor_requested(request):
+    return bool(request.GET.get('cursor')) or request.GET.get('pagination') == 'cursor'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['datetime', value.isoformat()]
+    if isinstance(value, date):
+        return ['date', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['decimal', str(value)]
+    return [None, value]
+
+
+def _decode_value(encoded):
+    kind, value = encoded
+    if value is None or kind is None:
+        return value
+    if kind == 'datetime':
+        return parse_datetime(value)
+    if kind == 'date':
+        return parse_date(value)
+    if kind == 'decimal':
+        return Decimal(value)
+    raise InvalidCursor("Invalid cursor")
+
+
+def encode_cursor(ordering, values):
+    payload = json.dumps({"o": list(ordering), "v": [_encode_value(value) for value in values]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = [_decode_value(encoded) for encoded in payload["v"]]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor")
+    if payload.get("o") != list(ordering) or len(values) != len(ordering):
+        raise InvalidCursor("Cursor does not match the requested sorting")
+    return values
+
+
+def _key_fields(ordering):
+    """(field, descending) pairs: the sort fields plus id as the tie breaker."""
+    fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+    if fields[-1][0] not in ('id', 'pk'):
+        fields.append(('id', fields[0][1]))
+    return fields
+
+
+def _order_expressions(fields):
+    # NULLs first ascending and last descending, as MySQL sorts them by default
+    return [
+        F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_first=True)
+        for field, descending in fields
+    ]
+
+
+def _after(field, descending, value):
+    """Rows strictly after `value` on one key field."""
+    if descending:
+        if value is None:
+            return Q(pk__in=[])
+        return Q(**{f'{field}__lt': value}) | Q(**{f'{field}__isnull': True})
+    if value is None:
+        return Q(**{f'{field}__isnull': False})
+    return Q(**{f'{field}__gt': value})
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{f'{field}__isnull': True})
+    return Q(**{field: value})
+
+
+def _seek(fields, values):
+    """(f1, f2, ..., id) > (v1, v2, ..., id_v) in the list's sort order."""
+    conditions = []
+    for position, (field, descending) in enumerate(fields):
+        prefix = [_equal(fields[i][0], values[i]) for i in range(position)]
+        conditions.append(reduce(lambda left, right: left & right, prefix, _after(field, descending, values[position])))
+    return reduce(lambda left, right: left | right, conditions)
+
+
+def _row_value(row, field):
+    value = row
+    for part in field.split('__'):
+        value = getattr(value, part, None) if value is not None else None
+    return value
+
+
+def approximate_count(queryset):
+    """(count, is_approximate) without a full COUNT(*) on big tables."""
+    if not queryset.query.has_filters() and connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0], True
+
+    count = queryset.order_by()[:APPROX_COUNT_LIMIT + 1].count()
+    if count > APPROX_COUNT_LIMIT:
+        return APPROX_COUNT_LIMIT, True
+    return count, False
+
+
+def paginate_keyset(queryset, ordering, request, default_page_size=20, max_page_size=100):
+    """
+    One page of `queryset` in keyset order.
+
+    `ordering` is a list of sort fields ('-created_at', 'product__name', ...).
+    Returns (rows, pagination dict) or raises InvalidCursor / ValueError for bad
+    parameters.
+    """
+    page_size = int(request.GET.get('page_size', default_page_size))
+    if page_size < 1 or page_size > max_page_size:
+        raise ValueError(f"page_size must be between 1 and {max_page_size}")
+
+    fields = _key_fields(ordering)
+    key_names = [('-' if descending else '') + field for field, descending in fields]
+
+    page_queryset = queryset.order_by(*_order_expressions(fields))
+    cursor = request.GET.get('cursor')
+    if cursor:
+        page_queryset = page_queryset.filter(_seek(fields, decode_cursor(cursor, key_names)))
+
+    rows = list(page_queryset[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    pagination = {
+        "mode": "cursor",
+        "page_size": page_size,
+        "has_next": has_next,
+        "next_cursor": encode_cursor(key_names, [_row_value(rows[-1], field) for field, _ in fields]) if has_next else None,
+    }
+
+    count_mode = request.GET.get('count')
+    if count_mode == 'exact':
+        pagination["total_items"] = queryset.count()
+        pagination["total_items_is_approximate"] = False
+    elif count_mode == 'approx':
+        pagination["total_items"], pagination["total_items_is_approximate"] = approximate_count(queryset)
+
+    return rows, pagination
@@ -0,0 +1,159 @@
+"""
+Price grids for one product: widths x heights x quantities x option combinations.
+
+The grid is computed with NumPy object arrays of Decimal, so every cell goes
+through exactly the same Decimal operations (and rounding) as calculate_price in
+pricing.py and matches ProductPriceView to the cent. Rows are produced lazily
+so the endpoint and the management command can stream them as JSON or CSV.
+"""
+import csv
+import itertools
+import json
+from decimal import Decimal
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .pricing import OPTION_TYPES, PriceQuoteError
+
+
+MATRIX_COLUMNS = [
+    'product_id', 'width', 'height', 'unit', 'quantity',
+    'thickness_id', 'turnaround_id', 'delivery_id', 'installation_type_id', 'distance_id',
+    'area', 'base_price', 'additional_cost', 'total_price', 'error',
+]
+
+# Largest grid the API endpoint will build; the management command has no limit
+MAX_MATRIX_CELLS = 50000
+
+_round_to_cents = np.frompyfunc(lambda value: round(value, 2), 1, 1)
+
+
+def _decimal_array(values):
+    return np.array([Decimal(value) for value in values], dtype=object)
+
+
+def _resolve_option_combinations(pricing, option_ids):
+    """
+    Cartesian product of the requested option ids, resolved up front.
+    `option_ids` maps request field (thickness_id, ...) to a list of ids; a missing
+    or empty list means "no option of that kind". Unknown ids raise PriceQuoteError.
+    """
+    per_kind = []
+    for kind, field, _model, _global_model, label in OPTION_TYPES:
+        choices = []
+        for option_id in option_ids.get(field) or []:
+            option = pricing.resolve(kind, option_id)
+            if option is None:
+                raise PriceQuoteError(f"{label} with ID {option_id} not found", status_code=404)
+            choices.append((option_id, option))
+        per_kind.append(choices or [(None, None)])
+    return itertools.product(*per_kind)
+
+
+def matrix_size(widths, heights, quantities, option_ids):
+    combinations = 1
+    for _kind, field, _model, _global_model, _label in OPTION_TYPES:
+        combinations *= max(len(option_ids.get(field) or []), 1)
+    return len(widths) * len(heights) * len(quantities) * combinations
+
+
+def iter_price_matrix(pricing, widths, heights, quantities, unit, option_ids=None):
+    """
+    Iterator of one dict per grid cell, keyed by MATRIX_COLUMNS.
+
+    Option ids are resolved before anything is yielded, so an unknown id raises
+    PriceQuoteError here and not halfway through a streamed response. Cells outside
+    the product's size limits carry the same error message ProductPriceView would
+    return and no prices.
+    """
+    combinations = list(_resolve_option_combinations(pricing, option_ids or {}))
+    return _iter_rows(pricing, widths, heights, quantities, unit, combinations)
+
+
+def _iter_rows(pricing, widths, heights, quantities, unit, combinations):
+    width_values = _decimal_array(widths)
+    height_values = _decimal_array(heights)
+    quantity_values = np.array([int(quantity) for quantity in quantities], dtype=object)
+
+    # Validation per axis, width errors take precedence like in calculate_price
+    width_errors = [pricing.width_error(width, unit) for width in width_values]
+    height_errors = [pricing.height_error(height, unit) for height in height_values]
+
+    # (W, H) area in the product's unit, (W, H, Q) base price
+    area = np.multiply.outer(pricing.to_product_unit(width_values, unit),
+                             pricing.to_product_unit(height_values, unit))
+    fixed_price = pricing.fixed_price if pricing.fixed_price else Decimal('0')
+    pro_price = pricing.price if pricing.price else Decimal('0')
+    base_total_price = np.multiply.outer(area * pro_price + fixed_price, quantity_values)
+
+    rounded_area = _round_to_cents(area)
+    rounded_base = _round_to_cents(base_total_price)
+
+    for combination in combinations:
+        additional_cost = np.full(base_total_price.shape, Decimal('0'), dtype=object)
+        for (kind, *_rest), (_option_id, option) in zip(OPTION_TYPES, combination):
+            # Thickness does not affect the price for now
+            if option is None or kind == 'thickness':
+                continue
+            # Same rule as _option_price in pricing.py, over the whole grid at once
+            if option.price_percentage and option.price_percentage != Decimal('0'):
+                additional_cost = additional_cost + (base_total_price * option.price_percentage) / Decimal('100')
+            elif option.price_decimal and option.price_decimal != Decimal('0'):
+                additional_cost = additional_cost + option.price_decimal
+
+        rounded_additional = _round_to_cents(additional_cost)
+        rounded_total = _round_to_cents(base_total_price + additional_cost)
+        option_columns = dict(zip(
+            [field for _kind, field, _model, _global_model, _label in OPTION_TYPES],
+            [option_id for option_id, _option in combination],
+        ))
+
+        for w, width in enumerate(width_values):
+            for h, height in enumerate(height_values):
+                error = width_errors[w] or height_errors[h]
+                for q, quantity in enumerate(quantity_values):
+                    row = {
+                        'product_id': pricing.product_id,
+                        'width': width,
+                        'height': height,
+                        'unit': unit,
+                        'quantity': quantity,
+                        **option_columns,
+                        'area': None,
+                        'base_price': None,
+                        'additional_cost': None,
+                        'total_price': None,
+                        'error': error,
+                    }
+                    if not error:
+                        row.update({
+                            'area': rounded_area[w, h],
+                            'base_price': rounded_base[w, h, q],
+                            'additional_cost': rounded_additional[w, h, q],
+                            'total_price': rounded_total[w, h, q],
+                        })
+                    yield row
+
+
+def iter_json(rows, product_id, unit):
+    """A JSON document {"product_id", "unit", "columns", "rows": [...]} in chunks."""
+    yield json.dumps({"product_id": product_id, "unit": unit, "columns": MATRIX_COLUMNS})[:-1]
+    yield ', "rows": ['
+    for index, row in enumerate(rows):
+        yield (', ' if index else '') + json.dumps(row, cls=DjangoJSONEncoder)
+    yield ']}'
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(MATRIX_COLUMNS)
+    for row in rows:
+        yield writer.writerow(['' if row[column] is None else row[column] for column in MATRIX_COLUMNS])
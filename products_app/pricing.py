@@ -0,0 +1,525 @@
+"""
+Shared price calculation for products.
+
+Every pricing path (ProductPriceView, the batch quote endpoint, the cart and the
+design image endpoint) works from a CompiledPricing object: the product's unit,
+size limits, base/fixed price, tiers and resolved option tables loaded once and
+kept in the cache. A quote is then plain arithmetic with no queries.
+
+Cached objects are keyed by a per-product version and a global-options version.
+The signals in products_app/signals.py bump those versions whenever a product,
+its tiers/options or a Global* option is saved or deleted.
+"""
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from .models import (
+    Product, ProductTier, Thickness, GlobalThickness, TurnaroundTime, GlobalTurnaroundTime,
+    Delivery, GlobalDelivery, InstallationType, GlobalInstallationType,
+    Distance, GlobalDistance,
+)
+
+
+UNIT_CONVERSION = {
+    'cm': Decimal('1'),
+    'meter': Decimal('100'),
+    'feet': Decimal('30.48'),
+    'yard': Decimal('91.44'),
+    'inches': Decimal('2.54'),
+    'mm': Decimal('0.1')
+}
+
+# (option kind, request field, product model, global model, label used in errors)
+OPTION_TYPES = (
+    ('thickness', 'thickness_id', Thickness, GlobalThickness, 'Thickness'),
+    ('turnaround_time', 'turnaround_id', TurnaroundTime, GlobalTurnaroundTime, 'Turnaround time'),
+    ('delivery', 'delivery_id', Delivery, GlobalDelivery, 'Delivery'),
+    ('installation', 'installation_type_id', InstallationType, GlobalInstallationType, 'Installation type'),
+    ('distance', 'distance_id', Distance, GlobalDistance, 'Distance'),
+)
+
+OPTION_MODELS = {kind: (model, global_model) for kind, _field, model, global_model, _label in OPTION_TYPES}
+
+PRICING_CACHE_TIMEOUT = 60 * 60 * 24
+# Bump when CompiledPricing's attributes change so old pickles are not read back
+COMPILED_PRICING_FORMAT = 2
+
+# A plain, picklable copy of a Thickness/Delivery/... row or its Global* counterpart.
+# `source` is 'product' or 'global'; fields a model does not have are None.
+PricingOption = namedtuple('PricingOption', [
+    'id', 'kind', 'source', 'name', 'size', 'km', 'unit', 'days', 'description',
+    'price_percentage', 'price_decimal', 'price', 'is_active',
+])
+
+
+class PriceQuoteError(Exception):
+    """Raised when a quote cannot be produced; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _option_from_row(kind, source, row):
+    return PricingOption(
+        id=row.id,
+        kind=kind,
+        source=source,
+        name=getattr(row, 'name', None),
+        size=getattr(row, 'size', None),
+        km=getattr(row, 'km', None),
+        unit=getattr(row, 'unit', None),
+        days=getattr(row, 'days', None),
+        description=getattr(row, 'description', None),
+        price_percentage=row.price_percentage,
+        price_decimal=getattr(row, 'price_decimal', None),
+        price=getattr(row, 'price', None),
+        is_active=getattr(row, 'is_active', True),
+    )
+
+
+class TierIndex:
+    """
+    A product's ProductTier ranges as parallel arrays sorted by start quantity.
+    Tier ranges do not overlap (ProductTier.clean and ProductCreateUpdateSerializer
+    enforce it), so the tier holding a quantity is the last one starting at or
+    below it, found with a binary search.
+    """
+
+    def __init__(self, tiers):
+        # tiers: (tier_level, start_quantity, end_quantity, price, pk)
+        by_start = sorted(tiers, key=lambda tier: (tier[1], tier[0]))
+        self.levels = [tier[0] for tier in by_start]
+        self.starts = [tier[1] for tier in by_start]
+        self.ends = [tier[2] for tier in by_start]
+        self.prices = [tier[3] for tier in by_start]
+        self.pks = [tier[4] for tier in by_start]
+        # Price of the highest tier level, used when a quantity is outside every range
+        self.highest_price = max(tiers)[3] if tiers else None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def price_for(self, quantity, default=None):
+        """Unit price for `quantity`: its tier, else the highest tier, else `default`."""
+        position = bisect_right(self.starts, quantity) - 1
+        if position >= 0 and self.ends[position] >= quantity:
+            return self.prices[position]
+        return self.highest_price if self.highest_price is not None else default
+
+    def prices_for(self, quantities, default=None):
+        """Unit prices for many quantities, e.g. a quantity-break table."""
+        return [self.price_for(quantity, default) for quantity in quantities]
+
+    def overlaps_lower_tier(self, tier_level, start_quantity, exclude_pk=None):
+        """True if a tier with a lower level ends at or after `start_quantity`."""
+        return any(
+            level < tier_level and end >= start_quantity and pk != exclude_pk
+            for level, end, pk in zip(self.levels, self.ends, self.pks)
+        )
+
+
+class CompiledPricing:
+    """Everything needed to price one product, resolved up front."""
+
+    def __init__(self, product, tiers, product_options, global_options):
+        self.product_id = product.id
+        self.id = product.id
+        self.name = product.name
+        self.size = product.size
+        self.min_width = product.min_width
+        self.max_width = product.max_width
+        self.min_height = product.min_height
+        self.max_height = product.max_height
+        self.price = product.price
+        self.fixed_price = product.fixed_price
+        self.disable_customization = product.disable_customization
+        self.is_tiered = product.is_tiered
+        self.tier_index = TierIndex(tiers)
+        # {kind: {id: PricingOption}}
+        self.product_options = product_options
+        self.global_options = global_options
+
+    def resolve(self, kind, option_id, active_only=False):
+        """
+        Product-specific option first, then the global option with the same id.
+        `active_only` skips inactive global rows, as the cart always has.
+        """
+        try:
+            option_id = int(option_id)
+        except (TypeError, ValueError):
+            return None
+
+        option = self.product_options.get(kind, {}).get(option_id)
+        if option is None:
+            option = self.global_options.get(kind, {}).get(option_id)
+            if option is not None and active_only and not option.is_active:
+                return None
+        return option
+
+    def available_options(self, kind):
+        """Product-specific options, or the active global ones if the product has none."""
+        options = self.product_options.get(kind)
+        if options:
+            return list(options.values())
+        return [option for option in self.global_options.get(kind, {}).values() if option.is_active]
+
+    def price_for_quantity(self, quantity):
+        """Unit price for `quantity`, same rules as Product.get_price_for_quantity."""
+        if not self.is_tiered:
+            return self.price
+        return self.tier_index.price_for(quantity, default=self.price)
+
+    def prices_for_quantities(self, quantities):
+        if not self.is_tiered:
+            return [self.price for _quantity in quantities]
+        return self.tier_index.prices_for(quantities, default=self.price)
+
+    def _limits_in_unit(self, unit):
+        # Product's min/max converted to the user's unit
+        ratio = UNIT_CONVERSION[self.size] / UNIT_CONVERSION[unit]
+        return (self.min_width * ratio, self.max_width * ratio,
+                self.min_height * ratio, self.max_height * ratio)
+
+    def width_error(self, width, unit):
+        """Validation message if `width` is outside the product's limits, else None."""
+        if self.disable_customization:
+            return None
+        min_width, max_width, _min_height, _max_height = self._limits_in_unit(unit)
+        if width < min_width:
+            return f"Width is below the minimum allowed value. Minimum width is {min_width:.2f} {unit}."
+        if width > max_width:
+            return f"Width exceeds the maximum allowed value. Maximum width is {max_width:.2f} {unit}."
+        return None
+
+    def height_error(self, height, unit):
+        """Validation message if `height` is outside the product's limits, else None."""
+        if self.disable_customization:
+            return None
+        _min_width, _max_width, min_height, max_height = self._limits_in_unit(unit)
+        if height < min_height:
+            return f"Height is below the minimum allowed value. Minimum height is {min_height:.2f} {unit}."
+        if height > max_height:
+            return f"Height exceeds the maximum allowed value. Maximum height is {max_height:.2f} {unit}."
+        return None
+
+    def to_product_unit(self, value, unit):
+        return value * (UNIT_CONVERSION[unit] / UNIT_CONVERSION[self.size])
+
+    def base_price(self, width, height, unit, quantity):
+        """
+        Size based price for `quantity` items: (area x price + fixed price) x quantity.
+        A missing width/height falls back to the product's minimum.
+        """
+        width_in_product_unit = self.to_product_unit(width, unit) if width is not None else self.min_width
+        height_in_product_unit = self.to_product_unit(height, unit) if height is not None else self.min_height
+        area = width_in_product_unit * height_in_product_unit
+
+        fixed_price = self.fixed_price if self.fixed_price else Decimal('0')
+        pro_price = self.price if self.price else Decimal('0')
+        return ((area * pro_price) + fixed_price) * quantity
+
+    def quote(self, line):
+        return calculate_price(self, line)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _get_versions(keys):
+    """
+    {key: version} for several version keys in one cache round trip. Versions
+    are unique tokens rather than counters, so a version key that was evicted
+    from the cache can never bring an old compiled object back.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if versions.get(key) is None]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _get_version(key):
+    return _get_versions([key])[key]
+
+
+def _product_version_key(product_id):
+    return f"pricing:version:product:{product_id}"
+
+
+GLOBAL_VERSION_KEY = "pricing:version:global"
+
+
+def bump_product_pricing_version(product_id):
+    cache.set(_product_version_key(product_id), _new_version(), None)
+
+
+def bump_global_pricing_version():
+    cache.set(GLOBAL_VERSION_KEY, _new_version(), None)
+
+
+def get_global_pricing_version():
+    """Changes whenever a Global* option row is saved or deleted."""
+    return _get_version(GLOBAL_VERSION_KEY)
+
+
+def _load_global_options(global_version):
+    """Global option tables as {kind: {id: PricingOption}}, cached per global version."""
+    key = f"pricing:global-options:{global_version}"
+    global_options = cache.get(key)
+    if global_options is None:
+        global_options = {
+            kind: {row.id: _option_from_row(kind, 'global', row) for row in global_model.objects.all()}
+            for kind, _field, _model, global_model, _label in OPTION_TYPES
+        }
+        cache.set(key, global_options, PRICING_CACHE_TIMEOUT)
+    return global_options
+
+
+def _pricing_key(product_id, product_version, global_version):
+    return f"pricing:product:v{COMPILED_PRICING_FORMAT}:{product_id}:{product_version}:{global_version}"
+
+
+def compile_many(product_ids):
+    """
+    CompiledPricing for each existing product id, as {product_id: CompiledPricing}.
+    Cache misses are compiled together with one query per table.
+    """
+    product_ids = {int(product_id) for product_id in product_ids}
+    if not product_ids:
+        return {}
+
+    version_keys = {product_id: _product_version_key(product_id) for product_id in product_ids}
+    versions = _get_versions([GLOBAL_VERSION_KEY, *version_keys.values()])
+    global_version = versions[GLOBAL_VERSION_KEY]
+    keys = {
+        product_id: _pricing_key(product_id, versions[version_key], global_version)
+        for product_id, version_key in version_keys.items()
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    compiled = {}
+    missing = []
+    for product_id, key in keys.items():
+        if key in cached:
+            compiled[product_id] = cached[key]
+        else:
+            missing.append(product_id)
+
+    if missing:
+        products = Product.objects.in_bulk(missing)
+        if products:
+            product_ids_found = list(products)
+            global_options = _load_global_options(global_version)
+
+            tiers = {product_id: [] for product_id in product_ids_found}
+            for tier in ProductTier.objects.filter(product_id__in=product_ids_found):
+                tiers[tier.product_id].append((tier.tier_level, tier.start_quantity, tier.end_quantity, tier.price, tier.pk))
+
+            product_options = {product_id: {} for product_id in product_ids_found}
+            for kind, _field, model, _global_model, _label in OPTION_TYPES:
+                for row in model.objects.filter(product_id__in=product_ids_found):
+                    product_options[row.product_id].setdefault(kind, {})[row.id] = _option_from_row(kind, 'product', row)
+
+            to_cache = {}
+            for product_id, product in products.items():
+                pricing = CompiledPricing(product, tiers[product_id], product_options[product_id], global_options)
+                compiled[product_id] = pricing
+                to_cache[keys[product_id]] = pricing
+            cache.set_many(to_cache, PRICING_CACHE_TIMEOUT)
+
+    return compiled
+
+
+def get_compiled_pricing(product_id):
+    """CompiledPricing for one product, or None if the product does not exist."""
+    try:
+        return compile_many([product_id]).get(int(product_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def option_reference_fields(prefix, option):
+    """
+    Generic relation fields (`<prefix>_content_type`, `<prefix>_object_id`) pointing
+    at a resolved PricingOption, for use in CartItem create/update defaults.
+    """
+    if option is None:
+        return {f'{prefix}_content_type': None, f'{prefix}_object_id': None}
+    model, global_model = OPTION_MODELS[option.kind]
+    model = global_model if option.source == 'global' else model
+    return {
+        f'{prefix}_content_type': ContentType.objects.get_for_model(model),
+        f'{prefix}_object_id': option.id,
+    }
+
+
+SNAPSHOT_FIELDS = ('name', 'size', 'km', 'unit', 'days', 'description', 'price_percentage', 'price_decimal', 'price')
+
+
+def option_snapshot(option):
+    """JSON-safe copy of a PricingOption (decimals as strings), as stored on CartItem.option_snapshot."""
+    snapshot = {'id': option.id, 'source': option.source}
+    for field in SNAPSHOT_FIELDS:
+        value = getattr(option, field)
+        snapshot[field] = str(value) if isinstance(value, Decimal) else value
+    return snapshot
+
+
+def options_for_references(references):
+    """
+    PricingOptions for stored generic references, with one query per option model.
+    `references` is an iterable of (kind, content_type_id, object_id); returns a
+    dict keyed by that tuple. References to deleted rows are left out.
+    """
+    wanted = {}
+    for kind, content_type_id, object_id in references:
+        if content_type_id and object_id:
+            wanted.setdefault(content_type_id, {}).setdefault(object_id, set()).add(kind)
+
+    options = {}
+    for content_type_id, rows in wanted.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        for object_id, row in model.objects.in_bulk(list(rows)).items():
+            for kind in rows[object_id]:
+                source = 'global' if model is OPTION_MODELS[kind][1] else 'product'
+                options[(kind, content_type_id, object_id)] = _option_from_row(kind, source, row)
+    return options
+
+
+def _option_price(option, base_total_price):
+    """Percentage of the base price if set, otherwise the fixed option price."""
+    if option.price_percentage and option.price_percentage != Decimal('0'):
+        return (base_total_price * option.price_percentage) / Decimal('100')
+    elif option.price_decimal and option.price_decimal != Decimal('0'):
+        return option.price_decimal
+    return Decimal('0')
+
+
+def calculate_price(pricing, line):
+    """
+    Price one quote line with a CompiledPricing.
+    `line` holds the validated ProductPriceSerializer fields.
+    Returns the ProductPriceView response body or raises PriceQuoteError.
+    """
+    width = line['width']
+    height = line['height']
+    unit = line['unit']
+    quantity = line['quantity']
+
+    error = pricing.width_error(width, unit) or pricing.height_error(height, unit)
+    if error:
+        raise PriceQuoteError(error)
+
+    # Convert dimensions to product's unit for pricing calculation
+    width_in_product_unit = pricing.to_product_unit(width, unit)
+    height_in_product_unit = pricing.to_product_unit(height, unit)
+    area_in_product_unit_sq = width_in_product_unit * height_in_product_unit
+
+    base_total_price = pricing.base_price(width, height, unit, quantity)
+
+    price_breakdown = {
+        "base_price": round(base_total_price, 2),
+    }
+    additional_cost = Decimal('0')
+
+    for kind, field, _model, _global_model, label in OPTION_TYPES:
+        option_id = line.get(field)
+        if not option_id:
+            continue
+
+        option = pricing.resolve(kind, option_id)
+        if option is None:
+            raise PriceQuoteError(f"{label} with ID {option_id} not found", status_code=404)
+
+        if kind == 'thickness':
+            # Thickness does not affect the price for now
+            option_price = Decimal('0')
+            detail = {"id": option_id, "size": option.size}
+        else:
+            option_price = _option_price(option, base_total_price)
+            detail = {"id": option_id}
+            if kind == 'distance':
+                detail.update({"km": option.km, "unit": option.unit})
+            else:
+                detail["name"] = option.name
+                if kind == 'installation':
+                    detail["days"] = option.days
+
+        detail["price"] = round(option_price, 2)
+        additional_cost += option_price
+        price_breakdown[kind] = detail
+
+    total_price = base_total_price + additional_cost
+
+    return {
+        "product_id": line['product_id'],
+        "width": width,
+        "height": height,
+        "unit": unit,
+        "quantity": quantity,
+        "area": round(area_in_product_unit_sq, 2),
+        "price_breakdown": price_breakdown,
+        "additional_cost": round(additional_cost, 2),
+        "total_price_without_rounded": total_price,
+        "total_price": round(total_price, 2)
+    }
+
+
+def price_line(pricing, width, height, unit, quantity, options):
+    """
+    Server total for a cart line, unrounded: tier price x quantity for tiered
+    products (as calculate_tier_price), otherwise the size based price as in
+    calculate_price, plus the option costs. `options` are resolved PricingOptions.
+    Sizes are not validated here; an unknown unit raises PriceQuoteError.
+    """
+    if unit not in UNIT_CONVERSION:
+        raise PriceQuoteError(f"Invalid unit {unit}")
+
+    if pricing.is_tiered:
+        base_total_price = (pricing.price_for_quantity(quantity) or Decimal('0')) * quantity
+    else:
+        width = Decimal(str(width)) if width is not None else None
+        height = Decimal(str(height)) if height is not None else None
+        base_total_price = pricing.base_price(width, height, unit, quantity)
+
+    additional_cost = Decimal('0')
+    for option in options:
+        # Thickness does not affect the price for now
+        if option is not None and option.kind != 'thickness':
+            additional_cost += _option_price(option, base_total_price)
+    return base_total_price + additional_cost
+
+
+def quote_lines(lines):
+    """
+    Price many quote lines with a constant number of queries.
+    Returns one entry per line, either the price breakdown or an error.
+    """
+    compiled = compile_many(line['product_id'] for line in lines)
+
+    results = []
+    for index, line in enumerate(lines):
+        pricing = compiled.get(line['product_id'])
+        if pricing is None:
+            results.append({"index": index, "error": "Product not found", "status": 404})
+            continue
+        try:
+            quote = calculate_price(pricing, line)
+        except PriceQuoteError as e:
+            results.append({"index": index, "error": e.message, "status": e.status_code})
+            continue
+        quote["index"] = index
+        results.append(quote)
+    return results
@@ -0,0 +1,288 @@
+"""
+Product search.
+
+Each product has a ProductSearchDocument row (name, alternate names, description,
+category and parent category names) refreshed from the signals in
+products_app/signals.py. Every process keeps an in-memory inverted index over
+those rows and ranks matches with BM25; the last query word is also matched as a
+prefix so the index can serve type-ahead queries.
+
+A cache version is bumped after every document change. A process that sees a new
+version re-reads only the documents updated since its last sync.
+
+The index matches whole words and word prefixes. A query it has no match for
+(a fragment from the middle of a word, or a size unit such as "cm") falls back
+to the substring search over the product columns that predates the index.
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .models import Category, Product, ProductSearchDocument
+
+
+SEARCH_VERSION_KEY = "search:version"
+
+# Repeat a field's terms this many times, so name matches outrank description matches
+FIELD_WEIGHTS = {
+    'name': 3,
+    'alternate_names': 2,
+    'category_names': 1,
+    'parent_category_names': 1,
+    'description': 1,
+}
+
+# Columns of the substring fallback search
+SUBSTRING_FIELDS = (
+    'name', 'alternate_names', 'description', 'size',
+    'categories__category_name', 'categories__parent_categories__name',
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Score factor for terms matched only as a prefix of the query word
+PREFIX_MATCH_WEIGHT = 0.7
+MAX_PREFIX_EXPANSIONS = 50
+# Re-read documents this far before the last sync, for rows committed late
+SYNC_OVERLAP = timedelta(minutes=1)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """Postings per term, document lengths and a sorted term list for prefix lookups."""
+
+    def __init__(self):
+        self.postings = {}      # term -> {doc_id: weighted term frequency}
+        self.doc_terms = {}     # doc_id -> {term: weighted term frequency}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self.terms = []         # sorted list of every term
+        self.prices = {}        # doc_id -> price, for numeric queries
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id, fields, price=None):
+        self.remove(doc_id)
+
+        frequencies = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields.get(field)):
+                frequencies[term] = frequencies.get(term, 0) + weight
+
+        for term, frequency in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self.terms.insert(bisect_left(self.terms, term), term)
+            postings[doc_id] = frequency
+
+        length = sum(frequencies.values())
+        self.doc_terms[doc_id] = frequencies
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        if price is not None:
+            self.prices[doc_id] = price
+
+    def remove(self, doc_id):
+        frequencies = self.doc_terms.pop(doc_id, None)
+        if frequencies is None:
+            return
+        for term in frequencies:
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.prices.pop(doc_id, None)
+
+    def expand(self, word):
+        """Indexed terms starting with `word`, exact match first."""
+        position = bisect_left(self.terms, word)
+        matches = []
+        while position < len(self.terms) and self.terms[position].startswith(word):
+            matches.append(self.terms[position])
+            if len(matches) >= MAX_PREFIX_EXPANSIONS:
+                break
+            position += 1
+        return matches
+
+    def search(self, query, prefix=True):
+        """
+        Document ids matching any query word, best BM25 score first.
+        With `prefix`, the last word also matches longer terms starting with it.
+        """
+        words = tokenize(query)
+        if not words or not self.doc_terms:
+            return []
+
+        document_count = len(self.doc_terms)
+        average_length = self.total_length / document_count
+        scores = {}
+
+        for index, word in enumerate(words):
+            if prefix and index == len(words) - 1:
+                terms = self.expand(word)
+            else:
+                terms = [word] if word in self.postings else []
+
+            for term in terms:
+                postings = self.postings[term]
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                weight = 1.0 if term == word else PREFIX_MATCH_WEIGHT
+                for doc_id, frequency in postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / average_length
+                    score = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * score
+
+        # A query that is a number also matches products with exactly that price
+        try:
+            price = Decimal(query.strip())
+        except InvalidOperation:
+            price = None
+        # "nan", "snan" and "inf" parse too but are no price (comparing with sNaN raises)
+        if price is not None and price.is_finite():
+            for doc_id, doc_price in self.prices.items():
+                try:
+                    matches = doc_price == price
+                except InvalidOperation:
+                    continue
+                if matches:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + 1.0
+
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+# Search documents
+
+def document_fields(product):
+    """ProductSearchDocument field values for a product (categories prefetched or not)."""
+    categories = list(product.categories.all())
+    parent_names = []
+    for category in categories:
+        for parent_category in category.parent_categories.all():
+            if parent_category.name and parent_category.name not in parent_names:
+                parent_names.append(parent_category.name)
+
+    return {
+        'name': product.name or '',
+        'alternate_names': product.alternate_names or '',
+        'description': product.description or '',
+        'category_names': ' '.join(category.category_name for category in categories if category.category_name),
+        'parent_category_names': ' '.join(parent_names),
+        'price': product.price,
+    }
+
+
+def refresh_search_documents(product_ids):
+    """Rebuild the search documents of these products and tell every process."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    products = Product.objects.filter(id__in=product_ids).prefetch_related(
+        Prefetch('categories', queryset=Category.objects.prefetch_related('parent_categories'))
+    )
+    for product in products:
+        ProductSearchDocument.objects.update_or_create(product=product, defaults=document_fields(product))
+
+    bump_search_version()
+
+
+def bump_search_version():
+    # After commit, so other processes read the new rows when they see the new version
+    transaction.on_commit(lambda: cache.set(SEARCH_VERSION_KEY, time.time_ns(), None))
+
+
+def _get_search_version():
+    version = cache.get(SEARCH_VERSION_KEY)
+    if version is None:
+        cache.add(SEARCH_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(SEARCH_VERSION_KEY)
+    return version
+
+
+# Process-wide index
+
+_index = None
+_index_version = None
+_synced_at = None
+_index_lock = threading.Lock()
+
+
+def _index_document(index, document):
+    index.add(document.product_id, {
+        'name': document.name,
+        'alternate_names': document.alternate_names,
+        'description': document.description,
+        'category_names': document.category_names,
+        'parent_category_names': document.parent_category_names,
+    }, document.price)
+
+
+def get_search_index():
+    """The process's InvertedIndex, synced with the documents table if the version moved."""
+    global _index, _index_version, _synced_at
+
+    version = _get_search_version()
+    if _index is not None and _index_version == version:
+        return _index
+
+    with _index_lock:
+        if _index is not None and _index_version == version:
+            return _index
+
+        if _index is None:
+            index = InvertedIndex()
+            documents = ProductSearchDocument.objects.all()
+        else:
+            index = _index
+            documents = ProductSearchDocument.objects.filter(updated_at__gte=_synced_at - SYNC_OVERLAP)
+
+        synced_at = _synced_at
+        for document in documents.iterator():
+            _index_document(index, document)
+            if synced_at is None or document.updated_at > synced_at:
+                synced_at = document.updated_at
+
+        if _index is not None:
+            # Drop products deleted since the last sync
+            existing = set(ProductSearchDocument.objects.values_list('product_id', flat=True))
+            for doc_id in [doc_id for doc_id in index.doc_terms if doc_id not in existing]:
+                index.remove(doc_id)
+
+        if synced_at is None:
+            synced_at = timezone.now()
+        _index, _index_version, _synced_at = index, version, synced_at
+        return _index
+
+
+def substring_product_ids(query):
+    """Ids of products with `query` anywhere in their text, size unit or category names."""
+    lookup = Q()
+    for field in SUBSTRING_FIELDS:
+        lookup |= Q(**{f'{field}__icontains': query})
+    return list(Product.objects.filter(lookup).distinct().order_by('id').values_list('id', flat=True))
+
+
+def search_product_ids(query, prefix=True):
+    """Ranked product ids for a search query; substring matches if the index has none."""
+    index = get_search_index()
+    with _index_lock:
+        product_ids = index.search(query, prefix=prefix)
+    return product_ids or substring_product_ids(query)
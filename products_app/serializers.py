@@ -19,8 +19,10 @@ class StandardSizesSerializer(serializers.ModelSerializer):
 
 # Product Serializer
 from django.conf import settings
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Product, Category, ParentCategory
+from .pricing import get_global_pricing_version
 from .serializers import StandardSizesSerializer
 
 
@@ -50,6 +52,28 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
 
+# Active Global* option rows per process, reloaded when the global pricing version changes
+_global_options_cache = {}
+
+
+def get_active_global_options(model, ordering=None, version=None):
+    """
+    Active rows of a Global* option model, without a query once loaded. Pass the
+    global pricing `version` when it is already known to skip the cache read.
+    """
+    if version is None:
+        version = get_global_pricing_version()
+    key = (model, ordering)
+    cached = _global_options_cache.get(key)
+    if cached is None or cached[0] != version:
+        queryset = model.objects.filter(is_active=True)
+        if ordering:
+            queryset = queryset.order_by(ordering)
+        cached = (version, list(queryset))
+        _global_options_cache[key] = cached
+    return cached[1]
+
+
 class DetailedProductSerializer(serializers.ModelSerializer):
     parent_category = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
@@ -103,6 +127,12 @@ class DetailedProductSerializer(serializers.ModelSerializer):
             "distance_options",
         ]
 
+    def _global_options(self, model, ordering=None):
+        # The global version is read once per serialization, not once per option list
+        if "global_pricing_version" not in self.context:
+            self.context["global_pricing_version"] = get_global_pricing_version()
+        return get_active_global_options(model, ordering, self.context["global_pricing_version"])
+
     def get_absolute_html(self, content):
         """Convert relative media URLs to absolute URLs in HTML fields."""
         if content:
@@ -120,39 +150,53 @@ class DetailedProductSerializer(serializers.ModelSerializer):
     def get_installation(self, obj):
         return self.get_absolute_html(obj.installation)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything the serializer reads in a fixed number of queries:
+        the product (+ status), categories with their parent categories,
+        standard sizes and the five product option relations.
+        """
+        return queryset.select_related('status').prefetch_related(
+            Prefetch('categories', queryset=Category.objects.prefetch_related('parent_categories')),
+            'standard_sizes',
+            'thicknesses',
+            'turnaround_times',
+            'deliveries',
+            Prefetch('installation_types', queryset=InstallationType.objects.order_by('-id')),
+            'distances',
+        )
+
     def get_parent_category(self, obj):
         """Retrieve parent category details"""
         parent_categories = []
-        if obj.categories.exists():
-            for category in obj.categories.all():
-                if category.parent_categories.exists():
-                    for parent_category in category.parent_categories.all():
-                        parent_categories.append({
-                            "id": parent_category.id,
-                            "name": parent_category.name,
-                            "description": parent_category.description,
-                            "image": parent_category.image
-                        })
+        for category in obj.categories.all():
+            for parent_category in category.parent_categories.all():
+                parent_categories.append({
+                    "id": parent_category.id,
+                    "name": parent_category.name,
+                    "description": parent_category.description,
+                    "image": parent_category.image
+                })
         return parent_categories if parent_categories else None
 
     def get_category(self, obj):
         """Retrieve category details"""
         categories = []
-        if obj.categories.exists():
-            for category in obj.categories.all():
-                categories.append({
-                    "id": category.id,
-                    "name": category.category_name,
-                    "description": category.description,
-                    "image": category.category_image
-                })
+        for category in obj.categories.all():
+            categories.append({
+                "id": category.id,
+                "name": category.category_name,
+                "description": category.description,
+                "image": category.category_image
+            })
         return categories if categories else None
     def get_amazon_url(self, obj):  # This method should exist
         return obj.amazon_url if obj.amazon_url else ""
 
     def get_thickness_options(self, obj):
         """Get product-specific thickness options or global ones if none exist"""
-        thicknesses = obj.thicknesses.all() if obj.thicknesses.exists() else GlobalThickness.objects.filter(is_active=True)
+        thicknesses = list(obj.thicknesses.all()) or self._global_options(GlobalThickness)
         return [
             {
                 "id": t.id,
@@ -161,11 +205,11 @@ class DetailedProductSerializer(serializers.ModelSerializer):
                 "price": str(t.price)
             }
             for t in thicknesses
-        ] if thicknesses.exists() else None
+        ] if thicknesses else None
 
     def get_turnaround_options(self, obj):
         """Get product-specific turnaround options or global ones if none exist"""
-        turnarounds = obj.turnaround_times.all() if obj.turnaround_times.exists() else GlobalTurnaroundTime.objects.filter(is_active=True)
+        turnarounds = list(obj.turnaround_times.all()) or self._global_options(GlobalTurnaroundTime)
         return [
             {
                 "id": t.id,
@@ -175,11 +219,11 @@ class DetailedProductSerializer(serializers.ModelSerializer):
                 "price_decimal": str(t.price_decimal) if t.price_decimal else None
             }
             for t in turnarounds
-        ] if turnarounds.exists() else None
+        ] if turnarounds else None
 
     def get_delivery_options(self, obj):
         """Get product-specific delivery options or global ones if none exist"""
-        deliveries = obj.deliveries.all() if obj.deliveries.exists() else GlobalDelivery.objects.filter(is_active=True)
+        deliveries = list(obj.deliveries.all()) or self._global_options(GlobalDelivery)
         return [
             {
                 "id": d.id,
@@ -189,11 +233,13 @@ class DetailedProductSerializer(serializers.ModelSerializer):
                 "price_decimal": str(d.price_decimal) if d.price_decimal else None
             }
             for d in deliveries
-        ] if deliveries.exists() else None
+        ] if deliveries else None
 
     def get_installation_options(self, obj):
         """Get product-specific installation options or global ones if none exist"""
-        installations = obj.installation_types.all().order_by('-id') if obj.installation_types.exists() else GlobalInstallationType.objects.filter(is_active=True).order_by('-id')
+        # Newest first; sorted here so the order holds with or without the prefetch
+        installations = sorted(obj.installation_types.all(), key=lambda i: i.id, reverse=True) \
+            or self._global_options(GlobalInstallationType, '-id')
         return [
             {
                 "id": i.id,
@@ -204,11 +250,11 @@ class DetailedProductSerializer(serializers.ModelSerializer):
                 "price_decimal": str(i.price_decimal) if i.price_decimal else None
             }
             for i in installations
-        ] if installations.exists() else None
+        ] if installations else None
 
     def get_distance_options(self, obj):
         """Get product-specific distance options or global ones if none exist"""
-        distances = obj.distances.all() if obj.distances.exists() else GlobalDistance.objects.filter(is_active=True)
+        distances = list(obj.distances.all()) or self._global_options(GlobalDistance)
         return [
             {
                 "id": d.id,
@@ -219,7 +265,7 @@ class DetailedProductSerializer(serializers.ModelSerializer):
                 "price_decimal": str(d.price_decimal) if d.price_decimal else None
             }
             for d in distances
-        ] if distances.exists() else None
+        ] if distances else None
 
 
     
@@ -328,6 +374,26 @@ class ProductPriceSerializer(serializers.Serializer):
         return value
 
 
+class ProductBatchPriceSerializer(serializers.Serializer):
+    items = ProductPriceSerializer(many=True, allow_empty=False, max_length=200)
+
+
+class ProductPriceMatrixSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    widths = serializers.ListField(child=serializers.DecimalField(max_digits=6, decimal_places=2), allow_empty=False)
+    heights = serializers.ListField(child=serializers.DecimalField(max_digits=6, decimal_places=2), allow_empty=False)
+    quantities = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    unit = serializers.CharField(max_length=10)
+    thickness_id = serializers.ListField(child=serializers.IntegerField(), required=False)
+    turnaround_id = serializers.ListField(child=serializers.IntegerField(), required=False)
+    delivery_id = serializers.ListField(child=serializers.IntegerField(), required=False)
+    installation_type_id = serializers.ListField(child=serializers.IntegerField(), required=False)
+    distance_id = serializers.ListField(child=serializers.IntegerField(), required=False)
+    output_format = serializers.ChoiceField(choices=['json', 'csv'], default='json')
+
+    validate_unit = ProductPriceSerializer.validate_unit
+
+
 
 class ProductBasicDetailSerializer(serializers.ModelSerializer):
     size = serializers.CharField(source='get_size_display')  # To get the display value of the choice field
@@ -687,7 +753,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 # inventory_serializers.py or add to your existing serializers.py
 
 from rest_framework import serializers
-from products_app.models import InventoryStock, Product
+from products_app.models import InventoryStock, Product, StockMovement
 from customer.models import Order, CartItem
 
 
@@ -741,6 +807,23 @@ class RestockSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True)
 
 
+class StockAdjustmentSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    level = serializers.IntegerField(min_value=0)
+    notes = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = StockMovement
+        fields = [
+            'id', 'product_id', 'product_name', 'kind', 'quantity', 'balance_after',
+            'reference', 'notes', 'created_at'
+        ]
+
+
 class LowStockAlertSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_id = serializers.IntegerField(source='product.id', read_only=True)
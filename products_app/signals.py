@@ -1,27 +1,202 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from products_app.models import Product, InventoryStock
+from products_app.autocomplete import schedule_autocomplete_update
+from products_app.catalog_cache import bump_catalog_version
+from products_app.category_tree import invalidate_category_tree
+from products_app.checkout_config import invalidate_checkout_config
+from products_app.models import (
+    Product, InventoryStock, ProductTier, Thickness, TurnaroundTime, Delivery, InstallationType, Distance,
+    GlobalThickness, GlobalTurnaroundTime, GlobalDelivery, GlobalInstallationType, GlobalDistance,
+    ParentCategory, Category, Product_status, Standard_sizes,
+    Product_Offer_slider, Banner_Image, Testimonials, VAT, site_visit,
+)
+from products_app.pricing import bump_product_pricing_version, bump_global_pricing_version
+from products_app.search import bump_search_version, refresh_search_documents
 
 
 @receiver(post_save, sender=Product)
 def create_inventory_stock(sender, instance, created, **kwargs):
     """
-    Automatically create InventoryStock when a new Product is created
+    Automatically create InventoryStock when a new Product is created.
+    Stock itself only changes through products_app/inventory.py.
     """
     if created:
-        InventoryStock.objects.create(
-            product=instance,
-            current_stock=instance.stock if instance.stock else 0
-        )
+        InventoryStock.objects.get_or_create(product=instance)
+
+
+# Pricing cache invalidation
 
 @receiver(post_save, sender=Product)
-def update_inventory_stock(sender, instance, **kwargs):
+@receiver(post_delete, sender=Product)
+def invalidate_product_pricing(sender, instance, **kwargs):
+    """
+    Drop the compiled pricing of a product when it is saved or deleted
+    """
+    bump_product_pricing_version(instance.pk)
+
+
+@receiver(post_save, sender=ProductTier)
+@receiver(post_delete, sender=ProductTier)
+@receiver(post_save, sender=Thickness)
+@receiver(post_delete, sender=Thickness)
+@receiver(post_save, sender=TurnaroundTime)
+@receiver(post_delete, sender=TurnaroundTime)
+@receiver(post_save, sender=Delivery)
+@receiver(post_delete, sender=Delivery)
+@receiver(post_save, sender=InstallationType)
+@receiver(post_delete, sender=InstallationType)
+@receiver(post_save, sender=Distance)
+@receiver(post_delete, sender=Distance)
+def invalidate_product_option_pricing(sender, instance, **kwargs):
     """
-    Update InventoryStock when Product stock is updated
+    Drop the compiled pricing of the owning product when a tier or option changes
     """
-    if hasattr(instance, 'inventory_stock'):
-        # Only update if there's a difference to avoid infinite loops
-        if instance.inventory_stock.current_stock != (instance.stock or 0):
-            instance.inventory_stock.current_stock = instance.stock or 0
-            instance.inventory_stock.save()
\ No newline at end of file
+    bump_product_pricing_version(instance.product_id)
+
+
+@receiver(post_save, sender=GlobalThickness)
+@receiver(post_delete, sender=GlobalThickness)
+@receiver(post_save, sender=GlobalTurnaroundTime)
+@receiver(post_delete, sender=GlobalTurnaroundTime)
+@receiver(post_save, sender=GlobalDelivery)
+@receiver(post_delete, sender=GlobalDelivery)
+@receiver(post_save, sender=GlobalInstallationType)
+@receiver(post_delete, sender=GlobalInstallationType)
+@receiver(post_save, sender=GlobalDistance)
+@receiver(post_delete, sender=GlobalDistance)
+def invalidate_global_option_pricing(sender, **kwargs):
+    """
+    Global options are shared by every product, so bump the global pricing version
+    """
+    bump_global_pricing_version()
+
+
+# Catalog response cache invalidation
+
+CATALOG_MODELS = (
+    Product, Category, ParentCategory, Product_status, Standard_sizes, ProductTier,
+    Thickness, TurnaroundTime, Delivery, InstallationType, Distance,
+    GlobalThickness, GlobalTurnaroundTime, GlobalDelivery, GlobalInstallationType, GlobalDistance,
+    Product_Offer_slider, Banner_Image, Testimonials, VAT, site_visit,
+)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Any change to catalog data makes every cached catalog response stale
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_catalog_version()
+
+
+for catalog_model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=catalog_model, dispatch_uid=f'catalog_save_{catalog_model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=catalog_model, dispatch_uid=f'catalog_delete_{catalog_model.__name__}')
+
+m2m_changed.connect(invalidate_catalog_cache, sender=Product.categories.through, dispatch_uid='catalog_product_categories')
+m2m_changed.connect(invalidate_catalog_cache, sender=Category.parent_categories.through, dispatch_uid='catalog_category_parents')
+
+
+# Search documents
+
+def _search_product_ids(instance):
+    """Products whose search document shows this product/category/parent category"""
+    if isinstance(instance, Product):
+        return {instance.pk}
+    if isinstance(instance, Category):
+        return set(instance.products.values_list('id', flat=True))
+    return set(
+        Product.objects.filter(categories__parent_categories=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ParentCategory)
+def update_search_documents(sender, instance, **kwargs):
+    refresh_search_documents(_search_product_ids(instance))
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=ParentCategory)
+def remember_search_products(sender, instance, **kwargs):
+    # The relations are gone by post_delete, so collect the products first
+    instance._search_product_ids = _search_product_ids(instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=ParentCategory)
+def update_search_documents_after_delete(sender, instance, **kwargs):
+    refresh_search_documents(getattr(instance, '_search_product_ids', set()))
+
+
+@receiver(post_delete, sender=Product)
+def drop_search_document(sender, instance, **kwargs):
+    # The document row is deleted with the product (CASCADE)
+    bump_search_version()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Category.parent_categories.through)
+def update_search_documents_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._search_product_ids = _search_product_ids(instance)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        product_ids = getattr(instance, '_search_product_ids', set())
+    elif not reverse:
+        # Product.categories or Category.parent_categories changed
+        product_ids = _search_product_ids(instance)
+    elif sender is Product.categories.through:
+        # Category.products changed: pk_set holds product ids
+        product_ids = set(pk_set or ())
+    else:
+        # ParentCategory.child_categories changed: pk_set holds category ids
+        product_ids = set(
+            Product.objects.filter(categories__in=pk_set or ()).values_list('id', flat=True)
+        )
+    refresh_search_documents(product_ids)
+
+
+# Autocomplete suggestions
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def update_autocomplete(sender, instance, **kwargs):
+    schedule_autocomplete_update('product' if sender is Product else 'category', instance.pk)
+
+
+# Category tree snapshot
+
+@receiver(post_save, sender=ParentCategory)
+@receiver(post_delete, sender=ParentCategory)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product_status)
+@receiver(post_delete, sender=Product_status)
+@receiver(post_delete, sender=Product)
+def refresh_category_tree(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Category.parent_categories.through)
+def refresh_category_tree_on_relation_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_category_tree()
+
+
+# Checkout configuration cache invalidation
+
+@receiver(post_save, sender=VAT)
+@receiver(post_delete, sender=VAT)
+@receiver(post_save, sender=site_visit)
+@receiver(post_delete, sender=site_visit)
+def refresh_checkout_config(sender, **kwargs):
+    invalidate_checkout_config()
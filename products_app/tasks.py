@@ -103,3 +103,18 @@ def delete_old_backups(backup_dir):
     except Exception as e:
         print(f"Error during cleanup of old backups: {str(e)}")
 
+
+
+# Stock reservations
+
+@shared_task
+def release_expired_stock_reservations():
+    """
+    Give back stock held by checkouts that were abandoned past the reservation TTL.
+    """
+    from products_app.inventory import release_expired_reservations
+
+    released = release_expired_reservations()
+    if released:
+        logger.info(f"Released {released} expired stock reservations")
+    return released
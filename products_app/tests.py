@@ -1,3 +1,399 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+
+from . import autocomplete
+from .autocomplete import PrefixIndex
+from .checkout_config import get_checkout_config
+from .inventory import (
+    commit_stock, release_reservations, reserve_stock, restock, set_stock_level, stock_level_from_ledger,
+)
+from .models import (
+    Category, Delivery, GlobalDistance, GlobalInstallationType, GlobalThickness, InventoryStock, ParentCategory,
+    Product, ProductTier, Product_status, Standard_sizes, StockMovement, StockReservation, TurnaroundTime, VAT,
+    site_visit,
+)
+from .price_matrix import iter_price_matrix
+from .pricing import PriceQuoteError, calculate_price, compile_many, get_compiled_pricing
+from .search import InvertedIndex
+from .serializers import DetailedProductSerializer
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = PrefixIndex({
+            ('product', 1): [("Acrylic Board", "a.png"), ("Perspex", "a.png")],
+            ('category', 2): [("Boards", None)],
+        })
+
+    def names(self, query, index=None):
+        return [suggestion["name"] for suggestion in (index or self.index).suggest(query)]
+
+    def test_whole_names_come_before_later_words(self):
+        self.assertEqual(self.names("boa"), ["Boards", "Acrylic Board"])
+
+    def test_replace_updates_one_item_on_a_copy(self):
+        index = self.index.copy()
+        index.replace(('product', 1), [("Foam Board", "f.png")])
+        index.replace(('category', 2), [])
+        index.replace(('product', 3), [("Board Stand", None)])
+
+        self.assertEqual(self.names("boa", index), ["Board Stand", "Foam Board"])
+        self.assertEqual(self.names("pers", index), [])
+        # The original keeps serving lookups unchanged
+        self.assertEqual(self.names("pers"), ["Perspex"])
+
+
+class AutocompleteVersionCheckTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete._index = None
+        autocomplete._expire_version_check()
+        self.product = Product.objects.create(name="Acrylic Board")
+
+    def names(self, query):
+        return [suggestion["name"] for suggestion in autocomplete.suggest(query)]
+
+    def test_lookups_within_the_interval_do_not_read_the_cache(self):
+        self.names("acr")
+        with mock.patch("products_app.autocomplete.cache", wraps=cache) as wrapped:
+            self.assertEqual(self.names("acr"), ["Acrylic Board"])
+        wrapped.get.assert_not_called()
+
+    def test_other_process_changes_show_up_after_the_interval(self):
+        self.names("acr")
+        # Another process's write: the shared version moves, this process is not told
+        cache.set(autocomplete.AUTOCOMPLETE_VERSION_KEY, 1, None)
+        cache.delete(autocomplete.AUTOCOMPLETE_SOURCE_KEY)
+        Product.objects.create(name="Acrylic Sheet")
+
+        self.assertEqual(self.names("acr"), ["Acrylic Board"])
+        with mock.patch("products_app.autocomplete.time.monotonic",
+                        return_value=time.monotonic() + autocomplete.VERSION_CHECK_INTERVAL):
+            self.assertEqual(self.names("acr"), ["Acrylic Board", "Acrylic Sheet"])
+
+    def test_own_writes_show_up_immediately(self):
+        self.names("acr")
+        autocomplete.update_autocomplete_entries('product', Product.objects.create(name="Acrylic Sheet").id)
+        self.assertEqual(self.names("acr"), ["Acrylic Board", "Acrylic Sheet"])
+
+
+class InvertedIndexPriceQueryTests(SimpleTestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, {'name': "Acrylic Board"}, price=Decimal('25.00'))
+        self.index.add(2, {'name': "Banner"}, price=Decimal('40.00'))
+
+    def test_number_matches_price(self):
+        self.assertEqual(self.index.search("25"), [1])
+
+    def test_non_finite_numbers_match_nothing(self):
+        for query in ("nan", "snan", "-sNaN", "inf", "Infinity"):
+            self.assertEqual(self.index.search(query), [])
+
+
+class DetailedProductSerializerQueryCountTests(TestCase):
+    # product + status, categories, parent categories, standard sizes, 5 option relations
+    EXPECTED_QUERIES = 9
+
+    def setUp(self):
+        status = Product_status.objects.create(status="Active")
+        self.product = Product.objects.create(name="Sign", price=Decimal('2.50'), status=status)
+
+        parents = [ParentCategory.objects.create(name=f"Parent {i}") for i in range(3)]
+        for i in range(4):
+            category = Category.objects.create(category_name=f"Category {i}")
+            category.parent_categories.set(parents)
+            self.product.categories.add(category)
+
+        for i in range(3):
+            Standard_sizes.objects.create(product=self.product, width=10 + i, height=20 + i)
+            TurnaroundTime.objects.create(product=self.product, name=f"Turnaround {i}", price_decimal=Decimal('5'))
+            Delivery.objects.create(product=self.product, name=f"Delivery {i}", price_percentage=Decimal('10'))
+
+        # No product-specific thickness/installation/distance: these fall back to the global tables
+        GlobalThickness.objects.create(size="5mm", price=Decimal('1'))
+        GlobalInstallationType.objects.create(name="Standard", days=5)
+        GlobalDistance.objects.create(km="20 km")
+
+    def serialize(self):
+        product = DetailedProductSerializer.setup_eager_loading(Product.objects.all()).get(id=self.product.id)
+        return DetailedProductSerializer(product).data
+
+    def test_query_count_is_fixed(self):
+        # First render loads the global option tables into the process cache
+        self.serialize()
+
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            data = self.serialize()
+
+        self.assertEqual(len(data["category"]), 4)
+        self.assertEqual(len(data["parent_category"]), 12)
+        self.assertEqual(len(data["turnaround_options"]), 3)
+        self.assertEqual(data["thickness_options"][0]["size"], "5mm")
+        self.assertEqual(data["installation_options"][0]["name"], "Standard")
+        self.assertEqual(data["status"], "Active")
+
+    def test_query_count_does_not_grow_with_relations(self):
+        self.serialize()
+        for i in range(5):
+            category = Category.objects.create(category_name=f"Extra {i}")
+            category.parent_categories.add(ParentCategory.objects.create(name=f"Extra parent {i}"))
+            self.product.categories.add(category)
+
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            data = self.serialize()
+
+        self.assertEqual(len(data["category"]), 9)
+
+    def test_global_version_is_read_once_per_serialization(self):
+        with mock.patch(
+            "products_app.serializers.get_global_pricing_version", return_value=1
+        ) as get_version:
+            self.serialize()
+        self.assertEqual(get_version.call_count, 1)
+
+    def test_global_options_reload_after_change(self):
+        self.serialize()
+        GlobalThickness.objects.create(size="10mm", price=Decimal('2'))
+
+        data = self.serialize()
+
+        self.assertEqual([t["size"] for t in data["thickness_options"]], ["5mm", "10mm"])
+
+
+class CompileManyCacheTests(TestCase):
+    def setUp(self):
+        self.product_ids = [
+            Product.objects.create(name=f"Sign {i}", price=Decimal('2.50')).id for i in range(5)
+        ]
+
+    def test_cached_pricing_reads_all_versions_in_one_round_trip(self):
+        compile_many(self.product_ids)
+
+        with mock.patch("products_app.pricing.cache", wraps=cache) as wrapped:
+            with self.assertNumQueries(0):
+                compiled = compile_many(self.product_ids)
+
+        self.assertEqual(set(compiled), set(self.product_ids))
+        # One call for the version tokens, one for the compiled objects
+        self.assertEqual(wrapped.get_many.call_count, 2)
+        wrapped.get.assert_not_called()
+
+    def test_product_change_recompiles_only_that_product(self):
+        compile_many(self.product_ids)
+        Product.objects.filter(id=self.product_ids[0]).update(price=Decimal('4.00'))
+        Product.objects.get(id=self.product_ids[0]).save()
+
+        compiled = compile_many(self.product_ids)
+        self.assertEqual(compiled[self.product_ids[0]].price, Decimal('4.00'))
+
+
+class PriceMatrixParityTests(TestCase):
+    WIDTHS = ['10', '33.33', '250']     # 250 inches is over the maximum width
+    HEIGHTS = ['15.5', '41.7']
+    QUANTITIES = [1, 7]
+    UNIT = 'inches'
+
+    def setUp(self):
+        limits = dict(min_width=Decimal('10'), max_width=Decimal('200'),
+                      min_height=Decimal('10'), max_height=Decimal('200'))
+        self.products = {
+            'sized': Product.objects.create(name="Banner", price=Decimal('0.037500'), **limits),
+            'fixed price': Product.objects.create(name="Plaque", price=Decimal('0.001234'),
+                                                  fixed_price=Decimal('12.345000'), **limits),
+            'tiered': Product.objects.create(name="Sticker", price=Decimal('0.050000'), is_tiered=True, **limits),
+        }
+        tiered = self.products['tiered']
+        ProductTier.objects.create(product=tiered, tier_level=1, start_quantity=1, end_quantity=5, price=Decimal('3.5'))
+        ProductTier.objects.create(product=tiered, tier_level=2, start_quantity=6, end_quantity=50, price=Decimal('2.75'))
+
+        self.option_ids = {}
+        for name, product in self.products.items():
+            turnarounds = [
+                TurnaroundTime.objects.create(product=product, name="Express", price_percentage=Decimal('12.50')),
+                TurnaroundTime.objects.create(product=product, name="Rush", price_decimal=Decimal('7.333333')),
+            ]
+            delivery = Delivery.objects.create(product=product, name="Courier", price_percentage=Decimal('3.75'))
+            self.option_ids[name] = {
+                'turnaround_id': [turnaround.id for turnaround in turnarounds],
+                'delivery_id': [delivery.id],
+            }
+
+    def quote(self, pricing, row):
+        line = {field: row[field] for field in ('product_id', 'width', 'height', 'unit', 'quantity')}
+        line.update({field: row[field] for field in ('turnaround_id', 'delivery_id') if row[field]})
+        try:
+            return calculate_price(pricing, line), line
+        except PriceQuoteError as e:
+            return {"error": e.message}, line
+
+    def assert_cell_matches(self, pricing, row):
+        quote, line = self.quote(pricing, row)
+        response = self.client.post(reverse('product-price'), {**line, 'width': str(line['width']),
+                                    'height': str(line['height'])}, content_type='application/json')
+        body = response.json()
+
+        if row['error']:
+            self.assertEqual(quote, {"error": row['error']})
+            self.assertEqual((response.status_code, body["error"]), (400, row['error']))
+            return
+
+        self.assertEqual(response.status_code, 200)
+        for column in ('area', 'additional_cost', 'total_price'):
+            self.assertEqual(row[column], quote[column], (column, line))
+            self.assertEqual(row[column], Decimal(str(body[column])), (column, line))
+        self.assertEqual(row['base_price'], quote['price_breakdown']['base_price'])
+        self.assertEqual(row['base_price'], Decimal(str(body['price_breakdown']['base_price'])))
+
+    def test_every_cell_matches_product_price_view(self):
+        for name, product in self.products.items():
+            pricing = get_compiled_pricing(product.id)
+            for option_ids in ({}, self.option_ids[name]):
+                with self.subTest(product=name, options=bool(option_ids)):
+                    rows = list(iter_price_matrix(pricing, self.WIDTHS, self.HEIGHTS, self.QUANTITIES,
+                                                  self.UNIT, option_ids))
+                    self.assertEqual(len(rows), 12 * (2 if option_ids else 1))
+                    self.assertTrue(any(row['error'] for row in rows))
+                    for row in rows:
+                        self.assert_cell_matches(pricing, row)
+
+
+class CheckoutConfigTests(TestCase):
+    def setUp(self):
+        self.vat = VAT.objects.create(percentage=Decimal('5.00'))
+        site_visit.objects.create(amount=Decimal('150.00'))
+
+    def test_cached_config_runs_no_queries(self):
+        get_checkout_config()
+        with self.assertNumQueries(0):
+            config = get_checkout_config()
+        self.assertEqual(config.vat_percentage, Decimal('5.00'))
+        self.assertEqual(config.site_visit_fee(True), Decimal('150.00'))
+
+    def test_saving_vat_reaches_the_next_read(self):
+        get_checkout_config()
+        self.vat.percentage = Decimal('7.50')
+        self.vat.is_inclusive = True
+        self.vat.save()
+
+        config = get_checkout_config()
+        self.assertEqual(config.vat_percentage, Decimal('7.50'))
+        self.assertTrue(config.vat_inclusive)
+
+    def test_deleting_site_visit_drops_the_fee(self):
+        get_checkout_config()
+        site_visit.objects.all().delete()
+        self.assertEqual(get_checkout_config().site_visit_fee(True), Decimal('0.00'))
+
+
+class StockReservationTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Panel", price=Decimal('1'))
+        self.other = Product.objects.create(name="Frame", price=Decimal('1'))
+        restock(self.product.id, 5)
+        restock(self.other.id, 2)
+
+    def current_stock(self, product):
+        return InventoryStock.objects.get(product=product).current_stock
+
+    def test_batch_reports_each_line(self):
+        results = reserve_stock([(1, self.product.id, 3), (2, self.other.id, 3), (3, self.product.id, 2)], "cart:1")
+
+        self.assertEqual([result.reserved for result in results], [True, False, True])
+        self.assertEqual(self.current_stock(self.product), 0)
+        self.assertEqual(self.current_stock(self.other), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_release_gives_stock_back(self):
+        reserve_stock([(1, self.product.id, 4)], "cart:1")
+
+        self.assertEqual(release_reservations("cart:1"), 1)
+        self.assertEqual(self.current_stock(self.product), 5)
+        self.assertEqual(release_reservations("cart:1"), 0)
+
+    def test_commit_counts_sale_and_takes_unreserved_lines(self):
+        reserve_stock([(1, self.product.id, 2)], "cart:1")
+
+        results = commit_stock([(1, self.product.id, 2), (2, self.other.id, 1)], "cart:1")
+
+        self.assertTrue(all(result.reserved for result in results))
+        self.assertEqual(self.current_stock(self.product), 3)
+        self.assertEqual(self.current_stock(self.other), 1)
+        self.assertEqual(InventoryStock.objects.get(product=self.product).total_sold, 2)
+        self.assertEqual(StockReservation.objects.filter(reference="cart:1", status='committed').count(), 2)
+
+    def test_ledger_adds_up_to_current_stock(self):
+        reserve_stock([(1, self.product.id, 2)], "cart:1")
+        release_reservations("cart:1")
+        reserve_stock([(1, self.product.id, 3)], "cart:2")
+        commit_stock([(1, self.product.id, 3)], "cart:2")
+        set_stock_level(self.other.id, 7, notes="Stock count")
+
+        levels = stock_level_from_ledger()
+        self.assertEqual(levels[self.product.id], self.current_stock(self.product))
+        self.assertEqual(levels[self.other.id], 7)
+        last = StockMovement.objects.filter(product=self.product).latest('id')
+        self.assertEqual((last.kind, last.balance_after), ('sale', 2))
+
+    def test_product_save_does_not_touch_stock(self):
+        self.product.refresh_from_db()
+        self.product.name = "Panel XL"
+        self.product.save()
+
+        self.assertEqual(self.current_stock(self.product), 5)
+        self.assertEqual(StockMovement.objects.filter(product=self.product).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockReservationConcurrencyTests(TransactionTestCase):
+    CHECKOUTS = 12
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Panel", price=Decimal('1'))
+        self.other = Product.objects.create(name="Frame", price=Decimal('1'))
+        restock(self.product.id, 10)
+        restock(self.other.id, 10)
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.CHECKOUTS)
+        outcomes = []
+
+        def checkout(number):
+            try:
+                barrier.wait()
+                # Each checkout wants 3 of each product, in alternating order
+                lines = [(1, self.product.id, 3), (2, self.other.id, 3)]
+                if number % 2:
+                    lines.reverse()
+                outcomes.append(reserve_stock(lines, f"cart:{number}"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(number,)) for number in range(self.CHECKOUTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.CHECKOUTS)
+        for product in (self.product, self.other):
+            granted = sum(
+                result.quantity for results in outcomes for result in results
+                if result.reserved and result.product_id == product.id
+            )
+            stock = InventoryStock.objects.get(product=product)
+            self.assertEqual(granted, 9)
+            self.assertEqual(stock.current_stock, 1)
+            self.assertEqual(
+                sum(StockReservation.objects.filter(product=product, status='held').values_list('quantity', flat=True)),
+                9
+            )
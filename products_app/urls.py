@@ -38,6 +38,7 @@ urlpatterns = [
     # Search
 
     path("search/", views.search_products, name="search_products"),
+    path("search/autocomplete/", views.autocomplete_products, name="autocomplete_products"),
 
     #  Warranty plan based on price range
 
@@ -71,6 +72,8 @@ urlpatterns = [
     # Product Price
 
     path('product-price/', views.ProductPriceView.as_view(), name='product-price'),
+    path('product-price/batch/', views.ProductBatchPriceView.as_view(), name='product-price-batch'),
+    path('product-price/matrix/', views.ProductPriceMatrixView.as_view(), name='product-price-matrix'),
 
     # Produt Serializer for editor
 
@@ -91,10 +94,13 @@ urlpatterns = [
 
     path('new/products/filter/', views.product_filter_list, name='product-filter-list'),
     path('new/products/filter-options/', views.product_filter_options, name='product-filter-options'),
+    path('category-tree/', views.category_tree, name='category-tree'),
 
     # Inventory Management URLs
     path('inventory/stock/', views.inventory_stock_list, name='inventory-stock-list'),
     path('inventory/restore-stock/', views.restore_product_stock, name='restore-product-stock'),
+    path('inventory/adjust-stock/', views.adjust_product_stock, name='adjust-product-stock'),
+    path('inventory/movements/', views.stock_movement_list, name='stock-movement-list'),
     path('inventory/low-stock-alerts/', views.low_stock_alerts, name='low-stock-alerts'),
     path('inventory/dashboard/', views.inventory_dashboard, name='inventory-dashboard'),
 
@@ -1,7 +1,8 @@
-from decimal import Decimal
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from rest_framework import status
@@ -13,6 +14,14 @@ from rest_framework.views import APIView
 
 from .serializers import *
 from .models import *
+from .pricing import PriceQuoteError, bump_global_pricing_version, calculate_price, get_compiled_pricing, quote_lines
+from .catalog_cache import bump_catalog_version, catalog_cache
+from .search import search_product_ids
+from .autocomplete import DEFAULT_SUGGESTIONS, suggest
+from .category_tree import filter_options_from_tree, get_category_tree
+from .checkout_config import get_checkout_config
+from .pagination import cursor_requested, paginate_keyset
+from .price_matrix import MAX_MATRIX_CELLS, iter_csv, iter_json, iter_price_matrix, matrix_size
 # Create your views here.
 
 def dashboard(request):
@@ -129,9 +138,10 @@ def list_products(request):
 
 @api_view(["GET"])
 @permission_classes([AllowAny])  # Allow any user to access this endpoint
+@catalog_cache
 def get_product_details(request, product_id):
     try:
-        product = Product.objects.get(id=product_id)
+        product = DetailedProductSerializer.setup_eager_loading(Product.objects.all()).get(id=product_id)
         serializer = DetailedProductSerializer(product, context={"request": request})
         return Response(serializer.data, status=200)
     except Product.DoesNotExist:
@@ -141,6 +151,7 @@ def get_product_details(request, product_id):
 
 # Parent Category
 
+@method_decorator(catalog_cache, name='get')
 class ParentCategoryListView(APIView):
     permission_classes = [AllowAny]
 
@@ -152,6 +163,7 @@ class ParentCategoryListView(APIView):
 
 # Category by parent category id
 
+@method_decorator(catalog_cache, name='get')
 class CategoryByParentView(APIView):
     permission_classes = [AllowAny]  # Allow public access
 
@@ -182,6 +194,7 @@ class CategoryByParentView(APIView):
 
 # Product filtered based on parent category id
 
+@method_decorator(catalog_cache, name='get')
 class ProductListByParentCategory(APIView):
     permission_classes = [AllowAny]  # Public access
 
@@ -216,6 +229,7 @@ class ProductListByParentCategory(APIView):
 
 # Product list based on category id
 
+@method_decorator(catalog_cache, name='get')
 class ProductListByCategory(APIView):
     permission_classes = [AllowAny]  # Public access
 
@@ -249,6 +263,7 @@ class ProductListByCategory(APIView):
 # Category and Sub Category list using parent category id
 
 @api_view(['GET'])
+@catalog_cache
 def get_categories_and_products_by_parent(request, parent_category_id):
     try:
         # Fetch the ParentCategory by ID, including handling the case when it doesn't exist
@@ -303,28 +318,71 @@ def get_categories_and_products_by_parent(request, parent_category_id):
 
 @api_view(["GET"])
 def search_products(request):
+    """
+    Ranked product search over the in-memory search index (products_app/search.py),
+    with the old substring match as fallback when the index finds nothing.
+    Without `page` the full ranked list is returned as before; with `page` (and
+    optional `page_size`) the response is paginated like product_filter_list.
+    """
     search_keyword = request.query_params.get("q", "").strip()
 
-    query = Q()
     if search_keyword:
-        query |= Q(name__icontains=search_keyword)
-        query |= Q(alternate_names__icontains=search_keyword)
-        query |= Q(description__icontains=search_keyword)
-        query |= Q(size__icontains=search_keyword)
-        query |= Q(categories__category_name__icontains=search_keyword)
-        query |= Q(categories__parent_categories__name__icontains=search_keyword)
+        product_ids = search_product_ids(search_keyword)
+    else:
+        product_ids = list(Product.objects.values_list('id', flat=True))
 
-        try:
-            price = float(search_keyword)
-            query |= Q(price=price)
-        except ValueError:
-            pass
+    if 'page' not in request.query_params:
+        products = Product.objects.in_bulk(product_ids)
+        serializer = ProductSearchSerializer([products[pk] for pk in product_ids if pk in products], many=True)
+        return Response(serializer.data)
 
-    products = Product.objects.filter(query).distinct()
+    try:
+        page_size = min(int(request.query_params.get('page_size', 20)), 100)
+    except ValueError:
+        page_size = 20
+    paginator = Paginator(product_ids, max(page_size, 1))
+    try:
+        page_obj = paginator.page(request.query_params.get('page'))
+    except PageNotAnInteger:
+        page_obj = paginator.page(1)
+    except EmptyPage:
+        page_obj = paginator.page(paginator.num_pages)
 
-    serializer = ProductSearchSerializer(products, many=True)
-    return Response(serializer.data)
+    products = Product.objects.in_bulk(page_obj.object_list)
+    serializer = ProductSearchSerializer([products[pk] for pk in page_obj.object_list if pk in products], many=True)
 
+    return Response({
+        "status": "success",
+        "data": serializer.data,
+        "pagination": {
+            "current_page": page_obj.number,
+            "total_pages": paginator.num_pages,
+            "total_items": paginator.count,
+            "page_size": page_size,
+            "has_next": page_obj.has_next(),
+            "has_previous": page_obj.has_previous(),
+        }
+    })
+
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def autocomplete_products(request):
+    """
+    Type-ahead suggestions (products and categories) for the search box.
+    Served from the in-memory prefix index, no database query per keystroke.
+    """
+    query = request.query_params.get("q", "").strip()
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_SUGGESTIONS))
+    except ValueError:
+        limit = DEFAULT_SUGGESTIONS
+
+    return Response({
+        "query": query,
+        "results": suggest(query, limit) if query else []
+    })
 
 
 # Warranty Plans fileterd based on price range
@@ -364,6 +422,7 @@ class PriceRangeListAPIView(APIView):
 
 
 @api_view(['GET'])
+@catalog_cache
 def offer_list(request):
     offers = Product_Offer_slider.objects.all().order_by('-date')  # Fetch all offers, latest first
     serializer = ProductOfferSerializer(offers, many=True)
@@ -380,6 +439,7 @@ class DesignerRateAPIView(APIView):
 
 # Banner Images
 
+@method_decorator(catalog_cache, name='get')
 class BannerImageListView(APIView):
     def get(self, request):
         banners = Banner_Image.objects.all()
@@ -395,6 +455,7 @@ class BannerImageListView(APIView):
 # Testimonial
 
 @api_view(['GET'])
+@catalog_cache
 def get_all_testimonials(request):
     testimonials = Testimonials.objects.all().order_by('-created_at')  # Fetch all testimonials
     serializer = TestimonialSerializer(testimonials, many=True)  # Serialize data
@@ -403,10 +464,10 @@ def get_all_testimonials(request):
 
 @api_view(['GET'])
 def get_site_visit_amount(request):
-    """Returns the amount from the single site_visit record."""
-    site_visit_obj = site_visit.objects.first()  # Get the only available site_visit record
-    if site_visit_obj:
-        return Response({'amount': site_visit_obj.amount})
+    """Returns the amount from the single site_visit record (cached checkout settings)."""
+    amount = get_checkout_config().site_visit_amount
+    if amount is not None:
+        return Response({'amount': amount})
     return Response({'error': 'No site visit record found'}, status=404)
 
 
@@ -417,235 +478,77 @@ class ProductPriceView(APIView):
             print("Serializer errors:", serializer.errors)
             return Response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        product_id = serializer.validated_data['product_id']
-        width = serializer.validated_data['width']
-        height = serializer.validated_data['height']
-        unit = serializer.validated_data['unit']
-        quantity = serializer.validated_data['quantity']
-        thickness_id = serializer.validated_data.get('thickness_id')
-        turnaround_id = serializer.validated_data.get('turnaround_id')
-        delivery_id = serializer.validated_data.get('delivery_id')
-        installation_type_id = serializer.validated_data.get('installation_type_id')
-        distance_id = serializer.validated_data.get('distance_id')
+        line = serializer.validated_data
+        product_id = line['product_id']
 
-        print(f"product id = {product_id}, width = {width}, height = {height}, unit = {unit}, quantity = {quantity}")
+        print(f"product id = {product_id}, width = {line['width']}, height = {line['height']}, unit = {line['unit']}, quantity = {line['quantity']}")
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        pricing = get_compiled_pricing(product_id)
+        if pricing is None:
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        unit_conversion = {
-            'cm': Decimal('1'),
-            'meter': Decimal('100'),
-            'feet': Decimal('30.48'),
-            'yard': Decimal('91.44'),
-            'inches': Decimal('2.54'),
-            'mm': Decimal('0.1')
-        }
+        try:
+            quote = calculate_price(pricing, line)
+        except PriceQuoteError as e:
+            return Response({"error": e.message}, status=e.status_code)
 
-        product_unit = product.size
-        if not product.disable_customization:
-        # Validate dimensions against product's min/max (converted to user's unit)
-            product_min_width_in_unit = product.min_width * (unit_conversion[product_unit] / unit_conversion[unit])
-            product_max_width_in_unit = product.max_width * (unit_conversion[product_unit] / unit_conversion[unit])
-            product_min_height_in_unit = product.min_height * (unit_conversion[product_unit] / unit_conversion[unit])
-            product_max_height_in_unit = product.max_height * (unit_conversion[product_unit] / unit_conversion[unit])
-
-            if width < product_min_width_in_unit:
-                error_msg = f"Width is below the minimum allowed value. Minimum width is {product_min_width_in_unit:.2f} {unit}."
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-            if width > product_max_width_in_unit:
-                error_msg = f"Width exceeds the maximum allowed value. Maximum width is {product_max_width_in_unit:.2f} {unit}."
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-            if height < product_min_height_in_unit:
-                error_msg = f"Height is below the minimum allowed value. Minimum height is {product_min_height_in_unit:.2f} {unit}."
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-            if height > product_max_height_in_unit:
-                error_msg = f"Height exceeds the maximum allowed value. Maximum height is {product_max_height_in_unit:.2f} {unit}."
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Convert dimensions to product's unit for pricing calculation
-        width_in_product_unit = width * (unit_conversion[unit] / unit_conversion[product_unit])
-        height_in_product_unit = height * (unit_conversion[unit] / unit_conversion[product_unit])
-        area_in_product_unit_sq = width_in_product_unit * height_in_product_unit
-
-        # Calculate base price based on product's unit squared
-        fixed_price = product.fixed_price if product.fixed_price else Decimal('0')
-        pro_price = product.price if product.price else Decimal('0')
-        base_price_per_item = (area_in_product_unit_sq * pro_price) + fixed_price
-        base_total_price = base_price_per_item * quantity
-
-        # Initialize response with breakdown
-        price_breakdown = {
-            "base_price": round(base_total_price, 2),
-        }
+        return Response(quote)
 
-        # Initialize additional cost
-        additional_cost = Decimal('0')
 
-        # Get thickness details if provided
-        if thickness_id:
-            try:
-                # First check if product has specific thickness
-                thickness_details = Thickness.objects.filter(product=product, id=thickness_id).first()
-
-                # If not found, check global thickness
-                if not thickness_details:
-                    thickness_details = GlobalThickness.objects.get(id=thickness_id)
-
-                # Calculate thickness price based on percentage or fixed price
-                thickness_price = Decimal('0')
-
-                # Commenting out thickness calculation for now as per request
-                """
-                if thickness_details.price_percentage and thickness_details.price_percentage != Decimal('0'):
-                    # Calculate percentage of base price
-                    thickness_price = (base_total_price * thickness_details.price_percentage) / Decimal('100')
-                elif thickness_details.price and thickness_details.price != Decimal('0'):
-                    # Use fixed price
-                    thickness_price = thickness_details.price * area_in_product_unit_sq * quantity
-                """
-
-                additional_cost += thickness_price
-                price_breakdown["thickness"] = {
-                    "id": thickness_id,
-                    "size": thickness_details.size,
-                    "price": round(thickness_price, 2)
-                }
-            except (Thickness.DoesNotExist, GlobalThickness.DoesNotExist):
-                return Response({"error": f"Thickness with ID {thickness_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+class ProductBatchPriceView(APIView):
+    """
+    Price many (product, size, quantity, options) lines in one request.
+    Products and option rows are loaded once for the whole batch.
+    """
+    def post(self, request):
+        serializer = ProductBatchPriceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get turnaround time details if provided
-        if turnaround_id:
-            try:
-                # Check product-specific first
-                turnaround = TurnaroundTime.objects.filter(product=product, id=turnaround_id).first()
-
-                # If not found, check global
-                if not turnaround:
-                    turnaround = GlobalTurnaroundTime.objects.get(id=turnaround_id)
-
-                turnaround_price = Decimal('0')
-                # Calculate based on percentage if available and not zero
-                if turnaround.price_percentage and turnaround.price_percentage != Decimal('0'):
-                    turnaround_price = (base_total_price * turnaround.price_percentage) / Decimal('100')
-                # Add fixed price if available and not zero
-                elif turnaround.price_decimal and turnaround.price_decimal != Decimal('0'):
-                    turnaround_price = turnaround.price_decimal
-
-                additional_cost += turnaround_price
-                price_breakdown["turnaround_time"] = {
-                    "id": turnaround_id,
-                    "name": turnaround.name,
-                    "price": round(turnaround_price, 2)
-                }
-            except (TurnaroundTime.DoesNotExist, GlobalTurnaroundTime.DoesNotExist):
-                return Response({"error": f"Turnaround time with ID {turnaround_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+        results = quote_lines(serializer.validated_data['items'])
 
-        # Get delivery details if provided
-        if delivery_id:
-            try:
-                # Check product-specific first
-                delivery = Delivery.objects.filter(product=product, id=delivery_id).first()
-
-                # If not found, check global
-                if not delivery:
-                    delivery = GlobalDelivery.objects.get(id=delivery_id)
-
-                delivery_price = Decimal('0')
-                # Calculate based on percentage if available and not zero
-                if delivery.price_percentage and delivery.price_percentage != Decimal('0'):
-                    delivery_price = (base_total_price * delivery.price_percentage) / Decimal('100')
-                # Add fixed price if available and not zero
-                elif delivery.price_decimal and delivery.price_decimal != Decimal('0'):
-                    delivery_price = delivery.price_decimal
-
-                additional_cost += delivery_price
-                price_breakdown["delivery"] = {
-                    "id": delivery_id,
-                    "name": delivery.name,
-                    "price": round(delivery_price, 2)
-                }
-            except (Delivery.DoesNotExist, GlobalDelivery.DoesNotExist):
-                return Response({"error": f"Delivery with ID {delivery_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "total_items": len(results),
+            "results": results
+        })
 
-        # Get installation type details if provided
-        if installation_type_id:
-            try:
-                # Check product-specific first
-                installation = InstallationType.objects.filter(product=product, id=installation_type_id).first()
-
-                # If not found, check global
-                if not installation:
-                    installation = GlobalInstallationType.objects.get(id=installation_type_id)
-
-                installation_price = Decimal('0')
-                # Calculate based on percentage if available and not zero
-                if installation.price_percentage and installation.price_percentage != Decimal('0'):
-                    installation_price = (base_total_price * installation.price_percentage) / Decimal('100')
-                # Add fixed price if available and not zero
-                elif installation.price_decimal and installation.price_decimal != Decimal('0'):
-                    installation_price = installation.price_decimal
-
-                additional_cost += installation_price
-                price_breakdown["installation"] = {
-                    "id": installation_type_id,
-                    "name": installation.name,
-                    "days": installation.days,
-                    "price": round(installation_price, 2)
-                }
-            except (InstallationType.DoesNotExist, GlobalInstallationType.DoesNotExist):
-                return Response({"error": f"Installation type with ID {installation_type_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+class ProductPriceMatrixView(APIView):
+    """
+    Full price grid for one product (widths x heights x quantities x option ids),
+    streamed as JSON or CSV. Every cell matches ProductPriceView for the same input.
+    """
+    def post(self, request):
+        serializer = ProductPriceMatrixSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get distance details if provided
-        if distance_id:
-            try:
-                # Check product-specific first
-                distance = Distance.objects.filter(product=product, id=distance_id).first()
-
-                # If not found, check global
-                if not distance:
-                    distance = GlobalDistance.objects.get(id=distance_id)
-
-                distance_price = Decimal('0')
-                # Calculate based on percentage if available and not zero
-                if distance.price_percentage and distance.price_percentage != Decimal('0'):
-                    distance_price = (base_total_price * distance.price_percentage) / Decimal('100')
-                # Add fixed price if available and not zero
-                elif distance.price_decimal and distance.price_decimal != Decimal('0'):
-                    distance_price = distance.price_decimal
-
-                additional_cost += distance_price
-                price_breakdown["distance"] = {
-                    "id": distance_id,
-                    "km": distance.km,
-                    "unit": distance.unit,
-                    "price": round(distance_price, 2)
-                }
-            except (Distance.DoesNotExist, GlobalDistance.DoesNotExist):
-                return Response({"error": f"Distance with ID {distance_id} not found"},
-                                status=status.HTTP_404_NOT_FOUND)
+        data = serializer.validated_data
+        option_ids = {field: data.get(field) for field in
+                      ('thickness_id', 'turnaround_id', 'delivery_id', 'installation_type_id', 'distance_id')}
 
-        # Calculate total price
-        total_price = base_total_price + additional_cost
+        cells = matrix_size(data['widths'], data['heights'], data['quantities'], option_ids)
+        if cells > MAX_MATRIX_CELLS:
+            return Response({"error": f"Price matrix too large ({cells} cells). Maximum is {MAX_MATRIX_CELLS}; "
+                                      f"use the price_matrix management command for bigger grids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        pricing = get_compiled_pricing(data['product_id'])
+        if pricing is None:
+            return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            rows = iter_price_matrix(pricing, data['widths'], data['heights'], data['quantities'],
+                                     data['unit'], option_ids)
+        except PriceQuoteError as e:
+            return Response({"error": e.message}, status=e.status_code)
+
+        if data['output_format'] == 'csv':
+            response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="price_matrix_{pricing.product_id}.csv"'
+            return response
+        return StreamingHttpResponse(iter_json(rows, pricing.product_id, data['unit']),
+                                     content_type='application/json')
 
-        return Response({
-            "product_id": product_id,
-            "width": width,
-            "height": height,
-            "unit": unit,
-            "quantity": quantity,
-            "area": round(area_in_product_unit_sq, 2),
-            "price_breakdown": price_breakdown,
-            "additional_cost": round(additional_cost, 2),
-            "total_price_without_rounded": total_price,
-            "total_price": round(total_price, 2)
-        })
 
 class ProductBasicDetailView(APIView):
     def get(self, request, *args, **kwargs):
@@ -752,6 +655,9 @@ class UpdateProductDimensionsView(APIView):
             max_height=100.00,
             size = 'cm'
         )
+        # queryset.update() skips the post_save signals, drop every compiled pricing and cached catalog response
+        bump_global_pricing_version()
+        bump_catalog_version()
 
         return Response({"message": "All product dimensions updated to 5.00"}, status=status.HTTP_200_OK)
 
@@ -1082,35 +988,65 @@ def calculate_tier_price(request):
     """
     product_id = request.data.get('product_id')
     quantity = request.data.get('quantity')
+    quantities = request.data.get('quantities')  # Optional list for a quantity-break table
 
-    if not product_id or not quantity:
+    if not product_id or not (quantity or quantities):
         return Response({
             "status": "error",
             "message": "product_id and quantity are required"
         }, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        product = Product.objects.get(id=product_id)
-        unit_price = product.get_price_for_quantity(quantity)
-        total_price = unit_price * quantity
+        if quantities:
+            quantities = [int(value) for value in quantities]
+        else:
+            quantity = int(quantity)
+    except (TypeError, ValueError):
+        return Response({
+            "status": "error",
+            "message": "quantity must be a whole number"
+        }, status=status.HTTP_400_BAD_REQUEST)
 
+    pricing = get_compiled_pricing(product_id)
+    if pricing is None:
+        return Response({
+            "status": "error",
+            "message": "Product not found"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    if quantities:
+        unit_prices = pricing.prices_for_quantities(quantities)
         return Response({
             "status": "success",
             "data": {
-                "product_id": product.id,
-                "product_name": product.name,
-                "quantity": quantity,
-                "unit_price": str(unit_price),
-                "total_price": str(total_price),
-                "is_tiered": product.is_tiered
+                "product_id": pricing.product_id,
+                "product_name": pricing.name,
+                "is_tiered": pricing.is_tiered,
+                "prices": [
+                    {
+                        "quantity": value,
+                        "unit_price": str(unit_price),
+                        "total_price": str(unit_price * value)
+                    }
+                    for value, unit_price in zip(quantities, unit_prices)
+                ]
             }
         })
 
-    except Product.DoesNotExist:
-        return Response({
-            "status": "error",
-            "message": "Product not found"
-        }, status=status.HTTP_404_NOT_FOUND)
+    unit_price = pricing.price_for_quantity(quantity)
+    total_price = unit_price * quantity
+
+    return Response({
+        "status": "success",
+        "data": {
+            "product_id": pricing.product_id,
+            "product_name": pricing.name,
+            "quantity": quantity,
+            "unit_price": str(unit_price),
+            "total_price": str(total_price),
+            "is_tiered": pricing.is_tiered
+        }
+    })
 
 
 
@@ -1124,7 +1060,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, F
-from products_app.models import InventoryStock, Product
+from products_app.models import InventoryStock, Product, StockMovement
+from products_app.inventory import restock, set_stock_level
 
 
 
@@ -1162,39 +1099,52 @@ def inventory_stock_list(request):
 
     # Order by lowest stock first (critical items first)
     ordering = request.GET.get('ordering', 'current_stock')
-    if ordering == 'current_stock':
-        inventory_stocks = inventory_stocks.order_by('current_stock', 'product__name')
-    elif ordering == 'product_name':
-        inventory_stocks = inventory_stocks.order_by('product__name')
-    elif ordering == 'last_restocked':
-        inventory_stocks = inventory_stocks.order_by('-last_restocked')
-
-    # Pagination
-    page_size = int(request.GET.get('page_size', 20))
-    page_number = int(request.GET.get('page', 1))
-
-    paginator = Paginator(inventory_stocks, page_size)
+    order_fields = {
+        'current_stock': ['current_stock', 'product__name'],
+        'product_name': ['product__name'],
+        'last_restocked': ['-last_restocked'],
+    }.get(ordering, ['current_stock'])
+    inventory_stocks = inventory_stocks.order_by(*order_fields)
+
+    # Cursor pagination (opt-in): no OFFSET scan and no COUNT unless asked for
+    if cursor_requested(request):
+        try:
+            page_items, pagination = paginate_keyset(inventory_stocks, order_fields, request)
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        # Pagination
+        page_size = int(request.GET.get('page_size', 20))
+        page_number = int(request.GET.get('page', 1))
 
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+        paginator = Paginator(inventory_stocks, page_size)
 
-    serializer = InventoryStockSerializer(page_obj, many=True)
+        try:
+            page_obj = paginator.page(page_number)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
 
-    return Response({
-        "status": "success",
-        "data": serializer.data,
-        "pagination": {
+        page_items = page_obj
+        pagination = {
             "current_page": page_obj.number,
             "total_pages": paginator.num_pages,
             "total_items": paginator.count,
             "page_size": page_size,
             "has_next": page_obj.has_next(),
             "has_previous": page_obj.has_previous(),
-        },
+        }
+
+    serializer = InventoryStockSerializer(page_items, many=True)
+
+    return Response({
+        "status": "success",
+        "data": serializer.data,
+        "pagination": pagination,
         "filters_applied": {
             "stock_status": stock_status,
             "low_stock_only": low_stock_only,
@@ -1220,19 +1170,8 @@ def restore_product_stock(request):
         try:
             product = Product.objects.get(id=product_id)
 
-            # Get or create inventory stock
-            inventory_stock, created = InventoryStock.objects.get_or_create(
-                product=product,
-                defaults={'current_stock': quantity}
-            )
-
-            if not created:
-                # Restore stock
-                inventory_stock.restore_stock(quantity)
-
-            # Update product stock as well
-            product.stock = inventory_stock.current_stock
-            product.save()
+            # Recorded in the stock ledger; Product.stock follows without a Product.save()
+            new_stock_level = restock(product.id, quantity, notes=notes)
 
             return Response({
                 "status": "success",
@@ -1241,7 +1180,7 @@ def restore_product_stock(request):
                     "product_id": product.id,
                     "product_name": product.name,
                     "quantity_added": quantity,
-                    "new_stock_level": inventory_stock.current_stock,
+                    "new_stock_level": new_stock_level,
                     "notes": notes
                 }
             })
@@ -1259,6 +1198,73 @@ def restore_product_stock(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def adjust_product_stock(request):
+    """
+    Set a product's stock to a counted level (recorded as an adjustment)
+    """
+    serializer = StockAdjustmentSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response({
+            "status": "error",
+            "message": "Validation failed",
+            "errors": serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        product = Product.objects.get(id=serializer.validated_data['product_id'])
+    except Product.DoesNotExist:
+        return Response({
+            "status": "error",
+            "message": "Product not found"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    level = set_stock_level(product.id, serializer.validated_data['level'],
+                            notes=serializer.validated_data.get('notes', ''))
+
+    return Response({
+        "status": "success",
+        "message": f"Stock adjusted for {product.name}",
+        "data": {
+            "product_id": product.id,
+            "product_name": product.name,
+            "new_stock_level": level
+        }
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stock_movement_list(request):
+    """
+    Stock ledger, newest first, cursor paginated. Filter with product_id and kind.
+    """
+    movements = StockMovement.objects.select_related('product')
+
+    product_id = request.GET.get('product_id')
+    kind = request.GET.get('kind')
+    if product_id:
+        movements = movements.filter(product_id=product_id)
+    if kind:
+        movements = movements.filter(kind=kind)
+
+    try:
+        page_items, pagination = paginate_keyset(movements, ['-id'], request, default_page_size=50, max_page_size=500)
+    except ValueError as e:
+        return Response({
+            "status": "error",
+            "message": str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "status": "success",
+        "data": StockMovementSerializer(page_items, many=True).data,
+        "pagination": pagination
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def low_stock_alerts(request):
@@ -1456,77 +1462,64 @@ def product_filter_list(request):
             'created_at', '-created_at', 'updated_at', '-updated_at'
         ]
 
-        if sort_by in valid_sort_fields:
-            products = products.order_by(sort_by)
-        else:
-            products = products.order_by('-created_at')  # Default sorting
+        sort_field = sort_by if sort_by in valid_sort_fields else '-created_at'  # Default sorting
+        products = products.order_by(sort_field)
 
-        # Pagination
-        page_size = int(request.GET.get('page_size', 20))
-        page_number = int(request.GET.get('page', 1))
+        # Cursor pagination (opt-in): no OFFSET scan and no COUNT unless asked for
+        if cursor_requested(request):
+            try:
+                page_items, pagination = paginate_keyset(products, [sort_field], request)
+            except ValueError as e:
+                return Response({
+                    "status": "error",
+                    "message": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Pagination
+            page_size = int(request.GET.get('page_size', 20))
+            page_number = int(request.GET.get('page', 1))
 
-        # Validate pagination parameters
-        if page_size < 1 or page_size > 100:
-            return Response({
-                "status": "error",
-                "message": "page_size must be between 1 and 100"
-            }, status=status.HTTP_400_BAD_REQUEST)
+            # Validate pagination parameters
+            if page_size < 1 or page_size > 100:
+                return Response({
+                    "status": "error",
+                    "message": "page_size must be between 1 and 100"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        if page_number < 1:
-            return Response({
-                "status": "error",
-                "message": "page must be greater than 0"
-            }, status=status.HTTP_400_BAD_REQUEST)
+            if page_number < 1:
+                return Response({
+                    "status": "error",
+                    "message": "page must be greater than 0"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        paginator = Paginator(products, page_size)
+            paginator = Paginator(products, page_size)
 
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+            try:
+                page_obj = paginator.page(page_number)
+            except PageNotAnInteger:
+                page_obj = paginator.page(1)
+            except EmptyPage:
+                page_obj = paginator.page(paginator.num_pages)
+
+            page_items = page_obj
+            pagination = {
+                "current_page": page_obj.number,
+                "total_pages": paginator.num_pages,
+                "total_items": paginator.count,
+                "page_size": page_size,
+                "has_next": page_obj.has_next(),
+                "has_previous": page_obj.has_previous(),
+            }
 
-        serializer = ProductListSerializer(page_obj, many=True)
+        serializer = ProductListSerializer(page_items, many=True)
 
         # Get filter options for response
-        filter_options = {
-            "parent_categories": [
-                {
-                    "id": pc.id,
-                    "name": pc.name,
-                    "child_categories_count": pc.child_categories.count()
-                }
-                for pc in ParentCategory.objects.all()
-            ],
-            "categories": [
-                {
-                    "id": cat.id,
-                    "name": cat.category_name,
-                    "parent_categories": [
-                        {"id": pc.id, "name": pc.name}
-                        for pc in cat.parent_categories.all()
-                    ]
-                }
-                for cat in Category.objects.all()
-            ],
-            "status_options": [
-                {"id": status.id, "status": status.status}
-                for status in Product_status.objects.all()
-            ]
-        }
+        filter_options = filter_options_from_tree(get_category_tree())
 
         return Response({
             "status": "success",
             "data": serializer.data,
-            "pagination": {
-                "current_page": page_obj.number,
-                "total_pages": paginator.num_pages,
-                "total_items": paginator.count,
-                "page_size": page_size,
-                "has_next": page_obj.has_next(),
-                "has_previous": page_obj.has_previous(),
-            },
+            "pagination": pagination,
             "filters_applied": {
                 "parent_category_id": parent_category_id,
                 "category_id": category_id,
@@ -1548,6 +1541,28 @@ def product_filter_list(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def category_tree(request):
+    """
+    Whole category tree in one response: parent categories -> categories -> product ids,
+    with counts. Pass include_products=false to leave out the product id lists.
+    """
+    tree = get_category_tree()
+
+    if request.GET.get('include_products', 'true').lower() == 'false':
+        tree = {
+            **tree,
+            "parent_categories": [{k: v for k, v in pc.items() if k != "product_ids"} for pc in tree["parent_categories"]],
+            "categories": [{k: v for k, v in cat.items() if k != "product_ids"} for cat in tree["categories"]],
+        }
+
+    return Response({
+        "status": "success",
+        "data": tree
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def product_filter_options(request):
@@ -1555,39 +1570,39 @@ def product_filter_options(request):
     Get available filter options for products
     """
     try:
-        parent_categories = ParentCategory.objects.all()
-        categories = Category.objects.all()
+        tree = get_category_tree()
         status_options = Product_status.objects.all()
+        parent_names = {pc["id"]: pc["name"] for pc in tree["parent_categories"]}
 
-        parent_categories_data = []
-        for pc in parent_categories:
-            parent_categories_data.append({
-                "id": pc.id,
-                "name": pc.name,
-                "image": pc.image,
-                "description": pc.description,
-                "child_categories_count": pc.child_categories.count(),
-                "products_count": Product.objects.filter(
-                    categories__in=pc.child_categories.all()
-                ).distinct().count()
-            })
+        parent_categories_data = [
+            {
+                "id": pc["id"],
+                "name": pc["name"],
+                "image": pc["image"],
+                "description": pc["description"],
+                "child_categories_count": pc["child_categories_count"],
+                "products_count": pc["products_count"]
+            }
+            for pc in tree["parent_categories"]
+        ]
 
-        categories_data = []
-        for cat in categories:
-            categories_data.append({
-                "id": cat.id,
-                "name": cat.category_name,
-                "image": cat.category_image,
-                "description": cat.description,
+        categories_data = [
+            {
+                "id": cat["id"],
+                "name": cat["name"],
+                "image": cat["image"],
+                "description": cat["description"],
                 "parent_categories": [
                     {
-                        "id": pc.id,
-                        "name": pc.name
+                        "id": parent_id,
+                        "name": parent_names[parent_id]
                     }
-                    for pc in cat.parent_categories.all()
+                    for parent_id in cat["parent_category_ids"]
                 ],
-                "products_count": cat.products.count()
-            })
+                "products_count": cat["products_count"]
+            }
+            for cat in tree["categories"]
+        ]
 
         return Response({
             "status": "success",